@@ -0,0 +1,915 @@
+"""
+Конвейер обработки звука.
+
+Callback PortAudio только копирует блоки по 512 сэмплов в заранее выделенный
+кольцевой буфер, а распознавание выполняется в отдельном потоке декодирования,
+который разбирает этот буфер. Так тяжёлая работа Kaldi не блокирует поток захвата
+и не приводит к переполнениям входного буфера. Если микрофон открыт в родном
+формате, в буфер попадают сырые блоки устройства, а сведение каналов и
+передискретизацию в 16 кГц делает поток декодирования (NativeFormatConverter).
+
+Память на пути блока ограничена, но не нулевая: буферы выделяются один раз, а на каждый
+блок остаются лишь мелкие временные объекты постоянного размера (кортеж формы блока,
+служебные объекты Event.set при переходе буфера из пустого, ответы распознавателей).
+Их размер не зависит от длины блока; python -m bin.benchmarks ingest показывает сколько.
+"""
+import math
+import threading
+import time
+
+import numpy as np
+
+from bin.command_grammar import needs_open_vocabulary
+from bin.hypothesis_ranking import parse_alternatives
+from bin.recognition_results import parse_text
+from bin.resampling import NativeFormatConverter
+from bin.result_arbitration import word_confidence
+from bin.voice_activity import VAD_SILENCE, VAD_START, VAD_END
+from logging_config import logger, debug_logger
+
+try:
+    # Блок отдаётся в AcceptWaveform как cffi-указатель на уже выделенную память, без bytes-копии
+    from vosk import _ffi as vosk_ffi
+except ImportError:
+    vosk_ffi = None
+
+SAMPLE_RATE = 16000
+BLOCK_SIZE = 512  # 32 мс при 16 кГц
+RING_CAPACITY = 256  # ~8 секунд звука
+SILENCE_RMS = 20  # Порог "нетихого" блока для watchdog'а, пока нет оценки фона микрофона
+UTTERANCE_SECONDS = 10  # Сколько звука фразы хранить для повторного распознавания
+WAKE_WINDOW_SECONDS = 30  # Окно полного распознавания после имени (как name_mentioned в run_script)
+MIN_CASCADE_SAMPLES = SAMPLE_RATE * 3 // 10  # Обрывки короче 0.3 с английской модели не отдаются
+PARTIAL_CHECK_BLOCKS = 3  # Как часто (в блоках) смотреть PartialResult при раннем выполнении
+FINAL_HOLD_BLOCKS = 16  # ~0.5 с: столько блоков финальный результат одной модели ждёт результата другой
+
+
+class AudioRingBuffer:
+    """
+    Кольцевой буфер блоков с памятью, выделенной один раз при создании.
+    Пишет в него callback PortAudio, читает поток декодирования.
+    Если буфер заполнен, новый блок отбрасывается и учитывается в overflow_count.
+    Слот хранит block_size сэмплов; многоканальный блок лежит в нём кадрами подряд.
+    """
+
+    def __init__(self, capacity=RING_CAPACITY, block_size=BLOCK_SIZE):
+        self.capacity = capacity
+        # Списки, а не массивы numpy: запись и чтение не создают скаляров numpy
+        self._frames = [0] * capacity  # Сколько сэмплов в слоте
+        self._timestamps = [0.0] * capacity
+        self._allocate(block_size, 1)
+        self._head = 0  # Слот для следующей записи
+        self._tail = 0  # Слот для следующего чтения
+        self._count = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Event()
+        self.overflow_count = 0
+        self.max_backlog = 0
+
+    def _allocate(self, frames, channels):
+        self.block_size = frames * channels
+        self._blocks = np.zeros((self.capacity, self.block_size), dtype=np.int16)
+        # Заранее созданные представления слотов, чтобы callback не создавал срезы на каждый блок
+        self._rows = [self._blocks[slot] for slot in range(self.capacity)]
+        self._columns = [row.reshape(frames, channels) for row in self._rows]
+        self._full_shape = (frames, channels)
+
+    def reconfigure(self, frames, channels=1):
+        """
+        Меняет размер слотов под блоки нового потока, пока он ещё не запущен.
+        Непрочитанные блоки прежнего формата сбрасываются.
+        :param frames: кадров в блоке потока
+        :param channels: каналов в кадре
+        """
+        if (frames, channels) == self._full_shape:
+            return
+        with self._lock:
+            self._allocate(frames, channels)
+            self._head = 0
+            self._tail = 0
+            self._count = 0
+            self._not_empty.clear()
+
+    @property
+    def backlog(self):
+        """Количество блоков, ожидающих декодирования"""
+        return self._count
+
+    def push(self, indata, timestamp):
+        """
+        Копирует блок в свободный слот. Вызывается из callback'а, поэтому не выделяет буферов;
+        временные объекты - кортеж формы indata и, если буфер был пуст, служебные объекты Event.set
+        (около 150 байт на блок, от размера блока не зависят).
+        :param indata: массив (frames, channels) или (frames,) с сэмплами int16
+        :param timestamp: время захвата блока
+        :return: False, если блок пришлось отбросить
+        """
+        with self._lock:
+            if self._count >= self.capacity:
+                self.overflow_count += 1
+                return False
+
+            slot = self._head
+            if indata.shape == self._full_shape:
+                np.copyto(self._columns[slot], indata)  # Обычный случай: полный блок потока
+                samples = self.block_size
+            else:
+                flat = indata.reshape(-1)[:self.block_size]
+                samples = len(flat)
+                self._blocks[slot, :samples] = flat
+            self._frames[slot] = samples
+            self._timestamps[slot] = timestamp
+
+            self._head = slot + 1 if slot + 1 < self.capacity else 0
+            self._count += 1
+            if self._count > self.max_backlog:
+                self.max_backlog = self._count
+            if self._count == 1:
+                # Читатель ждёт только пустой буфер (pop_into сбрасывает событие под той же блокировкой),
+                # поэтому Event.set с его собственной блокировкой нужен лишь на переходе из пустого
+                self._not_empty.set()
+        return True
+
+    def pop_into(self, out, timeout=None):
+        """
+        Забирает самый старый блок в переданный массив.
+        :param out: массив int16 длиной не меньше block_size (лишние сэмплы блока отбрасываются)
+        :param timeout: сколько ждать данных (в секундах)
+        :return: (количество сэмплов, время захвата); (0, 0.0), если данных нет
+        """
+        if not self._not_empty.wait(timeout):
+            return 0, 0.0
+
+        with self._lock:
+            if self._count == 0:
+                self._not_empty.clear()
+                return 0, 0.0
+
+            slot = self._tail
+            frames = min(self._frames[slot], len(out))
+            if frames == len(out) == self.block_size:
+                np.copyto(out, self._rows[slot])
+            else:
+                out[:frames] = self._blocks[slot, :frames]
+            timestamp = self._timestamps[slot]
+
+            self._tail = slot + 1 if slot + 1 < self.capacity else 0
+            self._count -= 1
+            if self._count == 0:
+                self._not_empty.clear()
+        return frames, timestamp
+
+    def clear(self):
+        """Сбрасывает все непрочитанные блоки"""
+        with self._lock:
+            self._head = 0
+            self._tail = 0
+            self._count = 0
+            self._not_empty.clear()
+
+
+class UtteranceBuffer:
+    """
+    Звук текущей фразы, чтобы при необходимости распознать её ещё раз другим распознавателем.
+    Память выделяется один раз; если фраза длиннее буфера, хранится её конец.
+    """
+
+    def __init__(self, max_seconds=UTTERANCE_SECONDS, sample_rate=SAMPLE_RATE):
+        self._data = np.zeros(int(max_seconds * sample_rate), dtype=np.int16)
+        self._length = 0
+
+    def append(self, block):
+        size = len(block)
+        capacity = len(self._data)
+        if size >= capacity:
+            self._data[:] = block[-capacity:]
+            self._length = capacity
+            return
+        if self._length + size > capacity:
+            keep = capacity - size
+            self._data[:keep] = self._data[self._length - keep:self._length]
+            self._length = keep
+        self._data[self._length:self._length + size] = block
+        self._length += size
+
+    def samples(self):
+        return self._data[:self._length]
+
+    def clear(self):
+        self._length = 0
+
+
+class DecodeWorker(threading.Thread):
+    """
+    Поток декодирования: забирает блоки из кольцевого буфера и кормит ими распознаватели.
+    Готовый текст передаётся в on_result, факт звука (для watchdog'а) - в on_voice.
+    Если задан vad, распознаватели получают только блоки с речью (плюс pre-roll),
+    а конец фразы закрывается через FinalResult.
+    Если задан rec_search (режим команд), фраза со словом поиска повторно
+    распознаётся открытым словарём из буфера фразы.
+    Если задан rec_wake, в ожидании работает только маленький распознаватель имён,
+    а полные распознаватели включаются на WAKE_WINDOW_SECONDS после имени.
+    Если задан early_dispatch, частичные результаты проверяются им, и команда
+    отправляется до конца фразы; финальный результат той же фразы не дублируется.
+    set_endpointing задаёт конец фразы: сколько тишины ждать (hangover VAD), после какой длины
+    фразу закрывать принудительно и через сколько секунд простоя сбрасывать распознаватели.
+    Если задан preprocessor (AudioPreprocessor), блок до анализа громкости проходит фильтр
+    DC и high-pass, а перед VAD и распознавателями - спектральный гейт.
+    Если задан noise_floor (NoiseFloorEstimator), пороги watchdog'а и VAD берутся
+    из оценки фона микрофона, а не из SILENCE_RMS и настроек VAD по умолчанию.
+    Если задан command_index (CommandIndex), а rec_ru отдаёт N-best альтернативы,
+    из них выбирается лучшая гипотеза с командой.
+    Если задан cascade (EnglishCascade), rec_en не работает непрерывно: фраза из буфера
+    распознаётся английской моделью только когда русский результат её не устроил.
+    Если rec_ru и rec_en работают одновременно, модели заканчивают фразу на разных блоках:
+    первый финальный результат ждёт второй (не дольше FINAL_HOLD_BLOCKS блоков или до конца
+    фразы), и RU/EN выбираются один раз на фразу.
+    Если поток открыт не в 16 кГц моно (set_input_format), сырые блоки устройства
+    приводятся к блокам по block_size сэмплов здесь же, в потоке декодирования.
+    """
+
+    def __init__(self, ring_buffer, on_result, on_voice=None, vad=None, latency_tracker=None):
+        super().__init__(name="DecodeWorker", daemon=True)
+        self.ring_buffer = ring_buffer
+        self.on_result = on_result
+        self.on_voice = on_voice
+        self.latency_tracker = latency_tracker  # LatencyTracker для замеров задержки фраз (None - без замеров)
+        self.vad = vad  # VoiceActivityGate или None (распознавать всё подряд)
+        self.rec_ru = None
+        self.rec_en = None
+        self.rec_search = None  # Открытый словарь для поиска в режиме команд
+        self.rec_wake = None  # Детектор имени ассистента
+        self.wake_names = []
+        self.armed_until = 0.0  # До какого момента работает полное распознавание
+        self._armed = False
+        self.utterance = None  # UtteranceBuffer для rec_search и rec_wake
+        self.early_dispatch = None  # Проверка частичного результата: можно ли выполнить сразу
+        self.arbiter = None  # ResultArbiter: выбор RU/EN по уверенности вместо "ru or en"
+        self.cascade = None  # EnglishCascade: EN только по требованию
+        self.command_index = None  # CommandIndex для выбора из N-best альтернатив rec_ru
+        self.noise_floor = None  # NoiseFloorEstimator: пороги по фону микрофона
+        self.preprocessor = None  # AudioPreprocessor: фильтры и шумоподавление перед распознаванием
+        self.signal_rms = SILENCE_RMS  # Порог "нетихого" блока для on_voice
+        self._early_text = None  # Что уже отправлено по частичному результату этой фразы
+        self._last_partial = ""
+        self._partial_counter = 0
+        self._early_en = False  # EN-результат фразы, выполненной по частичному результату, ещё не пришёл
+        self._held = None  # (ru, en, ru_conf, en_conf): финальный результат, ждущий второй модели
+        self._held_blocks = 0
+        self._replacement = None  # (rec_ru, rec_wake, имена): новые распознаватели ждут конца фразы
+        self._replacement_lock = threading.Lock()
+        self.last_speech_time = None  # Время захвата последнего блока с речью (для замеров задержки)
+        self.max_utterance_blocks = 0  # Фраза длиннее закрывается принудительно (0 - без ограничения)
+        self.idle_reset_seconds = 0  # Reset распознавателей после такого простоя (0 - никогда)
+        self._utterance_blocks = 0
+        self._idle_reset_done = False
+        self.blocks_decoded = 0
+        self.block_size = ring_buffer.block_size  # Блок распознавания (16 кГц моно)
+        self.converter = None  # NativeFormatConverter, если поток открыт в родном формате устройства
+        self._input_format = None  # Новый формат входа; применяется потоком декодирования перед блоком
+        # Текущий блок: байты для AcceptWaveform и массив int16 над одной и той же памятью
+        self._pcm = bytearray(self.block_size * 2)
+        self._pcm_view = vosk_ffi.from_buffer("char[]", self._pcm) if vosk_ffi is not None else None
+        self._block = np.frombuffer(self._pcm, dtype=np.int16)
+        self._square = np.zeros(self.block_size, dtype=np.float32)  # Черновик для RMS
+        self._stop_event = threading.Event()
+        self._backlog_warned = False
+
+    def set_recognizers(self, rec_ru, rec_en):
+        """Подключает распознаватели (можно заменить на лету)"""
+        self.rec_ru = rec_ru
+        self.rec_en = rec_en
+
+    def set_en_recognizer(self, rec_en):
+        """Английский распознаватель подключается позже, когда догрузится его модель"""
+        self.rec_en = rec_en
+
+    def set_search_recognizer(self, rec_search):
+        """Открытый словарь для повторного распознавания фраз поиска (None - отключить)"""
+        if rec_search is not None and self.utterance is None:
+            self.utterance = UtteranceBuffer()
+        self.rec_search = rec_search
+
+    def set_early_dispatch(self, predicate):
+        """Включает выполнение команд по частичным результатам (None - отключить)"""
+        self.early_dispatch = predicate
+
+    def set_arbiter(self, arbiter):
+        """Включает выбор RU/EN по оценке гипотез (распознаватели должны быть с SetWords(True))"""
+        self.arbiter = arbiter
+
+    def set_endpointing(self, silence_ms, max_utterance_s=0, idle_reset_s=0):
+        """
+        Настройки конца фразы (см. ENDPOINT_PRESETS в voice_activity).
+        :param silence_ms: тишина до FinalResult (работает только с VAD)
+        :param max_utterance_s: принудительный FinalResult после стольких секунд речи (0 - выключено)
+        :param idle_reset_s: Reset распознавателей после стольких секунд без речи (0 - выключено)
+        """
+        block_ms = self.block_size * 1000 / SAMPLE_RATE
+        if self.vad is not None:
+            self.vad.hangover_blocks = max(1, math.ceil(silence_ms / block_ms))
+        self.max_utterance_blocks = int(max_utterance_s * 1000 / block_ms)
+        self.idle_reset_seconds = idle_reset_s
+
+    def set_preprocessor(self, preprocessor):
+        """Подключает предобработку звука (None - блоки идут в распознаватели как есть)"""
+        self.preprocessor = preprocessor
+
+    def set_noise_floor(self, estimator):
+        """Подключает оценку фона микрофона (None - фиксированные пороги)"""
+        self.noise_floor = estimator
+        self._apply_noise_floor()
+
+    def _apply_noise_floor(self):
+        if self.noise_floor is None or self.noise_floor.floor is None:
+            self.signal_rms = SILENCE_RMS
+            return
+        self.signal_rms = self.noise_floor.signal_rms
+        self.noise_floor.apply(self.vad)
+
+    def set_command_index(self, command_index):
+        """Индекс команд для выбора из альтернатив (rec_ru должен быть с SetMaxAlternatives)"""
+        self.command_index = command_index
+
+    def set_cascade(self, cascade):
+        """Включает каскадное распознавание EN (None - отключить)"""
+        if cascade is not None and self.utterance is None:
+            self.utterance = UtteranceBuffer()
+        self.cascade = cascade
+
+    def set_wake_recognizer(self, rec_wake, names):
+        """Распознаватель имён, перед которым ждут полные распознаватели (None - отключить)"""
+        if rec_wake is not None and self.utterance is None:
+            self.utterance = UtteranceBuffer()
+        self.wake_names = [name for name in names if name]
+        self.rec_wake = rec_wake
+
+    def replace_recognizers(self, rec_ru=None, rec_wake=None, wake_names=None):
+        """
+        Распознаватели с новой грамматикой для уже работающего потока. Подменяет их сам поток
+        декодирования между блоками, когда фраза не идёт, а не вызывающий поток посреди AcceptWaveform.
+        None - оставить прежний.
+        """
+        with self._replacement_lock:
+            pending = self._replacement or (None, None, None)
+            self._replacement = (rec_ru or pending[0], rec_wake or pending[1],
+                                 wake_names if wake_names is not None else pending[2])
+
+    def _swap_recognizers(self):
+        """Подключает распознаватели из replace_recognizers на границе фраз"""
+        if self._utterance_blocks or self._held is not None or (self.vad is not None and self.vad.is_speech):
+            return
+        with self._replacement_lock:
+            rec_ru, rec_wake, wake_names = self._replacement
+            self._replacement = None
+        if rec_ru is not None:
+            self.rec_ru = rec_ru
+        if rec_wake is not None:
+            self.rec_wake = rec_wake
+        if wake_names is not None:
+            self.wake_names = [name for name in wake_names if name]
+        debug_logger.debug("Распознаватели с новой грамматикой подключены")
+
+    def set_input_format(self, samplerate, channels, frames):
+        """
+        Формат блоков, которые будут приходить в кольцевой буфер.
+        Конвертер создаётся в потоке декодирования перед следующим блоком.
+        :param frames: кадров в блоке устройства
+        """
+        self._input_format = (samplerate, channels, frames)
+
+    def _apply_input_format(self):
+        samplerate, channels, frames = self._input_format
+        self._input_format = None
+        if (samplerate, channels) == (SAMPLE_RATE, 1):
+            self.converter = None
+            return
+        self.converter = NativeFormatConverter(samplerate, channels, SAMPLE_RATE, self.block_size,
+                                               max_frames=frames or None)
+        debug_logger.info(f"Приведение захвата к 16 кГц моно в потоке декодирования: "
+                          f"{samplerate} Гц, каналов: {channels}")
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if self._input_format is not None:
+                self._apply_input_format()
+            converter = self.converter
+            frames, timestamp = self.ring_buffer.pop_into(converter.raw if converter is not None else self._block,
+                                                          timeout=0.5)
+            if not frames:
+                continue
+            if self._input_format is not None:
+                # Блок уже нового потока, а прочитан под прежний формат
+                self.blocks_decoded += 1
+                continue
+
+            try:
+                if converter is None:
+                    self.process_block(self._block if frames == len(self._block) else self._block[:frames],
+                                       timestamp)
+                else:
+                    converter.feed(frames)
+                    while converter.next_block(self._block):
+                        self.process_block(self._block, timestamp)
+            except Exception as e:
+                debug_logger.error(f"Ошибка в потоке декодирования: {e}")
+            self.blocks_decoded += 1
+            self._check_backlog()
+
+    def process_block(self, block, timestamp):
+        """Анализ громкости и распознавание одного блока"""
+        if self._replacement is not None:
+            self._swap_recognizers()
+
+        # === АНАЛИЗ ГРОМКОСТИ ===
+        rms = 0.0
+        try:
+            if self.preprocessor is not None:
+                self.preprocessor.filter(block)
+            rms = self._rms(block)
+            if self.noise_floor is not None and self.noise_floor.update(rms):
+                self._apply_noise_floor()
+            if rms >= self.signal_rms and self.on_voice:
+                self.on_voice(timestamp)
+            if rms >= (self.vad.stop_rms if self.vad else self.signal_rms):
+                self.last_speech_time = timestamp
+                self._idle_reset_done = False
+        except Exception as e:
+            debug_logger.error(f"Ошибка при анализе громкости: {e}")
+
+        if self.rec_ru is None:
+            return
+        self._check_idle(timestamp)
+
+        if self.preprocessor is not None:
+            # Гейт после анализа громкости: watchdog и оценка фона видят настоящий фон микрофона
+            try:
+                self.preprocessor.gate(block)
+            except Exception as e:
+                debug_logger.error(f"Ошибка в спектральном гейте: {e}")
+
+        if self.vad is None:
+            self._feed(block, timestamp)
+            self._check_utterance_length()
+            return
+
+        # === VAD: в тишине распознаватели не работают ===
+        event = self.vad.process(block, rms)
+        if event == VAD_SILENCE:
+            return
+        if event == VAD_START:
+            for chunk in self.vad.preroll():
+                self._feed(chunk, timestamp)
+        self._feed(block, timestamp)
+        if event == VAD_END:
+            if self._waiting_for_wake(timestamp):
+                self._spot_wake_word(None, timestamp)
+            else:
+                self._flush()
+        else:
+            self._check_utterance_length()
+
+    def _check_utterance_length(self):
+        """Слишком длинная фраза закрывается через FinalResult, не дожидаясь тишины"""
+        if self.max_utterance_blocks and self._utterance_blocks >= self.max_utterance_blocks:
+            debug_logger.debug(f"Фраза длиннее {self.max_utterance_blocks} блоков, закрываю принудительно")
+            self._flush()
+            self._utterance_blocks = 0
+
+    def _check_idle(self, timestamp):
+        """После долгого простоя распознаватели сбрасываются, чтобы состояние декодера не копилось"""
+        if (not self.idle_reset_seconds or self._idle_reset_done or self.last_speech_time is None
+                or timestamp - self.last_speech_time < self.idle_reset_seconds):
+            return
+        self._idle_reset_done = True
+        try:
+            self._reset_recognizers()
+            debug_logger.debug(f"Простой {self.idle_reset_seconds} с: распознаватели сброшены")
+        except Exception as e:
+            debug_logger.error(f"Ошибка при сбросе распознавателей: {e}")
+
+    def _reset_recognizers(self):
+        for recognizer in (self.rec_ru, self.rec_en, self.rec_wake):
+            if recognizer is not None:
+                recognizer.Reset()
+        if self.utterance is not None:
+            self.utterance.clear()
+        self._utterance_blocks = 0
+        self._last_partial = ""
+        self._early_text = None
+        self._early_en = False
+
+    def _rms(self, block):
+        """RMS блока без временных массивов: int16 копируется в черновик float32, сумма квадратов - через dot"""
+        size = len(block)
+        if size == 0:
+            return 0.0
+        square = self._square if size == len(self._square) else self._square[:size]
+        np.copyto(square, block)
+        return math.sqrt(float(np.dot(square, square)) / size)
+
+    def _as_pcm(self, block):
+        """Байты блока для AcceptWaveform; текущий блок из кольцевого буфера отдаётся без копирования"""
+        if block is self._block:
+            return self._pcm_view if self._pcm_view is not None else bytes(self._pcm)
+        return block.tobytes()
+
+    def _waiting_for_wake(self, timestamp):
+        """Полное распознавание выключено и ждём имя ассистента"""
+        if self.rec_wake is None:
+            return False
+        if timestamp < self.armed_until:
+            return False
+        if self._armed:
+            # Окно закрылось: дочитываем то, что успели услышать полные распознаватели
+            self._armed = False
+            self._flush()
+            debug_logger.debug("Окно полного распознавания закрыто, жду имя ассистента")
+        return True
+
+    def _feed(self, block, timestamp):
+        if self._waiting_for_wake(timestamp):
+            self._spot_wake_word(block, timestamp)
+        else:
+            self._decode(block)
+
+    def _spot_wake_word(self, block, timestamp):
+        """
+        Ищет имя ассистента дешёвым распознавателем.
+        :param block: очередной блок; None - конец фразы по VAD
+        """
+        try:
+            if block is None:
+                text = parse_text(self.rec_wake.FinalResult())
+                finished = True
+            else:
+                self.utterance.append(block)
+                finished = self.rec_wake.AcceptWaveform(self._as_pcm(block))
+                if finished:
+                    text = parse_text(self.rec_wake.Result())
+                else:
+                    text = parse_text(self.rec_wake.PartialResult(), key="partial")
+
+            if text and any(name in text for name in self.wake_names):
+                self.rec_wake.Reset()
+                self._arm(timestamp)
+                debug_logger.debug(f"Имя ассистента услышано ({text}), полное распознавание включено")
+                # Полные распознаватели получают фразу целиком, начиная с имени
+                self._decode(self.utterance.samples(), remember=False)
+                if block is None:
+                    self._flush()
+            elif finished:
+                self.utterance.clear()
+        except Exception as e:
+            debug_logger.error(f"Ошибка в детекторе имени: {e}")
+
+    def _arm(self, timestamp):
+        self._armed = True
+        self.armed_until = timestamp + WAKE_WINDOW_SECONDS
+
+    def _decode(self, block, remember=True):
+        """Скармливает блок обоим распознавателям"""
+        data = self._as_pcm(block)
+        ru_text = ""
+        en_text = ""
+        ru_conf = en_conf = None
+        if remember:
+            self._utterance_blocks += 1
+            if self.utterance is not None:
+                self.utterance.append(block)
+
+        try:
+            if self.rec_ru.AcceptWaveform(data):
+                result = self.rec_ru.Result()
+                ru_text = self._finish_ru(result)
+                ru_conf = self._confidence(result)
+                en_text, en_conf = self._cascade_en(ru_text, ru_conf)
+            elif self.early_dispatch is not None:
+                self._check_partial()
+
+            if self.rec_en is not None and self.rec_en.AcceptWaveform(data):
+                result = self.rec_en.Result()
+                en_text = self._finish_en(result)
+                en_conf = self._confidence(result)
+
+            self._collect_finals(ru_text, en_text, ru_conf, en_conf)
+        except Exception as e:
+            debug_logger.error(f"Ошибка в обработке распознавания: {e}")
+
+    def _flush(self):
+        """Конец фразы по VAD: забираем остаток через FinalResult (он же сбрасывает распознаватели)"""
+        try:
+            ru_result = self.rec_ru.FinalResult()
+            en_result = self.rec_en.FinalResult() if self.rec_en is not None else ""
+            ru_text = self._finish_ru(ru_result)
+            ru_conf = self._confidence(ru_result)
+            if self.cascade is not None:
+                en_text, en_conf = self._cascade_en(ru_text, ru_conf)
+            else:
+                en_text = self._finish_en(en_result)
+                en_conf = self._confidence(en_result)
+            self._collect_finals(ru_text, en_text, ru_conf, en_conf, flush=True)
+        except Exception as e:
+            debug_logger.error(f"Ошибка при завершении фразы: {e}")
+
+    def _finish_ru(self, result_json):
+        """Текст законченной русской фразы; фразы поиска перераспознаются открытым словарём"""
+        text = self._ru_text(result_json)
+        if self.rec_search is not None and text and needs_open_vocabulary(text):
+            text = self._redecode_open() or text
+        if self.utterance is not None and self.cascade is None:
+            self.utterance.clear()  # В каскаде буфер ещё нужен EN и очищается в _cascade_en
+        self._utterance_blocks = 0
+
+        self._last_partial = ""
+        if self._early_text is not None:
+            if not text or text.startswith(self._early_text):
+                debug_logger.debug(f"Финальный результат уже выполнен по частичному: {text}")
+                text = ""
+            else:
+                self._early_en = False  # Распознана другая фраза: её EN-результат нужен
+            self._early_text = None
+        return text
+
+    def _finish_en(self, result_json):
+        """
+        Текст законченной английской фразы. EN-модель может закончить фразу на несколько блоков
+        позже RU: результат фразы, уже выполненной по частичному, отбрасывается, когда бы он ни пришёл
+        """
+        if self._early_en:
+            self._early_en = False
+            debug_logger.debug("EN-результат фразы, выполненной по частичному результату, отброшен")
+            return ""
+        return parse_text(result_json) if result_json else ""
+
+    def _ru_text(self, result_json):
+        """Текст русского результата; из N-best альтернатив берётся гипотеза с командой"""
+        if self.command_index is not None:
+            alternatives = parse_alternatives(result_json)
+            if alternatives is not None:
+                text, index = self.command_index.choose(alternatives)
+                if index:
+                    debug_logger.debug(f"N-best: выбрана альтернатива {index + 1} '{text}' "
+                                       f"вместо '{alternatives[0]}'")
+                return text
+        return parse_text(result_json)
+
+    def _check_partial(self):
+        """
+        Смотрит частичный результат фразы. Команда отправляется, если один и тот же
+        частичный текст держится две проверки подряд и его одобряет early_dispatch
+        """
+        self._partial_counter += 1
+        if self._early_text is not None or self._partial_counter % PARTIAL_CHECK_BLOCKS:
+            return
+
+        partial = parse_text(self.rec_ru.PartialResult(), key="partial")
+        if partial and partial == self._last_partial and self.early_dispatch(partial):
+            self._early_text = partial
+            self._early_en = self.rec_en is not None or self.cascade is not None
+            debug_logger.info(f"Команда выполнена по частичному результату: {partial}")
+            self._dispatch(partial)
+        self._last_partial = partial
+
+    def _redecode_open(self):
+        """Распознаёт буфер фразы открытым словарём"""
+        data = self.utterance.samples().tobytes()
+        parts = []
+        if self.rec_search.AcceptWaveform(data):
+            parts.append(parse_text(self.rec_search.Result()))
+        parts.append(parse_text(self.rec_search.FinalResult()))
+        text = " ".join(part for part in parts if part)
+        debug_logger.debug(f"Фраза поиска перераспознана открытым словарём: {text}")
+        return text
+
+    def _cascade_en(self, ru_text, ru_conf):
+        """
+        Каскад: буфер фразы распознаётся английской моделью, только если русский результат
+        пустой, неуверенный или по словарю ожидается английская цель.
+        :return: (текст EN, уверенность EN)
+        """
+        if self.cascade is None:
+            return "", None
+        try:
+            samples = self.utterance.samples()
+            if self._early_en or len(samples) < MIN_CASCADE_SAMPLES:
+                return "", None
+            if not self.cascade.needs_english(ru_text, ru_conf):
+                return "", None
+            en_text, en_conf = self.cascade.decode(samples)
+            debug_logger.debug(f"Каскад: фраза перераспознана EN ('{ru_text}' -> '{en_text}')")
+            return en_text, en_conf
+        except Exception as e:
+            debug_logger.error(f"Ошибка в каскадном распознавании EN: {e}")
+            return "", None
+        finally:
+            self._early_en = False
+            self.utterance.clear()
+
+    def _confidence(self, result_json):
+        """Уверенность результата нужна только арбитру и каскаду"""
+        if (self.arbiter is None and self.cascade is None) or not result_json:
+            return None
+        return word_confidence(result_json)
+
+    def _collect_finals(self, ru_text, en_text, ru_conf=None, en_conf=None, flush=False):
+        """
+        Сводит финальные результаты RU и EN одной фразы, чтобы выбор был один и без повторной команды.
+        Результат первой модели ждёт вторую, пока та не закончит фразу, не пройдёт
+        FINAL_HOLD_BLOCKS блоков или не наступит конец фразы (flush).
+        """
+        if self.rec_en is None or self.cascade is not None:
+            self._emit(ru_text, en_text, ru_conf, en_conf)  # Работает одна модель, EN каскада уже посчитан
+            return
+        if en_text == "huh":
+            en_text, en_conf = "", None
+
+        held = self._held
+        if held is None:
+            self._held_blocks = 0
+        else:
+            self._held = None
+            ru_text, ru_conf = self._join_final(held[0], held[2], ru_text, ru_conf)
+            en_text, en_conf = self._join_final(held[1], held[3], en_text, en_conf)
+            self._held_blocks += 1
+            if self._held_blocks >= FINAL_HOLD_BLOCKS:
+                flush = True  # Вторая модель так и не закончила фразу
+        if not ru_text and not en_text:
+            return
+        if (ru_text and en_text) or flush:
+            self._emit(ru_text, en_text, ru_conf, en_conf)
+            return
+        self._held = (ru_text, en_text, ru_conf, en_conf)
+
+    @staticmethod
+    def _join_final(first, first_conf, second, second_conf):
+        """Два финальных куска одной модели - одна гипотеза (уверенность - среднее известных)"""
+        if not first:
+            return second, second_conf
+        if not second:
+            return first, first_conf
+        known = [conf for conf in (first_conf, second_conf) if conf is not None]
+        return f"{first} {second}", sum(known) / len(known) if known else None
+
+    def _emit(self, ru_text, en_text, ru_conf=None, en_conf=None):
+        if en_text == "huh":
+            en_text = ""
+        if self.arbiter is not None:
+            final_text = self.arbiter.choose(ru_text, ru_conf, en_text, en_conf)
+        else:
+            final_text = ru_text or en_text
+        if final_text:
+            if self._armed and any(name in final_text for name in self.wake_names):
+                self._arm(time.time())  # Имя прозвучало снова - продлеваем окно
+            self._dispatch(final_text)
+
+    def _dispatch(self, text):
+        """Передаёт фразу дальше и открывает для неё замер задержки"""
+        if self.latency_tracker is not None:
+            self.latency_tracker.begin(self.last_speech_time or time.time(), text)
+            self.latency_tracker.mark("final")
+        self.on_result(text)
+
+    def _check_backlog(self):
+        """Предупреждает в логах, когда декодирование не успевает за захватом"""
+        backlog = self.ring_buffer.backlog
+        if not self._backlog_warned and backlog > self.ring_buffer.capacity // 2:
+            self._backlog_warned = True
+            debug_logger.warning(f"Декодирование отстаёт от захвата: в очереди {backlog} блоков")
+        elif self._backlog_warned and backlog == 0:
+            self._backlog_warned = False
+
+
+class AudioPipeline:
+    """
+    Связка "захват -> кольцевой буфер -> поток декодирования".
+    Метод capture передаётся в sd.InputStream как callback.
+    :param worker_factory: класс потока декодирования (например, MultiprocessDecodeWorker)
+    :param latency_tracker: LatencyTracker для замеров задержки фраз (None - без замеров)
+    """
+
+    def __init__(self, on_result, on_voice=None, vad=None, capacity=RING_CAPACITY, block_size=BLOCK_SIZE,
+                 worker_factory=None, latency_tracker=None):
+        self.ring_buffer = AudioRingBuffer(capacity, block_size)
+        self.worker = (worker_factory or DecodeWorker)(self.ring_buffer, on_result, on_voice, vad,
+                                                       latency_tracker=latency_tracker)
+        self.blocks_captured = 0
+        self.input_overflows = 0  # Переполнения, о которых сообщил сам PortAudio
+        self.last_callback_time = None  # time.monotonic() последнего callback'а (пульс потока)
+        self._reported = (0, 0)
+
+    def set_recognizers(self, rec_ru, rec_en):
+        self.worker.set_recognizers(rec_ru, rec_en)
+
+    def set_en_recognizer(self, rec_en):
+        self.worker.set_en_recognizer(rec_en)
+
+    def set_search_recognizer(self, rec_search):
+        self.worker.set_search_recognizer(rec_search)
+
+    def set_early_dispatch(self, predicate):
+        self.worker.set_early_dispatch(predicate)
+
+    def set_wake_recognizer(self, rec_wake, names):
+        self.worker.set_wake_recognizer(rec_wake, names)
+
+    def replace_recognizers(self, rec_ru=None, rec_wake=None, wake_names=None):
+        self.worker.replace_recognizers(rec_ru, rec_wake, wake_names)
+
+    def set_arbiter(self, arbiter):
+        self.worker.set_arbiter(arbiter)
+
+    def set_cascade(self, cascade):
+        self.worker.set_cascade(cascade)
+
+    def set_command_index(self, command_index):
+        self.worker.set_command_index(command_index)
+
+    def set_noise_floor(self, estimator):
+        self.worker.set_noise_floor(estimator)
+
+    def set_preprocessor(self, preprocessor):
+        self.worker.set_preprocessor(preprocessor)
+
+    def set_endpointing(self, silence_ms, max_utterance_s=0, idle_reset_s=0):
+        self.worker.set_endpointing(silence_ms, max_utterance_s, idle_reset_s)
+
+    def attach_stream(self, stream):
+        """
+        Настраивает кольцевой буфер и поток декодирования под формат открытого, но ещё
+        не запущенного потока (samplerate, channels, blocksize как у sd.InputStream).
+        :return: тот же поток
+        """
+        frames = stream.blocksize or self.worker.block_size
+        self.ring_buffer.reconfigure(frames, stream.channels)
+        self.worker.set_input_format(int(stream.samplerate), stream.channels, frames)
+        return stream
+
+    def start(self):
+        if not self.worker.is_alive():
+            self.worker.start()
+
+    def stop(self):
+        self.worker.stop()
+        if self.worker.is_alive() and self.worker is not threading.current_thread():
+            self.worker.join(timeout=1.0)
+        self.ring_buffer.clear()
+
+    def capture(self, indata, frames, time_info, status):
+        """
+        Callback PortAudio: только копирует блок в кольцевой буфер.
+        Никакого логирования и распознавания здесь быть не должно.
+        """
+        self.last_callback_time = time.monotonic()
+        if status and getattr(status, 'input_overflow', False):
+            self.input_overflows += 1
+
+        if frames == 0:
+            return
+
+        self.blocks_captured += 1
+        timestamp = time.time()
+        if time_info is not None:
+            # Поправка на время от АЦП до callback'а
+            try:
+                timestamp -= max(0.0, time_info.currentTime - time_info.inputBufferAdcTime)
+            except AttributeError:
+                pass
+        self.ring_buffer.push(indata, timestamp)
+
+    def wait_idle(self, timeout=5.0):
+        """
+        Ждёт, пока поток декодирования разберёт все захваченные блоки.
+        :return: True, если очередь опустела до истечения timeout
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            handled = self.worker.blocks_decoded + self.ring_buffer.overflow_count
+            if handled >= self.blocks_captured:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def stats(self):
+        """Снимок счётчиков конвейера"""
+        return {
+            "captured": self.blocks_captured,
+            "decoded": self.worker.blocks_decoded,
+            "backlog": self.ring_buffer.backlog,
+            "max_backlog": self.ring_buffer.max_backlog,
+            "ring_overflows": self.ring_buffer.overflow_count,
+            "input_overflows": self.input_overflows,
+        }
+
+    def log_stats_if_changed(self):
+        """Пишет счётчики в лог, если с прошлого раза появились новые переполнения"""
+        stats = self.stats()
+        current = (stats["ring_overflows"], stats["input_overflows"])
+        if current != self._reported:
+            self._reported = current
+            logger.warning(f"Переполнения аудиобуфера: {stats}")
+            debug_logger.warning(f"Переполнения аудиобуфера: {stats}")
+        return stats
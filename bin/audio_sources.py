@@ -0,0 +1,141 @@
+"""
+Источники звука для конвейера распознавания.
+
+По умолчанию звук идёт с микрофона через sounddevice, но тот же callback
+можно кормить из WAV-файлов - для тестов и замеров на машине без звуковой карты.
+Любой источник повторяет нужную часть интерфейса sd.InputStream:
+start(), stop(), abort(), close() и свойство active.
+"""
+import threading
+import time
+import wave
+
+import numpy as np
+
+from bin.device_registry import device_registry
+from logging_config import debug_logger
+
+
+def native_format(device=None):
+    """
+    Родной формат входного устройства.
+    :return: (частота, количество каналов)
+    """
+    info = device_registry.backend.query_devices(device, 'input')
+    return int(info['default_samplerate']), max(1, int(info['max_input_channels']))
+
+
+def open_input_stream(callback, device=None, samplerate=16000, channels=1, blocksize=512, native=False):
+    """
+    Поток с микрофона (sd.InputStream).
+    :param device: ID устройства; None - устройство по умолчанию
+    :param native: открыть устройство в родном формате; к samplerate/моно звук приводит поток
+        декодирования (AudioPipeline.attach_stream), а не callback
+    """
+    sd = device_registry.backend  # sounddevice или тестовый бэкенд (bin.fake_audio_backend)
+
+    kwargs = dict(samplerate=samplerate, channels=channels, dtype='int16',
+                  blocksize=blocksize, callback=callback)
+    if native:
+        rate, device_channels = native_format(device)
+        if (rate, device_channels) != (samplerate, channels):
+            kwargs.update(samplerate=rate, channels=device_channels,
+                          blocksize=int(round(blocksize * rate / samplerate)))
+            debug_logger.info(f"Захват в родном формате устройства: {rate} Гц, каналов: {device_channels}")
+    if device is not None:
+        kwargs['device'] = device
+    return sd.InputStream(**kwargs)
+
+
+class WavFileSource:
+    """
+    Проигрывает WAV-файлы (16 кГц, моно, 16 бит) в callback блоками, как это делает InputStream.
+    :param paths: список WAV-файлов, проигрываются подряд
+    :param callback: функция (indata, frames, time_info, status)
+    :param speed: 1.0 - в реальном времени, 2.0 - вдвое быстрее, 0 - без пауз
+    :param tail_silence: секунды тишины после каждого файла, чтобы VAD закрыл фразу
+    """
+
+    def __init__(self, paths, callback, speed=1.0, blocksize=512, tail_silence=1.0, samplerate=16000):
+        self.paths = list(paths)
+        self.callback = callback
+        self.speed = speed
+        self.blocksize = blocksize
+        self.tail_silence = tail_silence
+        self.samplerate = samplerate
+        self.channels = 1
+        self.file_end_times = {}  # путь -> момент, когда в callback ушёл последний блок файла
+        self.audio_seconds = 0.0
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._finished = threading.Event()
+
+    @classmethod
+    def factory(cls, paths, speed=1.0):
+        """Фабрика с тем же вызовом, что и open_input_stream - для подмены источника в ассистенте"""
+        def create(callback, device=None, native=False):
+            return cls(paths, callback, speed=speed)
+        return create
+
+    @property
+    def active(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._stop_event.clear()
+        self._finished.clear()
+        self._thread = threading.Thread(target=self._run, name="WavFileSource", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    abort = stop
+
+    def close(self):
+        self.stop()
+
+    def wait(self, timeout=None):
+        """Ждёт, пока все файлы будут проиграны"""
+        return self._finished.wait(timeout)
+
+    def _read_samples(self, path):
+        with wave.open(path, 'rb') as wav:
+            if (wav.getframerate() != self.samplerate or wav.getnchannels() != 1
+                    or wav.getsampwidth() != 2):
+                raise ValueError(f"{path}: нужен WAV {self.samplerate} Гц, моно, 16 бит")
+            return np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+
+    def _run(self):
+        block = np.zeros((self.blocksize, 1), dtype=np.int16)
+        block_seconds = self.blocksize / self.samplerate
+        next_time = time.perf_counter()
+        try:
+            for path in self.paths:
+                samples = self._read_samples(path)
+                self.audio_seconds += len(samples) / self.samplerate
+                silence_blocks = int(self.tail_silence / block_seconds)
+                total_blocks = -(-len(samples) // self.blocksize) + silence_blocks
+
+                for i in range(total_blocks):
+                    if self._stop_event.is_set():
+                        return
+                    chunk = samples[i * self.blocksize:(i + 1) * self.blocksize]
+                    block[:len(chunk), 0] = chunk
+                    block[len(chunk):, 0] = 0
+                    self.callback(block, self.blocksize, None, None)
+
+                    if (i + 1) * self.blocksize >= len(samples) and path not in self.file_end_times:
+                        self.file_end_times[path] = time.time()
+
+                    if self.speed > 0:
+                        next_time += block_seconds / self.speed
+                        delay = next_time - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+        except Exception as e:
+            debug_logger.error(f"Ошибка при воспроизведении WAV: {e}")
+        finally:
+            self._finished.set()
@@ -0,0 +1,396 @@
+"""
+Микро-бенчмарки горячих участков ассистента.
+
+    python -m bin.benchmarks ingest
+    python -m bin.benchmarks preprocess
+    python -m bin.benchmarks resample
+    python -m bin.benchmarks intents
+    python -m bin.benchmarks fuzzy
+    python -m bin.benchmarks shortcuts
+    python -m bin.benchmarks normalize
+
+Распознаватели здесь заменены пустыми (_NullRecognizer), чтобы мерить только
+накладные расходы самого конвейера, а не Kaldi.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from bin.audio_pipeline import AudioRingBuffer, DecodeWorker, BLOCK_SIZE, SAMPLE_RATE
+from bin.intent_matcher import IntentMatcher, CENSOR_STEMS, OPEN_STEMS, CLOSE_STEMS, PLAYER_TOGGLE_STEMS, \
+    PLAYER_NEXT_STEMS, PLAYER_PREV_STEMS, COMMAND, OPEN, CENSOR
+from bin.intent_registry import Intent, IntentRegistry, STAGE_ACTION, STAGE_ALWAYS
+from bin.command_grammar import ACTION_STEMS, SPECIAL_STEMS
+from bin.fuzzy_commands import FuzzyCommandIndex, ACT_SCORE, BUDGET_MS as FUZZY_BUDGET_MS, is_confident
+from bin.shortcut_index import ShortcutIndex
+from bin.hypothesis_ranking import CommandIndex
+from bin.word_normalizer import stem
+from bin.preprocessing import AudioPreprocessor, BUDGET_MS
+from bin.resampling import NativeFormatConverter
+from bin.latency_metrics import LatencyTracker
+
+EMPTY_PARTIAL = '{\n  "partial" : ""\n}'
+EMPTY_TEXT = '{\n  "text" : ""\n}'
+
+
+class _NullRecognizer:
+    """Распознаватель, который ничего не распознаёт (ответы в формате Vosk)"""
+
+    def AcceptWaveform(self, data):
+        return False
+
+    def Result(self):
+        return EMPTY_TEXT
+
+    def PartialResult(self):
+        return EMPTY_PARTIAL
+
+    def FinalResult(self):
+        return EMPTY_TEXT
+
+
+def _make_blocks(count, seed=0):
+    """Блоки (512, 1) int16, как их отдаёт sd.InputStream: тишина вперемешку с 'речью'"""
+    rng = np.random.default_rng(seed)
+    blocks = []
+    for i in range(count):
+        amplitude = 3000 if (i // 50) % 2 else 30
+        blocks.append((rng.standard_normal((BLOCK_SIZE, 1)) * amplitude).astype(np.int16))
+    return blocks
+
+
+def legacy_ingest(indata, rec_ru, rec_en, on_result):
+    """Прежний audio_callback: распознавание прямо в callback'е с временными массивами"""
+    audio_data = np.frombuffer(indata, dtype=np.int16)
+    rms = np.sqrt(np.mean(audio_data.astype(np.float32) ** 2))
+    is_silent = rms < 20
+
+    data = indata.tobytes()
+    ru_text = ""
+    en_text = ""
+    if rec_ru.AcceptWaveform(data):
+        result = json.loads(rec_ru.Result())
+        ru_text = result.get("text", "").strip().lower()
+    if rec_en.AcceptWaveform(data):
+        result = json.loads(rec_en.Result())
+        temp_en = result.get("text", "").strip().lower()
+        if temp_en and temp_en != "huh":
+            en_text = temp_en
+    final_text = ru_text or en_text
+    if final_text and not is_silent:
+        on_result(final_text)
+
+
+def _measure(step, blocks, repeats):
+    """
+    Прогоняет step по всем блокам repeats раз.
+    :return: (блоков в секунду, байт временной памяти на блок)
+    """
+    for block in blocks[:10]:
+        step(block)  # Прогрев
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for block in blocks:
+            step(block)
+    elapsed = time.perf_counter() - start
+    rate = len(blocks) * repeats / elapsed
+
+    tracemalloc.start()
+    peak_total = 0
+    for block in blocks:
+        tracemalloc.reset_peak()
+        step(block)
+        current, peak = tracemalloc.get_traced_memory()
+        peak_total += peak - current
+    tracemalloc.stop()
+    return rate, peak_total / len(blocks)
+
+
+def bench_ingest(count=1000, repeats=5):
+    """
+    Прежний путь 'callback -> Kaldi' против 'кольцевой буфер -> DecodeWorker'.
+    Весь путь блока стоит примерно столько же, сколько прежний: выигрыш - в памяти на блок
+    и в том, что в callback'е PortAudio остаётся только копия в кольцевой буфер (отдельная строка).
+    Память на блок ограничена, а не нулевая: буферы не выделяются, остаются мелкие временные объекты
+    """
+    blocks = _make_blocks(count)
+    results = []
+
+    null_ru, null_en = _NullRecognizer(), _NullRecognizer()
+    results.append(("прежний callback", _measure(
+        lambda block: legacy_ingest(block, null_ru, null_en, lambda text: None), blocks, repeats)))
+
+    ring = AudioRingBuffer(capacity=4)
+    # Свой замер задержки: фразы бенчмарка не попадают в log/metrics.log
+    worker = DecodeWorker(ring, on_result=lambda text: None, latency_tracker=LatencyTracker(log=False))
+    worker.set_recognizers(_NullRecognizer(), _NullRecognizer())
+
+    def pipeline_step(block):
+        ring.push(block, 0.0)
+        frames, timestamp = ring.pop_into(worker._block)
+        worker.process_block(worker._block, timestamp)
+
+    results.append(("кольцевой буфер + DecodeWorker", _measure(pipeline_step, blocks, repeats)))
+
+    callback_ring = AudioRingBuffer()
+
+    def callback_step(block):
+        if not callback_ring.push(block, 0.0):
+            callback_ring.clear()  # Читателя нет: освобождаем место, как будто блоки разобраны
+
+    results.append(("из них в callback'е (push)", _measure(callback_step, blocks, repeats)))
+
+    for title, (rate, allocated) in results:
+        print(f"{title:32} {rate:10.0f} блоков/с  {allocated:8.0f} байт временной памяти на блок")
+    print("Память на блок ограничена: буферы выделены заранее, на блок остаются только мелкие "
+          "временные объекты, размер которых не зависит от длины блока")
+    return results
+
+
+def bench_preprocess(count=1000, repeats=5):
+    """Стоимость предобработки на блок: фильтр DC + high-pass и он же со спектральным гейтом"""
+    blocks = _make_blocks(count)
+    results = []
+    for title, gate in (("фильтр DC + high-pass", False), ("фильтр + спектральный гейт", True)):
+        # Бюджет не ограничиваем, чтобы гейт не отключился посреди замера
+        preprocessor = AudioPreprocessor(spectral_gate=gate, budget_ms=float("inf"))
+        scratch = np.zeros(BLOCK_SIZE, dtype=np.int16)
+
+        def step(block):
+            np.copyto(scratch, block[:, 0])
+            preprocessor.process(scratch)
+
+        rate, allocated = _measure(step, blocks, repeats)
+        results.append((title, rate, allocated))
+
+    block_ms = BLOCK_SIZE / SAMPLE_RATE * 1000
+    for title, rate, allocated in results:
+        cost_ms = 1000 / rate
+        print(f"{title:28} {cost_ms * 1000:8.0f} мкс на блок ({cost_ms / block_ms:6.1%} реального времени, "
+              f"бюджет {BUDGET_MS:.1f} мс)  {allocated:8.0f} байт временной памяти на блок")
+    return results
+
+
+def bench_resample(seconds=30, repeats=3):
+    """
+    Стоимость сведения каналов и передискретизации в 16 кГц для типичных родных форматов
+    (работа потока декодирования на один сырой блок устройства из кольцевого буфера)
+    """
+    results = []
+    for rate, channels in ((48000, 2), (44100, 2), (48000, 1), (22050, 1)):
+        blocksize = int(round(BLOCK_SIZE * rate / SAMPLE_RATE))
+        rng = np.random.default_rng(0)
+        blocks = [(rng.standard_normal((blocksize, channels)) * 1000).astype(np.int16)
+                  for _ in range(int(seconds * rate / blocksize))]
+        converter = NativeFormatConverter(rate, channels, SAMPLE_RATE, BLOCK_SIZE, max_frames=blocksize)
+        out = np.zeros(BLOCK_SIZE, dtype=np.int16)
+
+        def step(block):
+            np.copyto(converter.raw, block.reshape(-1))  # Как pop_into кольцевого буфера
+            converter.feed(block.size)
+            while converter.next_block(out):
+                pass
+
+        rate_blocks, allocated = _measure(step, blocks, repeats)
+        results.append((f"{rate} Гц, каналов: {channels}", rate_blocks, allocated))
+
+    block_ms = BLOCK_SIZE / SAMPLE_RATE * 1000
+    for title, rate_blocks, allocated in results:
+        cost_ms = 1000 / rate_blocks
+        print(f"{title:24} {cost_ms * 1000:8.0f} мкс на блок ({cost_ms / block_ms:6.1%} реального времени)  "
+              f"{allocated:8.0f} байт временной памяти на блок")
+    return results
+
+
+def _make_commands(count, seed=0):
+    """Ключи commands.json: псевдослова из русских слогов, по одному-два слова"""
+    rng = np.random.default_rng(seed)
+    syllables = ["ка", "ро", "ми", "те", "лег", "рам", "дис", "корд", "стим", "хро", "ну", "вар", "зон", "пле"]
+    commands = {}
+    while len(commands) < count:
+        words = ["".join(rng.choice(syllables, size=rng.integers(2, 5))) for _ in range(rng.integers(1, 3))]
+        commands[" ".join(words)] = f"{words[0]}.lnk"
+    return commands
+
+
+def legacy_match(text, names, commands):
+    """Прежние проверки run_script и handle_*_command на одну фразу"""
+    censored = any(kw in text for kw in CENSOR_STEMS)
+    censored = censored and any(kw in text for kw in CENSOR_STEMS)
+    has_name = any(name in text for name in names)
+    action = next((kw for kw in ACTION_STEMS if kw in text), None)
+    is_open = any(kw in text for kw in OPEN_STEMS)
+    is_close = not is_open and any(kw in text for kw in CLOSE_STEMS)
+    special = next((kw for kw in SPECIAL_STEMS if kw in text), None)
+    keyword = None
+    if not special:
+        for _ in range(2):  # handle_app_command и handle_folder_command
+            keyword = next((kw for kw in commands if kw in text), None)
+    player = 'плеер' in text and (any(kw in text for kw in PLAYER_TOGGLE_STEMS) or
+                                  any(kw in text for kw in PLAYER_NEXT_STEMS) or
+                                  any(kw in text for kw in PLAYER_PREV_STEMS))
+    return censored, has_name, action, is_open or is_close, special, keyword, player
+
+
+def bench_intents(commands=3000, utterances=500, repeats=5):
+    """Поиск словарей во фразе: прежние подстроковые проверки против одного прохода автомата"""
+    names = ["джо", "джарвис", "пятница"]
+    results = []
+    for count in (100, commands):
+        user_commands = _make_commands(count)
+        keys = list(user_commands)
+        rng = np.random.default_rng(1)
+        texts = []
+        for i in range(utterances):
+            target = keys[rng.integers(len(keys))] if i % 4 else "калькулятор"
+            texts.append(f"джо {'открой' if i % 2 else 'закрой'} {target}")
+
+        # Встроенные команды с пустыми обработчиками (настоящая таблица собирается в main.py)
+        registry = IntentRegistry()
+        for stem in SPECIAL_STEMS:
+            registry.register(Intent(stem, [stem], None))
+        registry.register(Intent("плеер", ['плеер'], None, stage=STAGE_ALWAYS))
+
+        started = time.perf_counter()
+        matcher = IntentMatcher(names, user_commands, registry)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        def automaton(text):
+            hits = matcher.scan(text)
+            return (CENSOR in hits, OPEN in hits, registry.resolve(hits, STAGE_ACTION), hits.first(COMMAND),
+                    registry.resolve(hits, STAGE_ALWAYS))
+
+        for text in texts:
+            legacy = legacy_match(text, names, user_commands)
+            if legacy[4] is None:
+                assert matcher.scan(text).first(COMMAND) == legacy[5], text
+
+        for title, step in ((f"подстроки, команд: {count}", lambda text: legacy_match(text, names, user_commands)),
+                            (f"автомат, команд: {count}", automaton)):
+            rate, allocated = _measure(step, texts, repeats)
+            print(f"{title:28} {1e6 / rate:8.1f} мкс на фразу  {allocated:8.0f} байт временной памяти")
+            results.append((title, rate, allocated))
+        print(f"{'сборка автомата':28} {build_ms:8.1f} мс (только при изменении команд или имён)")
+    return results
+
+
+def bench_fuzzy(commands=3000, utterances=300):
+    """Нечёткий поиск цели с одной ошибочной буквой среди тысяч ключей команд"""
+    user_commands = _make_commands(commands)
+    keys = list(user_commands)
+    rng = np.random.default_rng(2)
+    texts, expected = [], []
+    for _ in range(utterances):
+        key = keys[rng.integers(len(keys))]
+        position = rng.integers(len(key))
+        texts.append(f"джо открой {key[:position]}ы{key[position + 1:]}")
+        expected.append(key)
+
+    started = time.perf_counter()
+    index = FuzzyCommandIndex(user_commands)
+    build_ms = (time.perf_counter() - started) * 1000
+    skip = ["джо"] + ACTION_STEMS
+
+    ranked = [index.rank(text, skip) for text in texts]
+    found = sum(key == expected_key for (key, _, _), expected_key in zip(ranked, expected))
+    acted = [(key, expected_key) for (key, score, runner_up), expected_key in zip(ranked, expected)
+             if is_confident(score, runner_up)]
+    wrong = sum(key != expected_key for key, expected_key in acted)
+    rate, allocated = _measure(lambda text: index.rank(text, skip), texts, 3)
+    print(f"команд: {commands}, сборка индекса {build_ms:.1f} мс")
+    cost_ms = 1000 / rate
+    print(f"{cost_ms * 1000:8.1f} мкс на фразу (бюджет {FUZZY_BUDGET_MS:.1f} мс, "
+          f"запас {1 - cost_ms / FUZZY_BUDGET_MS:.0%})  {allocated:8.0f} байт временной памяти")
+    print(f"найден исходный ключ: {found / utterances:.0%}, выполнено без вопроса (>= {ACT_SCORE} с отрывом): "
+          f"{len(acted) / utterances:.0%}, из них не та команда: {wrong / utterances:.1%}")
+    return rate, found / utterances
+
+
+# Ярлык и то, как его название произносят по-русски
+SPOKEN_SHORTCUTS = {
+    "Google Chrome.lnk": "хром", "Discord.lnk": "дискорд", "Steam.url": "стим", "VS Code.lnk": "вскод",
+    "Telegram.lnk": "телеграм", "Spotify.lnk": "спотифай", "Zoom.lnk": "зум", "OBS Studio.lnk": "обс",
+    "Microsoft Word.lnk": "ворд", "Photoshop.lnk": "фотошоп", "Firefox.lnk": "файрфокс",
+    "WhatsApp.lnk": "ватсап", "Skype.lnk": "скайп", "Minecraft Launcher.lnk": "майнкрафт",
+    "Counter-Strike 2.url": "контр страйк", "Unity Hub.lnk": "юнити", "Excel.lnk": "эксель",
+    "PyCharm.lnk": "пайчарм", "Obsidian.lnk": "обсидиан", "Figma.lnk": "фигма", "Slack.lnk": "слак",
+    "qBittorrent.lnk": "кьюбиторрент", "Blender.lnk": "блендер", "Opera GX Browser.lnk": "опера",
+    "Viber.lnk": "вайбер", "Notion.lnk": "ноушн", "Audacity.lnk": "одасити", "GIMP.lnk": "гимп",
+}
+
+
+def bench_shortcuts(extra=500, utterances=3000):
+    """Поиск ярлыка с английским названием по русскому произношению среди сотен ярлыков"""
+    filenames = list(SPOKEN_SHORTCUTS) + [f"{key}.lnk" for key in _make_commands(extra)]
+    started = time.perf_counter()
+    index = ShortcutIndex(filenames)
+    build_ms = (time.perf_counter() - started) * 1000
+    skip = ["джо"] + ACTION_STEMS
+    spoken = list(SPOKEN_SHORTCUTS.items())
+    texts = [f"джо открой {spoken[i % len(spoken)][1]}" for i in range(utterances)]
+
+    found = sum(index.resolve(f"открой {name}", skip)[0] == filename for filename, name in spoken)
+    rate, allocated = _measure(lambda text: index.resolve(text, skip), texts, 3)
+    print(f"ярлыков: {len(filenames)}, сборка индекса {build_ms:.1f} мс")
+    print(f"{1e6 / rate:8.1f} мкс на фразу  {allocated:8.0f} байт временной памяти")
+    print(f"найдено по произношению: {found} из {len(spoken)}")
+    return rate, found / len(spoken)
+
+
+def bench_normalize(commands=3000, utterances=3000):
+    """Оценка гипотез N-best по нормальным формам слов (основы из LRU-кэша)"""
+    user_commands = _make_commands(commands)
+    keys = list(user_commands)
+    started = time.perf_counter()
+    index = CommandIndex(["джо"], user_commands)
+    build_ms = (time.perf_counter() - started) * 1000
+    rng = np.random.default_rng(3)
+    actions = ["открой", "открою", "закрой", "запусти", "включи"]
+    texts = [f"джо {actions[rng.integers(len(actions))]} {keys[rng.integers(len(keys))]}" for _ in range(utterances)]
+
+    stem.cache_clear()
+    cold_started = time.perf_counter()
+    for text in texts:
+        index.score(text)
+    cold_us = (time.perf_counter() - cold_started) * 1e6 / len(texts)
+    cache = stem.cache_info()
+    rate, allocated = _measure(index.score, texts, 3)
+    # Что делает run_script с каждой фразой: слово-действие и ключ команды по нормальным формам
+    lookup_rate, _ = _measure(lambda text: (index.find_action(text), index.find_command(text)), texts, 3)
+    print(f"команд: {commands}, сборка индекса {build_ms:.1f} мс")
+    print(f"{cold_us:8.1f} мкс на гипотезу с пустым кэшем основ "
+          f"({cache.hits / (cache.hits + cache.misses):.1%} попаданий, {cache.currsize} слов)")
+    print(f"{1e6 / rate:8.1f} мкс на гипотезу с заполненным кэшем  {allocated:8.0f} байт временной памяти")
+    print(f"{1e6 / lookup_rate:8.1f} мкс на действие и ключ команды (run_script)")
+    return rate, cache.hits / (cache.hits + cache.misses)
+
+
+BENCHMARKS = {
+    "ingest": bench_ingest,
+    "preprocess": bench_preprocess,
+    "resample": bench_resample,
+    "intents": bench_intents,
+    "fuzzy": bench_fuzzy,
+    "shortcuts": bench_shortcuts,
+    "normalize": bench_normalize,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микро-бенчмарки ассистента")
+    parser.add_argument("names", nargs="*", help=f"Какие бенчмарки запустить: {', '.join(BENCHMARKS)}")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Неизвестные бенчмарки: {', '.join(unknown)}")
+    for name in args.names or BENCHMARKS:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Грамматика для режима команд.
+
+KaldiRecognizer умеет распознавать речь в пределах списка слов (JSON-грамматика).
+В режиме команд русский распознаватель работает только со словарём ассистента:
+имена, слова-действия из run_script, встроенные команды и ключи commands.json.
+Это заметно дешевле открытого словаря и почти не путает команды.
+Для поиска ("найди ...") фраза повторно распознаётся открытым словарём.
+"""
+import json
+import re
+
+# Полные формы слов-действий: run_script сравнивает их нормальные формы (CommandIndex.find_action),
+# а основы ACTION_STEMS ищет подстрокой только для форм, которых здесь нет
+OPEN_WORDS = ["открой", "открыть", "открою", "включи", "включить", "запусти", "запустить", "вруби"]
+CLOSE_WORDS = ["закрой", "закрыть", "закрою", "выключи", "выключить", "отключи", "отключить", "выруби", "отруби"]
+ACTION_WORDS = OPEN_WORDS + CLOSE_WORDS
+
+# Встроенные команды (специальные команды и системные действия)
+SPECIAL_WORDS = [
+    "микшер", "калькулятор", "пейнт", "пэйнт", "паинт", "переменные", "среды",
+    "диспетчер", "задач", "корзину", "корзина", "дата", "апп", "панель", "панели",
+    "компьютер", "комп", "перезагрузить", "перезагрузи",
+]
+
+# Плеер, скриншоты и связки между командами
+SERVICE_WORDS = [
+    "плеер", "пауза", "паузу", "пуск", "стоп", "следующий", "следующую", "вперёд", "дальше",
+    "переключи", "предыдущий", "предыдущую", "назад",
+    "скрин", "скриншот", "область", "области", "фулл", "весь", "экран", "сфоткай",
+    "и", "а", "также", "потом", "ещё",
+]
+
+# Основы слов-действий и встроенных команд в том виде, как их ищет run_script
+ACTION_STEMS = ['откр', 'закр', 'вкл', 'выкл', 'откл', 'запус', 'отруб', 'выруб']
+SPECIAL_STEMS = ['микшер', 'калькул', 'пэйнт', 'пейнт', 'переменные', 'диспетчер', 'корзин', 'дат', 'панел']
+COMMAND_SEPARATORS = [" и ", " а также ", " потом ", " ещё "]
+
+# Согласие с предложенной командой в режиме уточнения ("хрон" -> "хром?" -> "да")
+CONFIRM_WORDS = ["да", "ага", "давай", "угу", "верно"]
+
+# Слова, после которых нужен открытый словарь (запрос поиска произвольный)
+SEARCH_WORDS = ["найди", "поищи", "посмотри", "гугли"]
+
+UNKNOWN_WORD = "[unk]"
+
+
+def _split_words(phrase):
+    """Разбивает фразу на слова, пригодные для грамматики Vosk"""
+    return [word for word in re.split(r"[^\w]+", phrase.lower()) if word]
+
+
+def build_command_grammar(names, commands, shortcut_words=()):
+    """
+    Собирает список слов для грамматики распознавателя.
+    :param names: имена ассистента
+    :param commands: словарь команд из commands.json (ключ - фраза команды)
+    :param shortcut_words: названия ярлыков русскими буквами ("кром", "дискорд")
+    :return: отсортированный список слов + [unk]
+    """
+    words = set(ACTION_WORDS + SPECIAL_WORDS + SERVICE_WORDS + SEARCH_WORDS + CONFIRM_WORDS)
+    words.update(shortcut_words)
+    for name in names:
+        if name:
+            words.update(_split_words(name))
+    for keyword in commands:
+        words.update(_split_words(keyword))
+
+    return sorted(words) + [UNKNOWN_WORD]
+
+
+def build_wake_grammar(names):
+    """Грамматика детектора имени: только имена ассистента и [unk]"""
+    words = set()
+    for name in names:
+        if name:
+            words.update(_split_words(name))
+    return sorted(words) + [UNKNOWN_WORD]
+
+
+def grammar_to_json(grammar):
+    """Грамматика в формате, который принимает KaldiRecognizer"""
+    return json.dumps(grammar, ensure_ascii=False)
+
+
+def needs_open_vocabulary(text):
+    """Фраза из режима команд требует распознавания открытым словарём (поиск)"""
+    return any(word in text for word in SEARCH_WORDS)
+
+
+def has_latin(text):
+    """Есть ли в строке латинские буквы (такие ярлыки распознаёт только английская модель)"""
+    return re.search(r"[a-z]", text.lower()) is not None
+
+
+def expects_english_target(text, commands):
+    """
+    По словарю ожидается английская цель: во фразе есть слово-действие, но нет ни одной
+    русской цели, а среди ключей commands.json есть латинские названия
+    """
+    if not any(stem in text for stem in ACTION_STEMS):
+        return False
+    if any(stem in text for stem in SPECIAL_STEMS):
+        return False
+    if any(keyword in text for keyword in commands if not has_latin(keyword)):
+        return False
+    return any(has_latin(keyword) for keyword in commands)
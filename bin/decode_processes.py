@@ -0,0 +1,336 @@
+"""
+Распознавание RU и EN в отдельных процессах.
+
+В обычном режиме оба KaldiRecognizer работают по очереди в одном потоке, и фраза
+распознаётся примерно вдвое дольше, чем одной моделью. Здесь каждая модель живёт
+в своём процессе (своё ядро): поток декодирования кладёт блоки речи в кольцевой
+буфер в общей памяти, процессы читают его независимо друг от друга, а результаты
+сводятся обратно по фразам VAD и уходят в тот же on_result.
+"""
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from bin.audio_pipeline import DecodeWorker, BLOCK_SIZE, RING_CAPACITY, SAMPLE_RATE, vosk_ffi
+from bin.recognition_results import parse_text
+from bin.result_arbitration import word_confidence
+from bin.voice_activity import VoiceActivityGate
+from logging_config import logger, debug_logger
+
+# Виды записей в общем кольцевом буфере
+KIND_AUDIO = 0  # Блок звука
+KIND_FLUSH = 1  # Конец фразы: процесс забирает остаток через FinalResult
+
+
+class SharedAudioRing:
+    """
+    Кольцевой буфер блоков в общей памяти: один писатель, несколько читателей со своими позициями.
+    Писатель никого не ждёт; читатель, отставший больше чем на capacity блоков, перескакивает вперёд.
+    Раскладка памяти: счётчик записей (int64), блоки (int16), длины блоков, номера фраз, виды записей.
+    """
+
+    def __init__(self, capacity=RING_CAPACITY, block_size=BLOCK_SIZE, name=None):
+        self.capacity = capacity
+        self.block_size = block_size
+        size = 8 + capacity * (block_size * 2 + 4 + 4 + 1)
+        self._owner = name is None
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+
+        buf = self._shm.buf
+        offset = 0
+        self._counter = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += 8
+        self._samples = np.ndarray((capacity, block_size), dtype=np.int16, buffer=buf, offset=offset)
+        offset += capacity * block_size * 2
+        self._frames = np.ndarray((capacity,), dtype=np.int32, buffer=buf, offset=offset)
+        offset += capacity * 4
+        self._segments = np.ndarray((capacity,), dtype=np.int32, buffer=buf, offset=offset)
+        offset += capacity * 4
+        self._kinds = np.ndarray((capacity,), dtype=np.uint8, buffer=buf, offset=offset)
+        if self._owner:
+            self._counter[0] = 0
+        self._wakeups = []  # Семафоры читателей: release на каждую запись
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def add_reader(self, wakeup):
+        self._wakeups.append(wakeup)
+
+    def write(self, block, kind, segment):
+        """Записывает блок (или маркер конца фразы) и будит читателей"""
+        index = int(self._counter[0])
+        slot = index % self.capacity
+        frames = min(len(block), self.block_size)
+        self._samples[slot, :frames] = block[:frames]
+        self._frames[slot] = frames
+        self._segments[slot] = segment
+        self._kinds[slot] = kind
+        self._counter[0] = index + 1  # Счётчик меняется последним: запись целиком видна читателям
+        for wakeup in self._wakeups:
+            wakeup.release()
+
+    def read(self, position, out):
+        """
+        Читает запись с номером position в out.
+        :return: (frames, kind, segment, следующая позиция, пропущено записей) или None, если новых записей нет
+        """
+        written = int(self._counter[0])
+        if position >= written:
+            return None
+        skipped = 0
+        if written - position > self.capacity:
+            skipped = written - self.capacity - position
+            position = written - self.capacity
+
+        slot = position % self.capacity
+        frames = int(self._frames[slot])
+        out[:frames] = self._samples[slot, :frames]
+        kind = int(self._kinds[slot])
+        segment = int(self._segments[slot])
+        if int(self._counter[0]) - position > self.capacity:
+            # Писатель успел перезаписать слот, пока мы его копировали
+            return 0, KIND_AUDIO, segment, position + 1, skipped + 1
+        return frames, kind, segment, position + 1, skipped
+
+    def close(self):
+        self._counter = self._samples = self._frames = self._segments = self._kinds = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def recognizer_process(lang, model_path, grammar, words, ring_name, capacity, block_size,
+                       wakeup, control, results, stop_event):
+    """
+    Тело процесса распознавания одной модели.
+    В results уходят ("ready", lang, секунды загрузки), ("error", lang, текст)
+    и ("text", lang, номер фразы, текст, фраза закончена, уверенность или None).
+    :param words: включить SetWords, чтобы отдавать уверенность для арбитра
+    """
+    from bin.model_registry import model_registry
+
+    try:
+        started = time.time()
+        model_registry.acquire(model_path)
+        recognizer = model_registry.create_recognizer(model_path, SAMPLE_RATE, grammar, words)
+        ring = SharedAudioRing(capacity, block_size, name=ring_name)
+    except Exception as e:
+        results.put(("error", lang, str(e)))
+        return
+    results.put(("ready", lang, time.time() - started))
+
+    pcm = bytearray(block_size * 2)
+    block = np.frombuffer(pcm, dtype=np.int16)
+    pcm_view = vosk_ffi.from_buffer("char[]", pcm) if vosk_ffi is not None else None
+    position = 0
+    skipped_total = 0
+    try:
+        while not stop_event.is_set():
+            wakeup.acquire(timeout=0.5)
+            try:
+                command, value = control.get_nowait()
+                if command == "grammar":
+                    recognizer = model_registry.create_recognizer(model_path, SAMPLE_RATE, value, words)
+            except queue.Empty:
+                pass
+
+            while True:
+                item = ring.read(position, block)
+                if item is None:
+                    break
+                frames, kind, segment, position, skipped = item
+                if skipped:
+                    skipped_total += skipped
+                    debug_logger.warning(f"[{lang}] процесс распознавания отстал, пропущено блоков: {skipped_total}")
+
+                if kind == KIND_FLUSH:
+                    result = recognizer.FinalResult()
+                    text = parse_text(result)
+                    results.put(("text", lang, segment, text, True, word_confidence(result) if words else None))
+                elif frames:
+                    if frames == block_size and pcm_view is not None:
+                        data = pcm_view
+                    else:
+                        data = block[:frames].tobytes()
+                    if recognizer.AcceptWaveform(data):
+                        result = recognizer.Result()
+                        text = parse_text(result)
+                        if text:
+                            results.put(("text", lang, segment, text, False,
+                                         word_confidence(result) if words else None))
+    except Exception as e:
+        results.put(("error", lang, str(e)))
+    finally:
+        ring.close()
+
+
+class MultiprocessDecodeWorker(DecodeWorker):
+    """
+    Поток декодирования, который сам не распознаёт: VAD, детектор имени и учёт фраз
+    остаются здесь, а блоки речи уходят в процессы распознавания через общую память.
+    Результаты процессов сводятся по номеру фразы VAD: фраза отдаётся в on_result,
+    когда её закончили все загруженные модели, по тому же правилу "ru или en"
+    (или через арбитра, если он задан).
+    Повторное распознавание поиска и выполнение по частичным результатам
+    в этом режиме не работают - им нужен синхронный ответ распознавателя.
+    :param model_paths: {"ru": путь, "en": путь}
+    :param ru_grammar: JSON-грамматика русского распознавателя (режим команд) или None
+    """
+
+    _REMOTE = object()  # Заглушка вместо rec_ru: распознаватели живут в других процессах
+
+    def __init__(self, ring_buffer, on_result, on_voice=None, vad=None, latency_tracker=None, model_paths=None,
+                 ru_grammar=None):
+        # Без VAD процессам не по чему сводить результаты
+        vad = vad or VoiceActivityGate(block_size=ring_buffer.block_size)
+        super().__init__(ring_buffer, on_result, on_voice, vad, latency_tracker)
+        self.model_paths = dict(model_paths or {})
+        self.ru_grammar = ru_grammar
+        self.rec_ru = self._REMOTE
+        self.shared_ring = SharedAudioRing(ring_buffer.capacity, ring_buffer.block_size)
+        self._context = mp.get_context("spawn")
+        self._results = self._context.Queue()
+        self._processes_stop = self._context.Event()
+        self._processes = {}
+        self._controls = {}
+        self._ready = set()
+        self._segment = 0
+        self._pending = {}  # номер фразы -> {"ru": [...], "en": [...], "done": set()}
+        self._last_emitted = -1
+        self._collector = None
+
+    def set_recognizers(self, rec_ru, rec_en):
+        """Локальные распознаватели не используются"""
+
+    def set_en_recognizer(self, rec_en):
+        """Английская модель загружается в своём процессе"""
+
+    def set_command_index(self, command_index):
+        """Процессы распознавания отдают только лучшую гипотезу"""
+
+    def set_cascade(self, cascade):
+        """Английский процесс и так не занимает поток декодирования"""
+
+    def set_ru_grammar(self, grammar):
+        """Новая грамматика режима команд для процесса RU"""
+        self.ru_grammar = grammar
+        control = self._controls.get("ru")
+        if control is not None:
+            control.put(("grammar", grammar))
+
+    def start(self):
+        for lang, path in self.model_paths.items():
+            wakeup = self._context.Semaphore(0)
+            control = self._context.Queue()
+            process = self._context.Process(
+                target=recognizer_process, name=f"Recognizer-{lang}", daemon=True,
+                args=(lang, path, self.ru_grammar if lang == "ru" else None, self.arbiter is not None,
+                      self.shared_ring.name,
+                      self.shared_ring.capacity, self.shared_ring.block_size,
+                      wakeup, control, self._results, self._processes_stop))
+            process.start()
+            self.shared_ring.add_reader(wakeup)
+            self._processes[lang] = process
+            self._controls[lang] = control
+        self._collector = threading.Thread(target=self._collect, name="ResultCollector", daemon=True)
+        self._collector.start()
+        super().start()
+
+    def stop(self):
+        super().stop()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(timeout=1.0)
+        self._processes_stop.set()
+        for lang, process in self._processes.items():
+            process.join(timeout=2.0)
+            if process.is_alive():
+                debug_logger.warning(f"Процесс распознавания {lang} не завершился, останавливаю принудительно")
+                process.terminate()
+        self._processes = {}
+        self.shared_ring.close()
+
+    def _decode(self, block, remember=True):
+        """
+        Блоки речи уходят в общий буфер (длинный фрагмент - частями по блоку).
+        :param remember: False - повтор буфера фразы после имени ассистента: он уже отдан процессам
+        """
+        if remember:
+            self._utterance_blocks += 1
+            if self.utterance is not None:
+                self.utterance.append(block)
+        size = self.shared_ring.block_size
+        for start in range(0, len(block), size):
+            self.shared_ring.write(block[start:start + size], KIND_AUDIO, self._segment)
+        if not remember and self.utterance is not None:
+            self.utterance.clear()
+
+    def _flush(self):
+        self.shared_ring.write(self._block[:0], KIND_FLUSH, self._segment)
+        self._segment += 1
+        self._forget_utterance()
+
+    def _forget_utterance(self):
+        """Фраза отдана процессам: её звук и счётчик блоков больше не нужны (как в _finish_ru)"""
+        if self.utterance is not None:
+            self.utterance.clear()
+        self._utterance_blocks = 0
+
+    def _reset_recognizers(self):
+        """Распознаватели процессов сбрасываются сами на каждом FinalResult"""
+        self._forget_utterance()
+
+    def _collect(self):
+        """Поток сбора результатов от процессов"""
+        while not self._stop_event.is_set():
+            try:
+                message = self._results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            kind, lang = message[0], message[1]
+            if kind == "ready":
+                self._ready.add(lang)
+                logger.info(f"Процесс распознавания {lang.upper()} готов ({message[2]:.1f} с)")
+                debug_logger.info(f"Процесс распознавания {lang.upper()} готов ({message[2]:.1f} с)")
+            elif kind == "error":
+                logger.error(f"Ошибка в процессе распознавания {lang.upper()}: {message[2]}")
+                debug_logger.error(f"Ошибка в процессе распознавания {lang.upper()}: {message[2]}")
+            else:
+                self._merge(lang, *message[2:])
+
+    def _merge(self, lang, segment, text, finished, confidence=None):
+        """Копит результаты фразы и отдаёт её, когда фразу закончили все готовые модели"""
+        if segment <= self._last_emitted:
+            return  # Фраза уже отдана (модель догрузилась позже и дочитала старый звук)
+
+        entry = self._pending.setdefault(segment, {"ru": [], "en": [], "done": set(), "conf": {}})
+        if text:
+            entry.setdefault(lang, []).append(text)
+            if confidence is not None:
+                entry["conf"].setdefault(lang, []).append(confidence)
+        if finished:
+            entry["done"].add(lang)
+        if not entry["done"] or not self._ready <= entry["done"]:
+            return
+
+        del self._pending[segment]
+        self._last_emitted = segment
+        for stale in [key for key in self._pending if key < segment]:
+            del self._pending[stale]
+        try:
+            confidences = {key: sum(values) / len(values) for key, values in entry["conf"].items()}
+            self._emit(" ".join(entry["ru"]), " ".join(entry["en"]),
+                       confidences.get("ru"), confidences.get("en"))
+        except Exception as e:
+            debug_logger.error(f"Ошибка при сведении результатов процессов: {e}")
@@ -0,0 +1,234 @@
+"""
+Реестр входных устройств на весь процесс.
+
+Раньше выбор микрофона, проверка микрофона и список в настройках каждый раз перебирали
+sd.query_devices() и пробно открывали InputStream на каждом устройстве (с разными
+частотами, а список настроек - прямо в потоке интерфейса). Здесь пробное открытие
+делается один раз в фоне, а результат кэшируется по имени устройства и host API:
+при повторных запросах заново открываются только устройства, которых раньше не было
+или которые тогда не открылись (микрофон могли отключить и подключить снова).
+PortAudio перечисляет устройства только при инициализации: микрофон, впервые подключённый
+после запуска, появляется в списке после probe(reinitialize=True), когда ни один поток не открыт.
+"""
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from logging_config import debug_logger
+
+# Системные и виртуальные устройства, которые не предлагаются как микрофон
+SYSTEM_KEYWORDS = ['mapper', 'primary', 'wave', 'default', 'communications',
+                   'звуковой маршрутизатор', 'драйвер записи', 'аналоговый']
+# Приоритет host API при выборе между одинаковыми устройствами (ищется в имени: "Windows WASAPI")
+API_PRIORITY = {'wasapi': 3, 'asio': 2}
+# Эти API не показываются в списке настроек
+LEGACY_APIS = ['mme', 'directsound']
+
+InputDevice = namedtuple("InputDevice", "index name hostapi samplerate channels openable")
+
+
+class DeviceRegistry:
+    """
+    Кэш пробного открытия входных устройств.
+    :param backend: модуль с интерфейсом sounddevice (по умолчанию sounddevice)
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self.native = True  # Проверять устройства в родном формате (как их откроет ассистент)
+        self._openable = {}  # (имя, host API, формат) -> True: устройство открывалось
+        self._devices = None  # Последний перечень InputDevice
+        self._future = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self.probe_count = 0  # Сколько пробных открытий сделано за всё время
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            import sounddevice as sd  # PortAudio нужен только при первом обращении
+            self._backend = sd
+        return self._backend
+
+    def set_backend(self, backend):
+        """Подменяет sounddevice (например, на тестовый бэкенд) и сбрасывает кэш"""
+        with self._lock:
+            self._backend = backend
+            self._openable = {}
+            self._devices = None
+
+    def set_native(self, native):
+        """Формат пробного открытия: родной формат устройства или 16 кГц моно"""
+        self.native = native
+
+    def probe(self, reinitialize=False):
+        """
+        Перечисляет входные устройства и пробно открывает те, которых нет в кэше.
+        Кэшируются только удачные открытия: неоткрывшееся устройство проверяется снова.
+        :param reinitialize: перечитать список устройств PortAudio. Переинициализация закрывает
+                             все потоки, поэтому вызывать только когда ни один поток не открыт
+        :return: список InputDevice
+        """
+        backend = self.backend
+        if reinitialize:
+            # Публичного способа обновить список у sounddevice нет
+            backend._terminate()
+            backend._initialize()
+            debug_logger.info("Список устройств PortAudio перечитан")
+        devices = []
+        for info in backend.query_devices():
+            channels = int(info.get('max_input_channels', 0))
+            name = info.get('name', '').strip()
+            if channels <= 0 or not name:
+                continue
+            hostapi = backend.query_hostapis(info['hostapi'])['name']
+            samplerate, probe_channels = (int(info.get('default_samplerate', 16000)), channels) \
+                if self.native else (16000, 1)
+            key = (name, hostapi, samplerate, probe_channels)
+            openable = self._openable.get(key, False)
+            if not openable:
+                openable = self._try_open(backend, info['index'], samplerate, probe_channels)
+                self._remember(key, openable)
+            devices.append(InputDevice(info['index'], name, hostapi, samplerate, channels, openable))
+
+        with self._lock:
+            self._devices = devices
+        debug_logger.info(f"Входных устройств: {len(devices)}, рабочих: {sum(d.openable for d in devices)}")
+        return devices
+
+    def check_async(self, name):
+        """
+        Пробно открывает в фоне устройства с таким именем мимо кэша: вернулся ли отключённый микрофон.
+        Открытые потоки и PortAudio не трогаются. Отключённое устройство остаётся в списке
+        PortAudio, но не открывается; после повторного подключения открывается снова.
+        :return: Future с True, если устройство открылось
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DeviceProbe")
+            return self._executor.submit(self._check_device, name)
+
+    def _check_device(self, name):
+        backend = self.backend
+        lower_name = name.lower()
+        devices = self.devices()
+        for position, device in enumerate(devices):
+            if lower_name not in device.name.lower():
+                continue
+            channels = device.channels if self.native else 1
+            openable = self._try_open(backend, device.index, device.samplerate, channels)
+            self._remember((device.name, device.hostapi, device.samplerate, channels), openable)
+            if openable != device.openable:
+                with self._lock:
+                    devices[position] = device._replace(openable=openable)
+            if openable:
+                return True
+        return False
+
+    def default_input(self):
+        """ID входного устройства по умолчанию или None, если его нет"""
+        backend = self.backend
+        index = backend.default.device[0]
+        if index is None or index < 0 or index >= len(backend.query_devices()):
+            return None
+        return index
+
+    def name_of(self, index):
+        """Имя устройства по ID"""
+        return self.backend.query_devices(index)['name']
+
+    def _remember(self, key, openable):
+        if openable:
+            self._openable[key] = True
+        else:
+            self._openable.pop(key, None)
+
+    def _try_open(self, backend, index, samplerate, channels):
+        self.probe_count += 1
+        try:
+            with backend.InputStream(device=index, channels=channels, samplerate=samplerate, dtype='int16'):
+                return True
+        except Exception:
+            return False
+
+    def probe_async(self, reinitialize=False):
+        """
+        Запускает перечисление в фоне (повторный вызов во время работы вернёт тот же Future).
+        :param reinitialize: как в probe
+        :return: Future со списком InputDevice
+        """
+        with self._lock:
+            if self._future is not None and not self._future.done():
+                return self._future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DeviceProbe")
+            self._future = self._executor.submit(self.probe, reinitialize)
+            return self._future
+
+    def knows(self, name):
+        """Есть ли устройство с таким именем в последнем перечне PortAudio (открывается оно или нет)"""
+        lower_name = name.lower()
+        return any(lower_name in device.name.lower() for device in self.devices())
+
+    def devices(self, timeout=None):
+        """
+        Последний перечень устройств. Если идёт фоновая проверка - ждёт её,
+        если проверок ещё не было - проверяет сразу.
+        """
+        with self._lock:
+            future, devices = self._future, self._devices
+        if future is not None and not future.done():
+            return future.result(timeout)
+        if devices is None:
+            return self.probe()
+        return devices
+
+    @property
+    def ready(self):
+        """Перечень уже есть и фоновая проверка не идёт"""
+        return self._devices is not None and (self._future is None or self._future.done())
+
+    def microphones(self, timeout=None):
+        """
+        Рабочие микрофоны без системных устройств и дублей: из одинаковых по имени
+        остаётся устройство с лучшим host API
+        """
+        best = {}
+        for device in self.devices(timeout):
+            lower_name = device.name.lower()
+            if not device.openable or any(kw in lower_name for kw in SYSTEM_KEYWORDS):
+                continue
+            clean = device.name.split('(')[0].strip()
+            current = best.get(clean)
+            if current is None or _api_priority(device) > _api_priority(current):
+                best[clean] = device
+        return sorted(best.values(), key=lambda device: device.index)
+
+    def find(self, preferred_name=None, timeout=None):
+        """
+        ID микрофона: совпадение по имени -> приоритет API -> меньший индекс.
+        :return: индекс устройства или None, если рабочих микрофонов нет
+        """
+        candidates = self.microphones(timeout)
+        if not candidates:
+            return None
+        preferred = preferred_name.lower() if preferred_name else None
+        best = max(candidates, key=lambda device: (bool(preferred and preferred in device.name.lower()),
+                                                   _api_priority(device), -device.index))
+        return best.index
+
+    def settings_list(self, timeout=None):
+        """Микрофоны для списка в настройках: (имя, индекс), без устаревших API"""
+        return [(device.name, device.index) for device in self.microphones(timeout)
+                if not any(api in device.hostapi.lower() for api in LEGACY_APIS)]
+
+    def has_microphone(self, timeout=None):
+        return bool(self.microphones(timeout))
+
+
+def _api_priority(device):
+    hostapi = device.hostapi.lower()
+    return next((priority for api, priority in API_PRIORITY.items() if api in hostapi), 1)
+
+
+device_registry = DeviceRegistry()
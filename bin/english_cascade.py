@@ -0,0 +1,100 @@
+"""
+Каскадное распознавание: английская модель подключается только когда она нужна.
+
+Почти вся речь русская, а EN-распознаватель в обычном режиме разбирает каждый блок.
+В каскаде непрерывно работает только RU; звук фразы хранится в буфере и отдаётся
+EN-модели лишь если русский результат пустой, неуверенный или по словарю ожидается
+английская цель (ярлык с латинским названием). EN-модель загружается при первой
+необходимости и выгружается из памяти после простоя.
+"""
+import threading
+import time
+
+from bin.model_registry import model_registry
+from bin.recognition_results import parse_text
+from bin.result_arbitration import word_confidence
+from logging_config import debug_logger
+
+IDLE_UNLOAD_SECONDS = 300  # Через сколько секунд без работы выгружать EN-модель
+MIN_RU_CONFIDENCE = 0.6  # Ниже этой уверенности русский результат перепроверяется английским
+
+
+class EnglishCascade:
+    """
+    Ленивый EN-распознаватель для повторного распознавания фраз.
+    :param model_path: путь к EN-модели
+    :param expects_english: функция(текст RU) -> True, если по словарю ожидается английская цель
+    """
+
+    def __init__(self, model_path, expects_english=None, min_confidence=MIN_RU_CONFIDENCE,
+                 idle_seconds=IDLE_UNLOAD_SECONDS, sample_rate=16000):
+        self.model_path = model_path
+        self.expects_english = expects_english
+        self.min_confidence = min_confidence
+        self.idle_seconds = idle_seconds
+        self.sample_rate = sample_rate
+        self.decoded = 0  # Сколько фраз перераспознано
+        self.skipped = 0  # Сколько фраз обошлось без EN
+        self._recognizer = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def needs_english(self, ru_text, ru_confidence):
+        """Нужна ли фразе английская модель"""
+        if not ru_text:
+            return True
+        if ru_confidence is not None and ru_confidence < self.min_confidence:
+            return True
+        if self.expects_english and self.expects_english(ru_text):
+            return True
+        self.skipped += 1
+        return False
+
+    def decode(self, samples):
+        """
+        Распознаёт звук фразы английской моделью (при необходимости загрузив её).
+        :param samples: массив int16 с фразой
+        :return: (текст, уверенность или None)
+        """
+        with self._lock:
+            self._last_used = time.time()
+            if self._recognizer is None:
+                started = time.time()
+                model_registry.acquire(self.model_path)
+                self._recognizer = model_registry.create_recognizer(self.model_path, self.sample_rate, words=True)
+                debug_logger.info(f"Каскад: EN-модель подключена за {time.time() - started:.1f} с")
+
+            parts = []
+            confidences = []
+            results = []
+            if self._recognizer.AcceptWaveform(samples.tobytes()):
+                results.append(self._recognizer.Result())
+            results.append(self._recognizer.FinalResult())
+            for result in results:
+                text = parse_text(result)
+                if text:
+                    parts.append(text)
+                    confidence = word_confidence(result)
+                    if confidence is not None:
+                        confidences.append(confidence)
+            self.decoded += 1
+            return " ".join(parts), (sum(confidences) / len(confidences) if confidences else None)
+
+    def unload_if_idle(self):
+        """Выгружает EN-модель, если она давно не использовалась. Вызывается периодически"""
+        with self._lock:
+            if self._recognizer is None or time.time() - self._last_used < self.idle_seconds:
+                return False
+            self._recognizer = None
+            model_registry.release(self.model_path)
+        unloaded = model_registry.unload(self.model_path)
+        if unloaded:
+            debug_logger.info(f"Каскад: EN-модель выгружена после {self.idle_seconds} с простоя")
+        return unloaded
+
+    def close(self):
+        """Отпускает модель (она остаётся в реестре до unload/trim)"""
+        with self._lock:
+            if self._recognizer is not None:
+                self._recognizer = None
+                model_registry.release(self.model_path)
@@ -0,0 +1,259 @@
+"""
+Тестовый бэкенд звука вместо sounddevice.
+
+Повторяет ту часть sounddevice, которой пользуются device_registry и open_input_stream:
+query_devices, query_hostapis, default.device, InputStream и _terminate/_initialize.
+Устройства можно "подключать" и "отключать" на ходу: как и в WASAPI, отключённое устройство
+остаётся в списке, но не открывается, а его поток перестаёт вызывать callback, как это делает
+настоящий драйвер. Новое устройство, как и в PortAudio, появляется в списке после переинициализации.
+Так подключение/отключение микрофона и монитор потока проверяются на Linux без звуковой карты:
+
+    python -m bin.fake_audio_backend
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+HOSTAPIS = ["MME", "Windows DirectSound", "Windows WASAPI"]
+
+
+class FakeDevice:
+    """Входное устройство тестового бэкенда"""
+
+    def __init__(self, name, hostapi="Windows WASAPI", samplerate=48000, channels=2, level=200):
+        self.name = name
+        self.hostapi = hostapi
+        self.samplerate = samplerate
+        self.channels = channels
+        self.level = level  # RMS шума, который отдаёт устройство
+        self.connected = True
+
+
+class FakeInputStream:
+    """Поток тестового бэкенда: блоки шума из фонового потока в реальном времени"""
+
+    def __init__(self, backend, device=None, samplerate=16000, channels=1, dtype='int16', blocksize=512,
+                 callback=None):
+        self.backend = backend
+        self.device = backend._resolve(device)
+        if not self.device.connected:
+            raise OSError(f"Устройство '{self.device.name}' недоступно")
+        # WASAPI (общий режим) открывает устройство только в его родном формате
+        if "wasapi" in self.device.hostapi.lower() and samplerate != self.device.samplerate:
+            raise OSError(f"Неподдерживаемая частота {samplerate} Гц для '{self.device.name}'")
+        if channels > self.device.channels:
+            raise OSError(f"Устройство '{self.device.name}' не даёт {channels} каналов")
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize or 512
+        self.callback = callback
+        self.overflows = 0  # Сколько следующих блоков придут со статусом input_overflow
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def active(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.closed:
+            raise OSError("Поток закрыт")
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="FakeInputStream", daemon=True)
+        self._thread.start()
+        self.backend.streams.append(self)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    abort = stop
+
+    def close(self):
+        self.stop()
+        self.closed = True
+        if self in self.backend.streams:
+            self.backend.streams.remove(self)
+
+    def _run(self):
+        rng = np.random.default_rng()
+        block_seconds = self.blocksize / self.samplerate
+        next_time = time.perf_counter()
+        while not self._stop_event.is_set():
+            next_time += block_seconds
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if not self.device.connected:
+                continue  # Отключённое устройство молчит, но поток остаётся "активным"
+            block = (rng.standard_normal((self.blocksize, self.channels)) * self.device.level).astype(np.int16)
+            status = None
+            if self.overflows:
+                self.overflows -= 1
+                status = SimpleNamespace(input_overflow=True)
+            if self.callback is not None:
+                self.callback(block, self.blocksize, None, status)
+
+
+class FakeAudioBackend:
+    """
+    Подмена модуля sounddevice: device_registry.set_backend(FakeAudioBackend([...])).
+    Как и PortAudio, видит только устройства, подключённые при создании или при последнем _initialize.
+    """
+
+    def __init__(self, devices=()):
+        self.devices = list(devices)
+        self.streams = []
+        self.default = SimpleNamespace(device=[0, None])
+        self._visible = []
+        self._initialize()
+
+    def plug(self, device):
+        """Подключает устройство (или снова подключает отключённое)"""
+        device.connected = True
+        if device not in self.devices:
+            self.devices.append(device)
+
+    def unplug(self, name):
+        """Отключает устройство: его потоки перестают получать звук, а новые потоки не открываются"""
+        for device in self.devices:
+            if device.name == name:
+                device.connected = False
+
+    def _terminate(self):
+        """Как Pa_Terminate: открытые потоки закрываются"""
+        for stream in list(self.streams):
+            stream.close()
+
+    def _initialize(self):
+        self._visible = [device for device in self.devices if device.connected]
+        self.default.device[0] = 0 if self._visible else -1
+
+    def _resolve(self, device):
+        if device is None:
+            device = self.default.device[0]
+        if device is None or not 0 <= device < len(self._visible):
+            raise OSError(f"Нет устройства с ID={device}")
+        return self._visible[device]
+
+    def query_devices(self, device=None, kind=None):
+        if device is None and kind is None:
+            return [self._info(index, item) for index, item in enumerate(self._visible)]
+        resolved = self._resolve(device)
+        return self._info(self._visible.index(resolved), resolved)
+
+    def query_hostapis(self, index):
+        return {"name": HOSTAPIS[index]}
+
+    def InputStream(self, **kwargs):
+        return FakeInputStream(self, **kwargs)
+
+    @staticmethod
+    def _info(index, device):
+        return {"index": index, "name": device.name, "hostapi": HOSTAPIS.index(device.hostapi),
+                "max_input_channels": device.channels, "default_samplerate": float(device.samplerate)}
+
+
+def simulate_hotplug(seconds=1.0):
+    """
+    Сценарий: открыт USB-микрофон, его отключают - поток перезапускается на встроенном
+    и работает, пока микрофона нет; микрофон подключают снова - монитор возвращается к нему.
+    Потом выбирают гарнитуру, которой не было при запуске: работает другой микрофон, а когда
+    гарнитуру подключают, список устройств перечитывается и открывается она.
+    :return: список (событие, открытое устройство)
+    """
+    from bin.audio_pipeline import AudioPipeline
+    from bin.audio_sources import open_input_stream
+    from bin.device_registry import device_registry
+    from bin.stream_health import StreamHealthMonitor
+
+    usb = FakeDevice("Микрофон (USB Audio)")
+    builtin = FakeDevice("Микрофонный массив (Realtek Audio)", samplerate=44100)
+    backend = FakeAudioBackend([builtin, usb])
+    monitor = StreamHealthMonitor(device_registry, heartbeat_timeout=seconds / 2, rescan_seconds=seconds)
+    pipeline = AudioPipeline(on_result=lambda text: None)
+
+    def open_stream(device):
+        return pipeline.attach_stream(open_input_stream(pipeline.capture, device=device, native=True))
+
+    events = []
+
+    def run_checks(duration):
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            time.sleep(seconds / 4)
+            reason = monitor.check(pipeline, stream)
+            if reason is not None:
+                stream.close()
+                return reason
+        return None
+
+    # open_input_stream берёт бэкенд из общего реестра, поэтому на время сценария он подменяется
+    device_registry.set_backend(backend)
+    pipeline.start()
+    try:
+        stream, _, name = monitor.reopen(open_stream, usb.name, pipeline)
+        events.append(("start", name))
+        backend.unplug(usb.name)
+        reason = run_checks(seconds * 2)
+        stream, _, name = monitor.reopen(open_stream, usb.name, pipeline)
+        events.append((reason, name))
+        reason = run_checks(seconds * 3)  # Запасной поток не перезапускается, пока микрофона нет
+        events.append((reason or "kept", name))
+        backend.plug(usb)
+        reason = run_checks(seconds * 3)
+        stream, _, name = monitor.reopen(open_stream, usb.name, pipeline)
+        events.append((reason, name))
+
+        headset = FakeDevice("Гарнитура (Bluetooth Hands-Free)", samplerate=16000, channels=1)
+        stream.close()
+        stream, _, name = monitor.reopen(open_stream, headset.name, pipeline)
+        events.append(("absent", name))
+        backend.plug(headset)
+        monitor.devices_changed()  # Так Windows сообщает о новом устройстве (WM_DEVICECHANGE)
+        reason = run_checks(seconds * 2)
+        stream, _, name = monitor.reopen(open_stream, headset.name, pipeline, reason)
+        events.append((reason, name))
+        stream.close()
+    finally:
+        pipeline.stop()
+        device_registry.set_backend(None)  # Снова sounddevice
+    return events
+
+
+def simulate_reprobe():
+    """
+    Сценарий: микрофон отключён при проверке устройств, потом его подключают снова -
+    повторная проверка (probe_async) снова находит его рабочим.
+    :return: список (событие, имена рабочих микрофонов)
+    """
+    from bin.device_registry import DeviceRegistry
+
+    usb = FakeDevice("Микрофон (USB Audio)")
+    backend = FakeAudioBackend([usb])
+    registry = DeviceRegistry(backend)
+    events = []
+    backend.unplug(usb.name)
+    events.append(("unplug", [device.name for device in registry.probe_async().result()
+                              if device.openable]))
+    backend.plug(usb)
+    registry.probe_async().result()
+    events.append(("plug", [device.name for device in registry.microphones()]))
+    return events
+
+
+if __name__ == "__main__":
+    for event, device_name in simulate_hotplug():
+        print(f"{event:>12}: {device_name}")
+    for event, names in simulate_reprobe():
+        print(f"{event:>12}: {names}")
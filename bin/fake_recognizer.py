@@ -0,0 +1,84 @@
+"""
+Распознаватель по сценарию вместо KaldiRecognizer.
+
+Повторяет ту часть Vosk, которой пользуется DecodeWorker: AcceptWaveform, Result,
+PartialResult, FinalResult и Reset. Что распознаватель "слышит", задаётся номерами блоков,
+поэтому порядок результатов RU и EN (например, EN заканчивает фразу на несколько блоков
+позже RU) проверяется без моделей и без звуковой карты:
+
+    python -m bin.fake_recognizer
+"""
+import json
+
+import numpy as np
+
+
+def _vosk_json(key, text):
+    """Результат в том виде, как его пишет Vosk (пустой результат узнаётся без json.loads)"""
+    return '{\n  "%s" : %s\n}' % (key, json.dumps(text, ensure_ascii=False))
+
+
+class ScriptedRecognizer:
+    """
+    Распознаватель, который выдаёт результаты по номерам принятых блоков.
+    :param finals: {номер блока: текст финального результата}
+    :param partials: {номер блока: частичный результат, который держится до следующего или до финального}
+    """
+
+    def __init__(self, finals=None, partials=None):
+        self.finals = dict(finals or {})
+        self.partials = dict(partials or {})
+        self.blocks = 0
+        self._partial = ""
+        self._result = ""
+
+    def AcceptWaveform(self, data):
+        self.blocks += 1
+        self._partial = self.partials.get(self.blocks, self._partial)
+        if self.blocks in self.finals:
+            self._result = self.finals[self.blocks]
+            self._partial = ""
+            return True
+        return False
+
+    def Result(self):
+        return _vosk_json("text", self._result)
+
+    def PartialResult(self):
+        return _vosk_json("partial", self._partial)
+
+    def FinalResult(self):
+        text, self._partial = self._partial, ""
+        return _vosk_json("text", text)
+
+    def Reset(self):
+        self._partial = ""
+
+
+def simulate_early_dispatch(en_delay_blocks=3):
+    """
+    Сценарий: команда выполнена по частичному результату RU, RU заканчивает фразу, а EN -
+    через en_delay_blocks блоков после RU. Потом звучит следующая фраза.
+    Каждая фраза должна уйти в on_result ровно один раз.
+    :return: список отправленных фраз
+    """
+    from bin.audio_pipeline import AudioRingBuffer, DecodeWorker
+    from bin.latency_metrics import LatencyTracker
+
+    ru_final = 8  # Частичный "открой хром" держится с блока 2 и выполняется на проверке 6-го блока
+    rec_ru = ScriptedRecognizer(finals={ru_final: "открой хром", 30: "закрой хром"}, partials={2: "открой хром"})
+    rec_en = ScriptedRecognizer(finals={ru_final + en_delay_blocks: "open chrome", 31: "close chrome"})
+    dispatched = []
+    ring_buffer = AudioRingBuffer()
+    worker = DecodeWorker(ring_buffer, dispatched.append, latency_tracker=LatencyTracker(log=False))
+    worker.set_recognizers(rec_ru, rec_en)
+    worker.set_early_dispatch(lambda text: True)
+    block = np.full(ring_buffer.block_size, 500, dtype=np.int16)
+    for number in range(40):
+        worker.process_block(block, float(number))
+    return dispatched
+
+
+if __name__ == "__main__":
+    for delay in (0, 1, 3, 10):
+        print(f"EN через {delay:>2} бл.: {simulate_early_dispatch(delay)}")
@@ -0,0 +1,170 @@
+"""
+Нечёткий поиск команд из commands.json.
+
+Команда находится, только если её ключ целиком есть во фразе. Стоит распознавателю
+ошибиться в одной букве ("открой хрон" при ключе "хром") - команда не найдена,
+и ассистент уходит в режим уточнения на 7 секунд. Здесь ключи разложены в индекс
+по триграммам: для каждого окна фразы из стольких же слов, сколько в ключе,
+общие триграммы со всеми ключами считаются одним np.bincount. Каждая правка портит не больше
+трёх триграмм, поэтому по ним видна верхняя граница оценки ключа: ключи, которые не наберут
+ASK_SCORE, отбрасываются сразу, а остальные проверяются по убыванию границы нормированным
+расстоянием Левенштейна, пока граница не опустится ниже второго найденного. Ключ из
+нескольких слов, уверенно найденный во фразе, не соперничает с более короткими ключами
+внутри себя ("контр страйк" и "страйк"). Уверенное совпадение выполняется сразу, сомнительное -
+предлагается в режиме уточнения. Уверенным считается только совпадение, заметно
+лучшее следующего ключа: при почти равных кандидатах ассистент переспрашивает.
+"""
+import heapq
+from collections import defaultdict
+
+import numpy as np
+
+ACT_SCORE = 0.8  # Не ниже - команда выполняется сразу
+ASK_SCORE = 0.6  # Не ниже - команда предлагается ("да" её выполнит)
+ACT_MARGIN = 0.1  # Настолько лучший ключ должен обходить следующий, чтобы выполниться без вопроса
+BUDGET_MS = 1.0  # Поиск по тысячам ключей должен укладываться в это время
+MAX_CANDIDATES = 4  # Сколько кандидатов с лучшей границей оценки проверять расстоянием Левенштейна
+MIN_KEY_LENGTH = 4  # Короткие ключи нечётко не ищутся: "вк" похоже на слишком многое
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def is_confident(score, runner_up):
+    """Совпадение достаточно хорошее и заметно лучше следующего ключа, чтобы выполнить команду сразу"""
+    return score >= ACT_SCORE and score - runner_up >= ACT_MARGIN
+
+
+def edit_distance(first, second, limit):
+    """
+    Расстояние Левенштейна, если оно не больше limit, иначе limit + 1.
+    Считается только полоса |i - j| <= limit, поэтому стоимость O(длина * limit)
+    """
+    if len(first) < len(second):
+        first, second = second, first
+    if len(first) - len(second) > limit:
+        return limit + 1
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(second) + 1)]
+    for i, char in enumerate(first, 1):
+        low, high = max(1, i - limit), min(len(second), i + limit)
+        current = [over] * (len(second) + 1)
+        if i <= limit:
+            current[0] = i
+        for j in range(low, high + 1):
+            cost = previous[j - 1] + (char != second[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost if cost < over else over
+        if min(current[max(0, low - 1):high + 1]) > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+
+class FuzzyCommandIndex:
+    """
+    Триграммный индекс ключей команд.
+    :param commands: ключи commands.json (фразы из одного или нескольких слов)
+    """
+
+    def __init__(self, commands=()):
+        self._keys = []  # Ключи как в commands.json
+        self._lower = []
+        # количество слов -> (номера ключей, количество триграмм, длины, {триграмма -> позиции в группе})
+        self._groups = {}
+        self.rebuild(commands)
+
+    def rebuild(self, commands):
+        keys = [key for key in commands if len(key) >= MIN_KEY_LENGTH]
+        lower = [key.lower() for key in keys]
+        # Окно фразы сравнивается только с ключами из стольких же слов, поэтому групп несколько
+        members = defaultdict(list)
+        for number, key in enumerate(lower):
+            members[len(key.split())].append(number)
+        groups = {}
+        for count, numbers in members.items():
+            postings = defaultdict(list)
+            sizes = []
+            for position, number in enumerate(numbers):
+                grams = _trigrams(lower[number])
+                sizes.append(len(grams))
+                for gram in grams:
+                    postings[gram].append(position)
+            groups[count] = (np.array(numbers), np.array(sizes, dtype=np.float64),
+                             np.array([len(lower[number]) for number in numbers], dtype=np.float64),
+                             {gram: np.array(positions) for gram, positions in postings.items()})
+        self._keys = keys
+        self._lower = lower
+        self._groups = groups
+
+    def resolve(self, text, skip=()):
+        """
+        Лучший ключ для фразы.
+        :param skip: слова фразы, которые не могут быть целью (имя ассистента, слово-действие)
+        :return: (ключ, оценка от 0 до 1) или (None, 0.0)
+        """
+        return self.rank(text, skip)[:2]
+
+    def rank(self, text, skip=()):
+        """
+        Лучший ключ для фразы и оценка следующего за ним другого ключа (для is_confident).
+        :return: (ключ, оценка, оценка второго ключа) или (None, 0.0, 0.0)
+        """
+        words = [word for word in text.lower().split() if not any(word.startswith(stem) for stem in skip)]
+        scores = {}  # номер ключа -> (лучшая оценка по всем окнам фразы, первое слово окна, слов в окне)
+        for count, group in self._groups.items():
+            for start in range(len(words) - count + 1):
+                self._score_window(" ".join(words[start:start + count]), start, count, group, scores)
+        covering = [(start, start + count) for score, start, count in scores.values()
+                    if count > 1 and score >= ACT_SCORE]
+        if covering:
+            scores = {number: entry for number, entry in scores.items()
+                      if not any(begin <= entry[1] and entry[1] + entry[2] <= end and entry[2] < end - begin
+                                 for begin, end in covering)}
+        if not scores:
+            return None, 0.0, 0.0
+        top = heapq.nlargest(2, scores.items(), key=lambda item: item[1][0])
+        runner_up = top[1][1][0] if len(top) > 1 else 0.0
+        return self._keys[top[0][0]], top[0][1][0], runner_up
+
+    def _score_window(self, window, start, count, group, scores):
+        numbers, sizes, lengths, postings = group
+        grams = _trigrams(window)
+        found = [postings[gram] for gram in grams if gram in postings]
+        if not found:
+            return
+
+        # Общие триграммы со всеми ключами группы -> граница оценки -> расстояние Левенштейна.
+        # Правка портит не больше трёх триграмм: расстояние не меньше (триграмм без пары) / 3 и разницы длин
+        shared = np.bincount(np.concatenate(found), minlength=len(numbers))
+        longest = np.maximum(lengths, len(window))
+        least_distance = np.maximum(np.ceil((np.maximum(sizes, len(grams)) - shared) / 3),
+                                    np.abs(lengths - len(window)))
+        bound = 1 - least_distance / longest
+        candidates = np.flatnonzero(bound >= ASK_SCORE)
+        if len(candidates) > MAX_CANDIDATES:
+            candidates = candidates[np.argpartition(-bound[candidates], MAX_CANDIDATES - 1)[:MAX_CANDIDATES]]
+        best, second = 0.0, 0.0
+        for position in candidates[np.argsort(-bound[candidates], kind="stable")]:
+            if bound[position] <= second:
+                break  # Остальные не попадут даже во второй
+            number = int(numbers[position])
+            key = self._lower[number]
+            length = max(len(key), len(window))
+            # Кандидат интересен, только если он лучше второго из найденных и не ниже ASK_SCORE
+            limit = int(length * (1 - max(ASK_SCORE, second)))
+            distance = edit_distance(window, key, limit)
+            if distance > limit:
+                continue
+            score = 1 - distance / length
+            if score > scores.get(number, (0.0,))[0]:
+                scores[number] = (score, start, count)
+            if score > best:
+                best, second = score, best
+            elif score > second:
+                second = score
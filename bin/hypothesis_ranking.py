@@ -0,0 +1,132 @@
+"""
+Выбор команды из нескольких гипотез распознавателя (N-best).
+
+С SetMaxAlternatives KaldiRecognizer отдаёт не одну фразу, а список альтернатив.
+Первая из них - то же, что обычный text, но команда нередко оказывается во второй
+или третьей ("открой хром" против "открой хрон"). Каждая альтернатива сверяется
+с индексом команд за один проход по её словам, и дальше уходит лучшая гипотеза,
+в которой есть команда; если команды нет ни в одной, остаётся первая.
+
+Индекс хранит слова в нормальной форме (word_normalizer), поэтому команда находится
+в любой форме слова ("открой папку загрузки" при ключе "папка загрузки"). Тот же индекс -
+основной способ найти в фразе слово-действие и ключ commands.json в run_script.
+"""
+import json
+
+from bin.command_grammar import OPEN_WORDS, CLOSE_WORDS, SPECIAL_WORDS, SPECIAL_STEMS
+from bin.word_normalizer import normalize_words, split_words
+
+MAX_ALTERNATIVES = 5  # Сколько гипотез просить у распознавателя
+
+# Категории слов индекса и их вес в оценке гипотезы
+NAME = "name"
+ACTION = "action"
+TARGET = "target"
+WEIGHTS = {NAME: 1, ACTION: 1, TARGET: 2}
+
+
+def parse_alternatives(result_json):
+    """
+    Тексты альтернатив из результата Vosk (в порядке распознавателя).
+    :return: список строк или None, если результат без альтернатив
+    """
+    if '"alternatives"' not in result_json:
+        return None
+    texts = []
+    for item in json.loads(result_json).get("alternatives", []):
+        text = item.get("text", "")
+        if "[unk]" in text:
+            text = " ".join(word for word in text.split() if word != "[unk]")
+        texts.append(text.strip().lower())
+    return texts
+
+
+class CommandIndex:
+    """
+    Индекс слов ассистента в нормальной форме: слова-действия, встроенные команды, ключи commands.json
+    и имена. Слова сравниваются точно, фразы из нескольких слов ищутся по первому слову
+    с проверкой всей фразы.
+    """
+
+    def __init__(self, names=(), commands=()):
+        self._words = {}  # нормальная форма -> категория
+        self._action_types = {}  # нормальная форма слова-действия -> 'open' или 'close'
+        self._phrases = {}  # нормальная форма первого слова -> [(нормальные формы фразы, категория, ключ)]
+        self.rebuild(names, commands)
+
+    def rebuild(self, names, commands):
+        action_types = {normal: 'open' for word in OPEN_WORDS for normal in normalize_words(word)}
+        action_types.update({normal: 'close' for word in CLOSE_WORDS for normal in normalize_words(word)})
+        words = {normal: ACTION for normal in action_types}
+        # Точное сравнение нормальных форм: "дату" - цель, а "кандидат" больше не похож на 'дат'
+        words.update({normal: TARGET for word in SPECIAL_WORDS if word.startswith(tuple(SPECIAL_STEMS))
+                      for normal in normalize_words(word)})
+        phrases = {}
+        for phrase, category in [(name, NAME) for name in names if name] + [(key, TARGET) for key in commands]:
+            normal = normalize_words(phrase)
+            if normal:
+                phrases.setdefault(normal[0], []).append((normal, category, phrase))
+        for variants in phrases.values():
+            variants.sort(key=lambda variant: -len(variant[0]))  # Длинные фразы проверяются первыми
+        self._words = words
+        self._action_types = action_types
+        self._phrases = phrases
+
+    def _phrases_in(self, words):
+        """Фразы индекса, которые есть среди нормальных форм слов текста: (категория, ключ)"""
+        for position, word in enumerate(words):
+            for normal, category, phrase in self._phrases.get(word, ()):
+                if words[position:position + len(normal)] == normal:
+                    yield category, phrase
+
+    def categories(self, text):
+        """Категории, найденные в тексте за один проход по словам"""
+        words = normalize_words(text)
+        found = {self._words[word] for word in words if word in self._words}
+        found.update(category for category, _ in self._phrases_in(words))
+        return found
+
+    def find_command(self, text):
+        """
+        Ключ commands.json, который есть в тексте в любой форме слов ("папку загрузки" -> "папка загрузки").
+        :return: ключ или None
+        """
+        return next((phrase for category, phrase in self._phrases_in(normalize_words(text))
+                     if category == TARGET), None)
+
+    def find_action(self, text):
+        """
+        Первое слово-действие фразы в любой форме ("открою" -> 'open', "отключить" -> 'close').
+        :return: (слово из фразы, 'open' или 'close') или (None, None)
+        """
+        action_types = self._action_types
+        for word, normal in zip(split_words(text), normalize_words(text)):
+            action_type = action_types.get(normal)
+            if action_type is not None:
+                return word, action_type
+        return None, None
+
+    def score(self, text):
+        """
+        Оценка гипотезы.
+        :return: (оценка, есть ли в гипотезе команда: действие и цель)
+        """
+        found = self.categories(text)
+        return sum(WEIGHTS[category] for category in found), ACTION in found and TARGET in found
+
+    def choose(self, alternatives):
+        """
+        Лучшая гипотеза с командой; при равной оценке - та, что выше у распознавателя.
+        :return: (текст, номер выбранной альтернативы)
+        """
+        best_index = None
+        best_score = -1
+        for index, text in enumerate(alternatives):
+            if not text:
+                continue
+            score, has_command = self.score(text)
+            if has_command and score > best_score:
+                best_index, best_score = index, score
+        if best_index is None:
+            return (alternatives[0] if alternatives else ""), 0
+        return alternatives[best_index], best_index
@@ -212,7 +212,14 @@ class CheckThread(QThread):
             "commands_widgets.py", "utils.py", "function_list_main.py",
             "lists.py", "other_options_widgets.py", "apply_color_methods.py", "check_update.py",
             "choose_color_window.py", "download_thread.py", "signals.py",
-            "toast_notification.py", "widget_window.py")
+            "toast_notification.py", "widget_window.py", "audio_pipeline.py",
+            "voice_activity.py", "command_grammar.py", "model_registry.py",
+            "audio_sources.py", "replay_harness.py", "latency_metrics.py",
+            "decode_processes.py", "result_arbitration.py", "english_cascade.py",
+            "hypothesis_ranking.py", "noise_floor.py", "preprocessing.py", "resampling.py",
+            "device_registry.py", "stream_health.py", "fake_audio_backend.py", "fake_recognizer.py",
+            "intent_matcher.py", "intent_registry.py", "fuzzy_commands.py",
+            "shortcut_index.py", "word_normalizer.py", "recognition_results.py")
 
         total_files = len(files_to_check)
         step_per_file = files_weight / total_files if total_files else 0
@@ -0,0 +1,158 @@
+"""
+Поиск всех словарей ассистента во фразе за один проход.
+
+Раньше run_script на каждую фразу делал десятки проверок `any(kw in text ...)`: дважды
+список цензуры, слова-действия, встроенные команды, плеер, а handle_app_command
+и handle_folder_command ещё и перебирали все ключи commands.json. Здесь все словари
+собраны в один автомат Ахо-Корасик: проход по символам фразы находит каждое вхождение
+каждого слова вместе с его категорией. Основы встроенных команд берутся из IntentRegistry.
+Автомат пересобирается только при изменении команд, имён ассистента или реестра.
+
+Порядок слов внутри категории сохраняется (rank): first() возвращает то же слово,
+что и прежний `next(kw for kw in список if kw in text)`.
+"""
+from bin.command_grammar import ACTION_STEMS
+
+# Категории
+CENSOR = "censor"
+NAME = "name"
+ACTION = "action"  # Любое слово-действие (по нему восстанавливается действие у подкоманд)
+OPEN = "open"
+CLOSE = "close"
+INTENT = "intent"  # Основа встроенной команды, значение - список Intent
+COMMAND = "command"  # Ключ commands.json
+PLAYER_TOGGLE = "player_toggle"
+PLAYER_NEXT = "player_next"
+PLAYER_PREV = "player_prev"
+
+CENSOR_STEMS = ['сук', 'суч', 'пизд', 'ебан', 'ебат', 'ёбан', 'нах', 'хуй', 'блять', 'блядь', 'ебу', 'епта',
+                'ёпта', 'гандон', 'пидор', 'пидар', "хуё", "хуя", "хую", "хуе", "залуп", "залупа", "пиздюк",
+                "ебанут", "ебарь", "ебанат", "еблан", "ебло", "еблив", "ебуч", "ёбыр", "заеб", "наеб", "объеб",
+                "подъеб", "разъеб", "съеб"]
+OPEN_STEMS = ['запус', 'откр', 'вкл', 'вруб']
+CLOSE_STEMS = ['закр', 'выкл', 'выруб', 'отруб', 'откл']
+PLAYER_TOGGLE_STEMS = ['пауз', 'пуск', 'пуст', 'вкл', 'вруб', 'отруб', 'выкл', 'стоп']
+PLAYER_NEXT_STEMS = ['след', 'впер', 'дальш', 'перекл']
+PLAYER_PREV_STEMS = ['пред', 'назад']
+
+STATIC_VOCABULARY = [
+    (CENSOR, CENSOR_STEMS),
+    (ACTION, ACTION_STEMS),
+    (OPEN, OPEN_STEMS),
+    (CLOSE, CLOSE_STEMS),
+    (PLAYER_TOGGLE, PLAYER_TOGGLE_STEMS),
+    (PLAYER_NEXT, PLAYER_NEXT_STEMS),
+    (PLAYER_PREV, PLAYER_PREV_STEMS),
+]
+
+
+class IntentHits:
+    """
+    Результат одного прохода: все вхождения и лучшее (с наименьшим rank) в каждой категории.
+    Категория проверяется через `in`, значение лучшего вхождения - через first().
+    """
+    __slots__ = ("text", "hits", "_best")
+
+    def __init__(self, text):
+        self.text = text
+        self.hits = []  # (позиция конца, категория, слово, значение)
+        self._best = {}  # категория -> (rank, значение)
+
+    def add(self, end, category, pattern, rank, value):
+        self.hits.append((end, category, pattern, value))
+        best = self._best.get(category)
+        if best is None or rank < best[0]:
+            self._best[category] = (rank, value)
+
+    def __contains__(self, category):
+        return category in self._best
+
+    def first(self, category, default=None):
+        """Значение слова категории, которое раньше всех стоит в её словаре"""
+        best = self._best.get(category)
+        return default if best is None else best[1]
+
+    def spans_of_intents(self):
+        """Вхождения основ встроенных команд: (начало, конец, список Intent)"""
+        return [(end - len(pattern), end, value) for end, category, pattern, value in self.hits
+                if category == INTENT]
+
+
+class IntentMatcher:
+    """
+    Автомат Ахо-Корасик по всем словарям ассистента.
+    Слово может входить в несколько категорий ('вкл' - действие, открытие и плеер).
+    :param registry: IntentRegistry встроенных команд (None - без них)
+    """
+
+    def __init__(self, names=(), commands=(), registry=None):
+        self._goto = [{}]  # состояние -> {символ: состояние}
+        self._fail = [0]
+        self._outputs = [()]  # состояние -> ((категория, слово, rank, значение), ...)
+        self.patterns = 0
+        self.registry = registry
+        self._registry_version = None
+        self._names = ()
+        self._commands = ()
+        self.rebuild(names, commands)
+
+    def rebuild(self, names, commands):
+        """Собирает автомат заново (при изменении команд или имён)"""
+        self._names, self._commands = list(names), list(commands)
+        goto, outputs = [{}], [[]]
+        patterns = 0
+        vocabulary = STATIC_VOCABULARY + [(NAME, [name for name in names if name]), (COMMAND, list(commands))]
+        if self.registry is not None:
+            vocabulary.append((INTENT, self.registry.vocabulary()))
+            self._registry_version = self.registry.version
+        for category, words in vocabulary:
+            values = words if isinstance(words, dict) else None
+            for rank, word in enumerate(words):
+                if not word:
+                    continue
+                state = 0
+                for char in word:
+                    next_state = goto[state].get(char)
+                    if next_state is None:
+                        next_state = len(goto)
+                        goto[state][char] = next_state
+                        goto.append({})
+                        outputs.append([])
+                    state = next_state
+                outputs[state].append((category, word, rank, values[word] if values else word))
+                patterns += 1
+
+        # Ссылки неудач обходом в ширину; выходы состояния дополняются выходами его суффикса
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                suffix = fail[state]
+                while suffix and char not in goto[suffix]:
+                    suffix = fail[suffix]
+                fail[next_state] = goto[suffix].get(char, 0)
+                outputs[next_state].extend(outputs[fail[next_state]])
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = [tuple(output) for output in outputs]
+        self.patterns = patterns
+
+    def scan(self, text):
+        """
+        Все вхождения словарей в текст за один проход.
+        :return: IntentHits
+        """
+        if self.registry is not None and self.registry.version != self._registry_version:
+            self.rebuild(self._names, self._commands)  # В реестр добавили команду
+        hits = IntentHits(text)
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for category, pattern, rank, value in outputs[state]:
+                hits.add(position + 1, category, pattern, rank, value)
+        return hits
@@ -0,0 +1,120 @@
+"""
+Реестр встроенных команд ассистента.
+
+Раньше встроенные команды (микшер, калькулятор, диспетчер, корзина, плеер, скриншоты...)
+были прописаны в run_script дважды: словарём special_commands для режима уточнения
+и длинной цепочкой if/elif. Срабатывала первая подстрока в порядке цепочки, поэтому
+'дат' ловил и "кандидат", и "солдат". Здесь каждая команда описана одной записью:
+основы слов, обработчики открытия/закрытия и приоритет. Основы попадают в IntentMatcher,
+а выбор команды - поиск по найденной основе: из пересекающихся вхождений побеждает
+самое длинное, из разных команд - с большим приоритетом. Новая команда добавляется
+вызовом register(), без правок основного цикла.
+"""
+from logging_config import debug_logger
+
+# Когда проверяется команда
+STAGE_SYSTEM = "system"  # По всей фразе с именем ассистента, до разбора на подкоманды (выключение компьютера)
+STAGE_ACTION = "action"  # Подкоманда со словом-действием (открыть/закрыть)
+STAGE_DIRECT = "direct"  # Фраза с именем, но без слов-действий (поиск, скриншоты)
+STAGE_ALWAYS = "always"  # Любая фраза, даже без имени (плеер)
+
+OPEN = "open"
+CLOSE = "close"
+
+
+class Intent:
+    """
+    Встроенная команда.
+    :param stems: основы слов, по которым команда находится во фразе
+    :param on_open: обработчик (команда, IntentHits) для действия "открыть" и для этапов без действия
+    :param on_close: обработчик для действия "закрыть"; None - закрывать нечего
+    :param priority: при нескольких командах во фразе выполняется команда с большим приоритетом
+    :param anchored: основа должна стоять в начале слова ('дат' не находится в "кандидат")
+    """
+
+    def __init__(self, name, stems, on_open, on_close=None, stage=STAGE_ACTION, priority=0, anchored=True):
+        self.name = name
+        self.stems = tuple(stems)
+        self.on_open = on_open
+        self.on_close = on_close
+        self.stage = stage
+        self.priority = priority
+        self.anchored = anchored
+
+    def handler(self, action_type):
+        return self.on_close if action_type == CLOSE else self.on_open
+
+    def run(self, action_type, command, hits):
+        """
+        Выполняет команду.
+        :return: True, если для этого действия есть обработчик
+        """
+        handler = self.handler(action_type)
+        if handler is None:
+            return False
+        handler(command, hits)
+        return True
+
+    def __repr__(self):
+        return f"Intent({self.name!r})"
+
+
+def ignore_text(func):
+    """Обработчик без аргументов в виде обработчика команды"""
+    return lambda command, hits: func()
+
+
+class IntentRegistry:
+    """Встроенные команды, сгруппированные по этапам, и поиск команды по вхождениям основ"""
+
+    def __init__(self):
+        self._intents = {}  # имя -> Intent
+        self.version = 0  # Меняется при регистрации, чтобы IntentMatcher знал, что пора пересобраться
+
+    def register(self, intent):
+        if intent.name in self._intents:
+            debug_logger.warning(f"Встроенная команда '{intent.name}' перерегистрирована")
+        self._intents[intent.name] = intent
+        self.version += 1
+        return intent
+
+    def unregister(self, name):
+        if self._intents.pop(name, None) is not None:
+            self.version += 1
+
+    def __iter__(self):
+        return iter(self._intents.values())
+
+    def get(self, name):
+        return self._intents.get(name)
+
+    def vocabulary(self):
+        """Основы для IntentMatcher: основа -> список команд, в которых она объявлена"""
+        stems = {}
+        for intent in self._intents.values():
+            for stem in intent.stems:
+                stems.setdefault(stem, []).append(intent)
+        return stems
+
+    def resolve(self, hits, stage):
+        """
+        Команда этапа stage, найденная во фразе.
+        :param hits: IntentHits (в категории INTENT значения - списки Intent)
+        :return: Intent или None
+        """
+        candidates = []
+        for start, end, intents in hits.spans_of_intents():
+            for intent in intents:
+                if intent.stage != stage:
+                    continue
+                if intent.anchored and start > 0 and hits.text[start - 1] != " ":
+                    continue
+                candidates.append((start, end, intent))
+        if not candidates:
+            return None
+
+        # Пересекающиеся вхождения: остаётся самое длинное ("фулл скрин", а не "скрин")
+        longest = [(start, end, intent) for start, end, intent in candidates
+                   if not any(other_start <= start and end <= other_end and other_end - other_start > end - start
+                              for other_start, other_end, _ in candidates)]
+        return max(longest, key=lambda item: (item[2].priority, item[1] - item[0], -item[0]))[2]
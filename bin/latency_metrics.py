@@ -0,0 +1,158 @@
+"""
+Замеры задержки по каждой фразе: от конца речи до ответа ассистента.
+
+Каждая распознанная фраза получает набор отметок по стадиям (STAGES). Отметки
+ставятся из разных потоков (декодирование, run_script, обработчики, воспроизведение
+ответа), поэтому фраза считается завершённой, когда начинается следующая или
+когда с начала прошло больше FINISH_AFTER секунд. Завершённая фраза пишется
+в log/metrics.log, а задержки стадий копятся для перцентилей.
+
+Ответ ("reply") засчитывается только реакции на команду этой фразы: отметка "match"
+возвращает номер фразы, run_script выполняет команду внутри answering(номер), и
+thread_react забирает номер в момент вызова. Реакции на мат, имя без команды,
+переспрос и ответы из других потоков номера не получают и задержку ответа не портят.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from logging_config import metrics_logger
+
+# Стадии в порядке прохождения; задержка каждой считается от "capture"
+STAGES = (
+    "capture",  # Захват последнего блока речи (по времени АЦП из time_info)
+    "final",  # Распознаватель выдал фразу
+    "dequeue",  # get_audio отдал фразу в run_script
+    "match",  # run_script нашёл команду
+    "handler_start",  # Обработчик (handler_links / open_link) начал работу
+    "handler_end",  # Обработчик закончил
+    "reply",  # Запущено воспроизведение ответа (react)
+)
+
+STAGE_TITLES = {
+    "final": "Распознавание",
+    "dequeue": "Очередь",
+    "match": "Поиск команды",
+    "handler_start": "Начало действия",
+    "handler_end": "Конец действия",
+    "reply": "Ответ",
+}
+
+HISTORY_SIZE = 200  # Сколько последних фраз учитывать в перцентилях
+FINISH_AFTER = 10.0  # Через сколько секунд фраза считается завершённой
+
+
+def percentile(values, q):
+    """Перцентиль q (0-100) по отсортированному списку, с линейной интерполяцией"""
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class LatencyTracker:
+    """
+    Отметки текущей фразы и история задержек по стадиям.
+    :param log: писать завершённые фразы в log/metrics.log (замеры бенчмарков и прогонов - нет)
+    """
+
+    def __init__(self, history_size=HISTORY_SIZE, log=True):
+        self.log = log
+        self._lock = threading.Lock()
+        self._current = None  # {"id": номер, "text": ..., "marks": {стадия: время}}
+        self._history = {stage: deque(maxlen=history_size) for stage in STAGES[1:]}
+        self._answering = threading.local()  # Номер фразы, на команду которой отвечает этот поток
+        self._next_id = 0
+        self.utterances = 0
+
+    def begin(self, capture_time, text=""):
+        """Новая фраза; предыдущая (если была) завершается"""
+        with self._lock:
+            self._finish_locked()
+            self._next_id += 1
+            self._current = {"id": self._next_id, "text": text, "marks": {"capture": capture_time}}
+
+    def mark(self, stage, timestamp=None):
+        """
+        Отметка стадии текущей фразы. Повторные отметки той же стадии игнорируются.
+        :return: номер фразы (для answering) или None, если фразы нет
+        """
+        timestamp = timestamp or time.time()
+        with self._lock:
+            if self._current is None:
+                return None
+            self._current["marks"].setdefault(stage, timestamp)
+            return self._current["id"]
+
+    def mark_reply(self, token, timestamp=None):
+        """Отметка ответа, если фраза token ещё текущая и для неё найдена команда"""
+        timestamp = timestamp or time.time()
+        with self._lock:
+            current = self._current
+            if current is not None and current["id"] == token and "match" in current["marks"]:
+                current["marks"].setdefault("reply", timestamp)
+
+    @contextmanager
+    def answering(self, token):
+        """Реакции, запущенные в этом потоке внутри блока, отвечают на фразу token"""
+        previous = getattr(self._answering, "token", None)
+        self._answering.token = token
+        try:
+            yield
+        finally:
+            self._answering.token = previous
+
+    def reply_token(self):
+        """Номер фразы, на которую отвечает текущий поток (None - реакция не ответ на команду)"""
+        return getattr(self._answering, "token", None)
+
+    def flush_stale(self, max_age=FINISH_AFTER):
+        """Завершает текущую фразу, если она началась больше max_age секунд назад"""
+        with self._lock:
+            if self._current is not None and time.time() - self._current["marks"]["capture"] > max_age:
+                self._finish_locked()
+
+    def _finish_locked(self):
+        if self._current is None:
+            return
+        marks = self._current["marks"]
+        start = marks["capture"]
+        parts = []
+        for stage in STAGES[1:]:
+            if stage in marks:
+                delay = (marks[stage] - start) * 1000
+                self._history[stage].append(delay)
+                parts.append(f"{stage}={delay:.0f}")
+        self.utterances += 1
+        if self.log:
+            metrics_logger.info(f"{self._current['text']} | {' '.join(parts)} мс")
+        self._current = None
+
+    def summary(self):
+        """
+        Перцентили задержек по стадиям в миллисекундах.
+        :return: {стадия: {"count", "p50", "p90", "p99"}}
+        """
+        with self._lock:
+            history = {stage: sorted(values) for stage, values in self._history.items()}
+        return {
+            stage: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+            }
+            for stage, values in history.items()
+        }
+
+    def log_summary(self):
+        for stage, stats in self.summary().items():
+            if stats["count"]:
+                metrics_logger.info(f"[{stage}] n={stats['count']} p50={stats['p50']:.0f} "
+                                    f"p90={stats['p90']:.0f} p99={stats['p99']:.0f} мс")
+
+
+latency_tracker = LatencyTracker()
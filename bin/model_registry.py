@@ -0,0 +1,137 @@
+"""
+Реестр моделей Vosk на весь процесс.
+
+Каждая модель загружается с диска один раз и остаётся в памяти между перезапусками
+ассистента (сохранение настроек, смена микрофона). Распознаватели KaldiRecognizer
+создаются заново из уже загруженной модели. Модель выгружается только явно
+(unload) или при нехватке памяти (trim), и только если её никто не использует.
+Модели можно загружать заранее и параллельно в фоне (load_async).
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from vosk import Model, KaldiRecognizer
+
+from logging_config import logger, debug_logger
+
+
+class ModelRegistry:
+    """Загруженные модели со счётчиками ссылок"""
+
+    def __init__(self):
+        self._models = {}  # путь -> Model
+        self._refcounts = {}  # путь -> количество acquire без release
+        self._load_locks = {}  # путь -> Lock, чтобы одна модель не грузилась дважды
+        self._futures = {}  # путь -> Future фоновой загрузки
+        self._executor = None
+        self._lock = threading.Lock()
+        self.load_times = {}  # путь -> время загрузки в секундах
+
+    def _path_lock(self, path):
+        with self._lock:
+            if path not in self._load_locks:
+                self._load_locks[path] = threading.Lock()
+            return self._load_locks[path]
+
+    def is_loaded(self, path):
+        return path in self._models
+
+    def _load(self, path):
+        """Загружает модель, если её ещё нет в памяти. Если загрузка уже идёт - ждёт её"""
+        with self._path_lock(path):
+            model = self._models.get(path)
+            if model is not None:
+                return model
+
+            start = time.time()
+            model = Model(path)
+            elapsed = time.time() - start
+            with self._lock:
+                self._models[path] = model
+                self.load_times[path] = elapsed
+            logger.info(f"Модель загружена за {elapsed:.1f} с: {path}")
+            debug_logger.info(f"Модель загружена за {elapsed:.1f} с: {path}")
+            return model
+
+    def load_async(self, path):
+        """
+        Запускает загрузку модели в фоне (несколько моделей грузятся параллельно).
+        :return: Future, результатом которого будет модель
+        """
+        with self._lock:
+            future = self._futures.get(path)
+            if future is not None and not (future.done() and future.exception() is not None):
+                return future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ModelLoader")
+            future = self._executor.submit(self._load, path)
+            self._futures[path] = future
+        return future
+
+    def acquire(self, path):
+        """
+        Возвращает модель, при необходимости загружая её, и увеличивает счётчик ссылок.
+        Если модель как раз грузится в фоне, дожидается окончания загрузки.
+        :param path: путь к папке модели
+        """
+        model = self._load(path)
+        with self._lock:
+            self._refcounts[path] = self._refcounts.get(path, 0) + 1
+        return model
+
+    def release(self, path):
+        """Уменьшает счётчик ссылок. Модель остаётся в памяти до unload/trim"""
+        with self._lock:
+            if self._refcounts.get(path, 0) > 0:
+                self._refcounts[path] -= 1
+
+    def refcount(self, path):
+        return self._refcounts.get(path, 0)
+
+    def create_recognizer(self, path, sample_rate=16000, grammar=None, words=False, alternatives=0):
+        """
+        Новый распознаватель на основе загруженной модели.
+        :param grammar: JSON-грамматика (строка) или None для открытого словаря
+        :param words: отдавать в результатах слова с уверенностью (SetWords)
+        :param alternatives: сколько гипотез отдавать (SetMaxAlternatives), 0 - только лучшую
+        """
+        model = self._models.get(path)
+        if model is None:
+            raise RuntimeError(f"Модель не загружена: {path}")
+        if grammar is None:
+            recognizer = KaldiRecognizer(model, sample_rate)
+        else:
+            recognizer = KaldiRecognizer(model, sample_rate, grammar)
+        if words:
+            recognizer.SetWords(True)
+        if alternatives:
+            recognizer.SetMaxAlternatives(alternatives)
+        return recognizer
+
+    def unload(self, path, force=False):
+        """
+        Выгружает модель из памяти.
+        :param force: выгрузить, даже если на неё есть ссылки
+        :return: True, если модель выгружена
+        """
+        with self._lock:
+            if path not in self._models:
+                return False
+            if self._refcounts.get(path, 0) > 0 and not force:
+                debug_logger.warning(f"Модель используется, выгрузка отменена: {path}")
+                return False
+            del self._models[path]
+            self._refcounts.pop(path, None)
+            self._futures.pop(path, None)
+        debug_logger.info(f"Модель выгружена: {path}")
+        return True
+
+    def trim(self):
+        """Выгружает все неиспользуемые модели (при нехватке памяти)"""
+        with self._lock:
+            unused = [path for path in self._models if self._refcounts.get(path, 0) == 0]
+        return [path for path in unused if self.unload(path)]
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,99 @@
+"""
+Адаптивная оценка уровня шума микрофона.
+
+Раньше "тишиной" считался блок с RMS < 20 для любого микрофона: на шумном железе
+watchdog никогда не видел тишины, а на тихом перезапускал поток каждые 10 секунд.
+Здесь по окну последних блоков считается низкий перцентиль RMS - уровень фона,
+и от него выводятся пороги: "сигнал есть" для watchdog'а и начало/конец речи для VAD.
+Оценка запоминается по имени устройства, чтобы следующий запуск начинался уже откалиброванным.
+"""
+import numpy as np
+
+WINDOW_SECONDS = 10  # Окно, по которому оценивается фон
+PERCENTILE = 0.1  # Фон - 10-й перцентиль RMS окна (речь занимает меньшую часть времени)
+UPDATE_BLOCKS = 16  # Как часто (в блоках) пересчитывать перцентиль
+WARMUP_SECONDS = 3  # Без сохранённой оценки пороги меняются только после стольких секунд звука
+SMOOTHING = 0.2  # Сглаживание оценки между пересчётами
+
+# Пороги относительно фона и их нижние границы
+SIGNAL_RATIO = 0.5  # Ниже половины фона - звука нет совсем (поток завис или микрофон отключён)
+MIN_SIGNAL_RMS = 1.0
+START_RATIO = 4.0
+MIN_START_RMS = 60.0
+STOP_RATIO = 2.5
+MIN_STOP_RMS = 40.0
+
+
+class NoiseFloorEstimator:
+    """
+    Скользящий перцентиль RMS блоков. Память выделяется один раз при создании.
+    :param initial: сохранённая оценка фона для этого устройства или None
+    """
+
+    def __init__(self, initial=None, block_size=512, sample_rate=16000):
+        size = max(UPDATE_BLOCKS, int(WINDOW_SECONDS * sample_rate / block_size))
+        self._window = np.zeros(size, dtype=np.float32)
+        self._scratch = np.zeros(size, dtype=np.float32)  # Черновик для partition
+        self._warmup = int(WARMUP_SECONDS * sample_rate / block_size)
+        self._next = 0
+        self._count = 0
+        self._since_update = 0
+        self.floor = None
+        self.seed(initial)
+
+    def seed(self, floor):
+        """Начальная оценка (например, сохранённая для выбранного устройства)"""
+        if floor is not None and floor >= 0:
+            self.floor = float(floor)
+
+    def update(self, rms):
+        """
+        Учитывает RMS очередного блока.
+        :return: True, если оценка фона пересчитана
+        """
+        self._window[self._next] = rms
+        self._next = (self._next + 1) % len(self._window)
+        self._count = min(self._count + 1, len(self._window))
+        self._since_update += 1
+        if self._since_update < UPDATE_BLOCKS or self._count < self._warmup:
+            return False
+        self._since_update = 0
+
+        scratch = self._scratch[:self._count]
+        np.copyto(scratch, self._window[:self._count])
+        k = int(PERCENTILE * (self._count - 1))
+        scratch.partition(k)
+        estimate = float(scratch[k])
+        if self.floor is None:
+            self.floor = estimate
+        else:
+            self.floor += SMOOTHING * (estimate - self.floor)
+        return True
+
+    @property
+    def signal_rms(self):
+        """Порог для watchdog'а: ниже него звука нет совсем"""
+        if self.floor is None:
+            return None
+        return max(MIN_SIGNAL_RMS, self.floor * SIGNAL_RATIO)
+
+    @property
+    def start_rms(self):
+        """Порог начала речи для VAD"""
+        if self.floor is None:
+            return None
+        return max(MIN_START_RMS, self.floor * START_RATIO)
+
+    @property
+    def stop_rms(self):
+        """Порог тишины во время речи для VAD"""
+        if self.floor is None:
+            return None
+        return max(MIN_STOP_RMS, self.floor * STOP_RATIO)
+
+    def apply(self, vad):
+        """Переносит пороги в VoiceActivityGate"""
+        if self.floor is None or vad is None:
+            return
+        vad.start_rms = self.start_rms
+        vad.stop_rms = self.stop_rms
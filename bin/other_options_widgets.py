@@ -13,6 +13,7 @@ from packaging import version
 from bin.apply_color_methods import ApplyColor
 from bin.check_update import check_all_versions
 from bin.download_thread import DownloadThread, SliderProgressBar
+from bin.latency_metrics import latency_tracker, STAGE_TITLES
 from bin.signals import progress_signal
 from logging_config import logger, debug_logger
 from path_builder import get_path
@@ -520,6 +521,69 @@ class DebuglogWindow(QDialog):
             self.log_area.append(f"Ошибка при чтении файла логов: {e}")
 
 
+class LatencyMetricsWidget(QWidget):
+    """Виджет задержек: сколько проходит от конца фразы до каждой стадии обработки"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.stage_labels = {}
+        self.init_ui()
+        self.update_timer = QTimer(self)
+        self.update_timer.timeout.connect(self.update_data)
+        self.update_timer.start(2000)
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+
+        self.count_label = QLabel("Фраз: 0", self)
+        self.count_label.setStyleSheet("background: transparent;")
+        layout.addWidget(self.count_label)
+
+        hint_label = QLabel("От конца фразы, мс (p50 / p90 / p99):", self)
+        hint_label.setStyleSheet("background: transparent;")
+        layout.addWidget(hint_label)
+
+        for stage, title in STAGE_TITLES.items():
+            label = QLabel(f"{title}: -", self)
+            label.setStyleSheet("background: transparent;")
+            self.stage_labels[stage] = label
+            layout.addWidget(label)
+
+        self.open_button = QPushButton("Открыть лог задержек")
+        self.open_button.clicked.connect(self.open_metrics_log)
+        layout.addWidget(self.open_button)
+
+        layout.addStretch()
+        self.update_data()
+
+    def update_data(self):
+        if not self.isVisible():
+            return
+        summary = latency_tracker.summary()
+        self.count_label.setText(f"Фраз: {latency_tracker.utterances}")
+        for stage, label in self.stage_labels.items():
+            stats = summary.get(stage)
+            if not stats or not stats["count"]:
+                label.setText(f"{STAGE_TITLES[stage]}: -")
+                continue
+            label.setText(f"{STAGE_TITLES[stage]}: {stats['p50']:.0f} / {stats['p90']:.0f} / {stats['p99']:.0f}")
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_data()
+
+    def open_metrics_log(self):
+        path = get_path("log", "metrics.log")
+        try:
+            if not os.path.exists(path):
+                with open(path, "w", encoding="utf-8"):
+                    pass
+            latency_tracker.log_summary()
+            os.startfile(path)
+        except Exception as e:
+            debug_logger.error(f"Ошибка при открытии лога задержек: {e}")
+
+
 class RelaxWidget(QWidget):
     """Виджет управления звуковыми эффектами(не знаю, прикол)"""
 
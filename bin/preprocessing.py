@@ -0,0 +1,143 @@
+"""
+Предобработка звука перед распознаванием.
+
+Дешёвые USB-микрофоны отдают постоянное смещение (DC) и гул вентиляторов прямо в Kaldi:
+это портит распознавание и заставляет декодер разбирать мусорные кадры.
+Здесь блок проходит фильтр DC и high-pass (одна каскадная SOS-цепочка scipy с сохранением
+состояния между блоками) и стационарный спектральный гейт: профиль шума по частотам
+копится на тихих кадрах, и всё, что не выше него, приглушается.
+Если обработка блока не укладывается в бюджет времени, гейт отключается, фильтр остаётся.
+"""
+import time
+
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+from logging_config import debug_logger
+
+HIGHPASS_HZ = 80  # Ниже - гул сети и вентиляторов, речи там нет
+DC_POLE = 0.995  # Полюс фильтра DC: y[n] = x[n] - x[n-1] + R * y[n-1]
+BUDGET_MS = 2.0  # Бюджет на блок (блок - 32 мс звука)
+BUDGET_BLOCKS = 50  # Сколько блоков подряд усреднять время перед решением об отключении гейта
+
+# Спектральный гейт
+GATE_NOISE_FRAMES = 16  # Первые кадры целиком идут в профиль шума
+GATE_NOISE_ALPHA = 0.05  # Скорость обновления профиля шума на тихих кадрах
+GATE_NOISE_RATIO = 2.0  # Кадр тише профиля, умноженного на это число, считается шумом
+GATE_OVERSUBTRACT = 1.5  # Насколько сильно вычитать профиль из спектра
+GATE_MIN_GAIN = 0.1  # Шум приглушается, но не вырезается полностью (меньше "музыкального" шума)
+
+
+class AudioPreprocessor:
+    """
+    Фильтр DC + high-pass и спектральный гейт, блоки обрабатываются на месте.
+    Гейт работает кадрами по block_size с шагом в полблока (окно sqrt-Hann, overlap-add),
+    поэтому задерживает звук на полблока (16 мс).
+    :param spectral_gate: включить спектральный гейт
+    :param budget_ms: бюджет времени на блок, при превышении гейт отключается
+    """
+
+    def __init__(self, block_size=512, sample_rate=16000, highpass_hz=HIGHPASS_HZ, spectral_gate=True,
+                 budget_ms=BUDGET_MS):
+        self.block_size = block_size
+        self.budget_ms = budget_ms
+        self.spectral_gate = spectral_gate
+        self.blocks = 0
+        self.over_budget = 0  # Сколько блоков не уложились в бюджет
+        self._block_ms = 0.0  # Время обработки текущего блока (фильтр + гейт)
+        self._series_ms = 0.0  # Время обработки за текущую серию BUDGET_BLOCKS блоков
+
+        # DC-блокер первым звеном, за ним high-pass Баттерворта 2-го порядка
+        dc = np.array([[1.0, -1.0, 0.0, 1.0, -DC_POLE, 0.0]])
+        highpass = butter(2, highpass_hz, btype="highpass", fs=sample_rate, output="sos")
+        self._sos = np.vstack([dc, highpass])
+        self._zi = np.zeros((len(self._sos), 2))
+        self._zi_initialized = False
+        self._samples = np.zeros(block_size, dtype=np.float64)
+
+        # Кадры гейта: окно block_size, шаг block_size // 2
+        self._hop = block_size // 2
+        self._window = np.sqrt(np.hanning(block_size + 1)[:block_size])  # Периодическое sqrt-Hann
+        self._frame = np.zeros(block_size, dtype=np.float64)  # Последние block_size сэмплов входа
+        self._overlap = np.zeros(block_size, dtype=np.float64)  # Хвост overlap-add
+        self._output = np.zeros(block_size, dtype=np.float64)
+        self._noise = np.zeros(block_size // 2 + 1, dtype=np.float64)
+        self._noise_frames = 0
+
+    def filter(self, block):
+        """
+        Фильтр DC и high-pass на месте (block - массив int16, доступный для записи).
+        Вызывается первым для каждого блока: с него начинается учёт времени блока
+        """
+        self._close_block()
+        started = time.perf_counter()
+        size = len(block)
+        if size == 0:
+            return
+        samples = self._samples if size == self.block_size else self._samples[:size]
+        np.copyto(samples, block)
+        if not self._zi_initialized:
+            # Начальное состояние по первому сэмплу, иначе первый блок "щёлкает" скачком DC
+            self._zi = sosfilt_zi(self._sos) * samples[0]
+            self._zi_initialized = True
+        filtered, self._zi = sosfilt(self._sos, samples, zi=self._zi)
+        np.clip(filtered, -32768, 32767, out=filtered)
+        np.copyto(block, filtered, casting="unsafe")
+        self._account(started)
+
+    def gate(self, block):
+        """Спектральный гейт на месте; блоки нестандартной длины проходят без изменений"""
+        if not self.spectral_gate or len(block) != self.block_size:
+            return
+        started = time.perf_counter()
+        hop = self._hop
+        for start in (0, hop):
+            self._frame[:-hop] = self._frame[hop:]
+            self._frame[-hop:] = block[start:start + hop]
+            spectrum = np.fft.rfft(self._frame * self._window)
+            magnitude = np.abs(spectrum)
+            self._learn_noise(magnitude)
+            gain = 1.0 - GATE_OVERSUBTRACT * self._noise / np.maximum(magnitude, 1e-9)
+            np.clip(gain, GATE_MIN_GAIN, 1.0, out=gain)
+            frame = np.fft.irfft(spectrum * gain, n=self.block_size) * self._window
+
+            # Overlap-add: первая половина кадра дополняет хвост предыдущего
+            self._output[start:start + hop] = self._overlap[:hop] + frame[:hop]
+            self._overlap[:hop] = frame[hop:]
+        np.clip(self._output, -32768, 32767, out=self._output)
+        np.copyto(block, self._output, casting="unsafe")
+        self._account(started)
+
+    def process(self, block):
+        """Вся предобработка блока на месте"""
+        self.filter(block)
+        self.gate(block)
+
+    def _learn_noise(self, magnitude):
+        """Копит профиль шума: сначала по всем кадрам, потом только по тихим"""
+        if self._noise_frames < GATE_NOISE_FRAMES:
+            self._noise_frames += 1
+            self._noise += (magnitude - self._noise) / self._noise_frames
+        elif magnitude.sum() < GATE_NOISE_RATIO * self._noise.sum():
+            self._noise += GATE_NOISE_ALPHA * (magnitude - self._noise)
+
+    def _account(self, started):
+        self._block_ms += (time.perf_counter() - started) * 1000
+
+    def _close_block(self):
+        """Учёт времени прошлого блока: гейт отключается, если средний блок не укладывается в бюджет"""
+        if not self._block_ms:
+            return
+        elapsed, self._block_ms = self._block_ms, 0.0
+        self._series_ms += elapsed
+        if elapsed > self.budget_ms:
+            self.over_budget += 1
+        self.blocks += 1
+        if self.blocks % BUDGET_BLOCKS:
+            return
+        average = self._series_ms / BUDGET_BLOCKS
+        self._series_ms = 0.0
+        if self.spectral_gate and average > self.budget_ms:
+            self.spectral_gate = False
+            debug_logger.warning(f"Предобработка не укладывается в бюджет ({average:.2f} мс на блок "
+                                 f"при {self.budget_ms:.2f} мс), спектральный гейт отключён")
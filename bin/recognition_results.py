@@ -0,0 +1,25 @@
+"""
+Разбор ответов распознавателей Vosk.
+
+Result, FinalResult и PartialResult возвращают JSON-строку. Её разбирают поток
+декодирования, каскад с английской моделью и процессы распознавания, поэтому разбор
+вынесен сюда и не зависит от конвейера.
+"""
+import json
+
+EMPTY_RESULTS = {"text": '"text" : ""', "partial": '"partial" : ""'}  # Как Vosk пишет пустой результат
+
+
+def parse_text(result_json, key="text"):
+    """
+    Текст результата Vosk без [unk], в нижнем регистре.
+    :param result_json: строка из Result, FinalResult или PartialResult
+    :param key: "text" для финального результата, "partial" для частичного
+    """
+    if EMPTY_RESULTS[key] in result_json:
+        return ""  # Пустой результат (почти каждый PartialResult) - без json.loads
+    result = json.loads(result_json)
+    text = result.get(key, "")
+    if "[unk]" in text:
+        text = " ".join(word for word in text.split() if word != "[unk]")
+    return text.strip().lower()
@@ -0,0 +1,230 @@
+"""
+Прогон записанных WAV-файлов без микрофона.
+
+Распознавание: звук подаётся в тот же callback AudioPipeline.capture, что и с микрофона,
+и распознаётся теми же распознавателями. Фразы не выполняются, а записываются
+RecordingDispatcher'ом вместе со временем - так можно замерить задержку "конец записи ->
+фраза" и пропускную способность на машине без звуковой карты (в том числе на Linux):
+
+    python -m bin.replay_harness record1.wav record2.wav --speed 0
+
+Команды: main.py --replay a.wav b.wav --expect actions.json проводит фразы через настоящий
+run_script, а ActionRecorder подменяет запуск ярлыков и папок, встроенные команды (горячие
+клавиши плеера, окна Windows) и звуковые реакции записью. Когда файлы проиграны, записанные
+действия сравниваются с ожидаемыми из actions.json, например:
+
+    [["app", "open", "Google Chrome.lnk"], ["intent", "калькулятор", "open"], ["folder", "close", "D:/Загрузки"]]
+
+Плеер проходит через настоящий обработчик, записываются только нажатые клавиши: ["player", "next_track"].
+
+Файлы: 16 кГц, моно, 16 бит, по одной фразе в файле.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from bin.audio_pipeline import AudioPipeline
+from bin.audio_sources import WavFileSource
+from bin.english_cascade import EnglishCascade
+from bin.latency_metrics import LatencyTracker
+from bin.model_registry import model_registry
+from bin.voice_activity import VoiceActivityGate
+from logging_config import logger
+from path_builder import get_path
+
+
+class RecordingDispatcher:
+    """Заглушка вместо run_script: запоминает, что и когда было бы выполнено"""
+
+    def __init__(self):
+        self.actions = []  # (время, текст)
+        self._lock = threading.Lock()
+
+    def dispatch(self, text):
+        with self._lock:
+            self.actions.append((time.time(), text))
+
+    def since(self, index):
+        with self._lock:
+            return self.actions[index:]
+
+
+class ActionRecorder:
+    """
+    Заглушки действий для прогона через настоящий run_script: вместо запуска ярлыков, папок,
+    встроенных команд и реакций запоминает, что и в каком порядке было бы выполнено
+    """
+    REACTIONS = ("thread_react", "thread_react_detail", "react", "greeting")
+    PLAYER_KEYS = ("play_pause", "next_track", "previous_track")  # Методы controller из bin.audio_control
+    CHECKED_KINDS = ("app", "folder", "intent", "player")  # Реакции сравниваются, только если они есть в ожидаемых
+
+    def __init__(self):
+        self.actions = []  # (время, [вид, подробности...])
+        self._lock = threading.Lock()
+
+    def record(self, kind, *details):
+        action = [kind, *(str(detail) for detail in details)]
+        with self._lock:
+            self.actions.append((time.time(), action))
+        logger.info(f"[Прогон] {action}")
+
+    def stub_dispatch(self, module, assistant):
+        """
+        Подменяет обработчики, которые вызывает run_script.
+        :param module: модуль, глобальные имена которого видит run_script (main)
+        :param assistant: окно ассистента с реестром встроенных команд
+        """
+        module.handler_links = lambda filename, action: self.record("app", action, filename)
+        module.handler_folder = lambda folder_path, action: self.record("folder", action, folder_path)
+        for name in self.REACTIONS:
+            setattr(module, name, self._reaction(name))
+        assistant.censor_counter = lambda: self.record("censor")
+        # Клавиша плеера выбирается настоящим обработчиком по словам фразы: заглушка только у клавиш
+        module.controller = _PlayerKeys(self)
+        for intent in assistant.intent_registry:
+            if intent.on_open == assistant._run_player:
+                continue
+            if intent.on_open is not None:
+                intent.on_open = self._intent(intent.name, "open")
+            if intent.on_close is not None:
+                intent.on_close = self._intent(intent.name, "close")
+
+    def _reaction(self, name):
+        def reaction(folder=None, *args, **kwargs):
+            self.record("reaction", name, os.path.basename(os.path.normpath(folder)) if folder else "")
+        return reaction
+
+    def _intent(self, name, action):
+        def run(command, hits):
+            self.record("intent", name, action)
+        return run
+
+    def check(self, expected):
+        """
+        Сравнивает записанные действия с ожидаемыми.
+        :param expected: список [вид, подробности...]
+        :return: список расхождений (пустой, если всё совпало)
+        """
+        kinds = set(self.CHECKED_KINDS) | {action[0] for action in expected}
+        with self._lock:
+            actual = [action for _, action in self.actions if action[0] in kinds]
+        problems = []
+        for position in range(max(len(actual), len(expected))):
+            got = actual[position] if position < len(actual) else None
+            wanted = list(expected[position]) if position < len(expected) else None
+            if got != wanted:
+                problems.append(f"{position + 1}: ожидалось {wanted}, выполнено {got}")
+        return problems
+
+
+class _PlayerKeys:
+    """Заглушка controller: записывает нажатие клавиши плеера вместо него"""
+
+    def __init__(self, recorder):
+        for key in ActionRecorder.PLAYER_KEYS:
+            setattr(self, key, lambda key=key: recorder.record("player", key))
+
+
+def load_expected(path):
+    """Ожидаемые действия из JSON-файла (список [вид, подробности...])"""
+    with open(path, encoding="utf-8") as file:
+        return [[str(item) for item in action] for action in json.load(file)]
+
+
+def replay(paths, speed=0.0, use_vad=True, with_en=False, model_ru=None, model_en=None, cascade=False):
+    """
+    Проигрывает файлы по одному и собирает отчёт.
+    :param speed: 1.0 - реальное время, 0 - без пауз
+    :param cascade: английская модель только по необходимости (вместо with_en)
+    :return: словарь с результатами по файлам и общей пропускной способностью
+    """
+    model_ru = model_ru or get_path("bin", "model_ru")
+    model_en = model_en or get_path("bin", "model_en")
+    model_registry.acquire(model_ru)
+    rec_en = None
+    if with_en:
+        model_registry.acquire(model_en)
+        rec_en = model_registry.create_recognizer(model_en, 16000)
+
+    dispatcher = RecordingDispatcher()
+    # Свой замер задержки: фразы прогона не попадают в log/metrics.log
+    tracker = LatencyTracker(log=False)
+    pipeline = AudioPipeline(on_result=dispatcher.dispatch,
+                             vad=VoiceActivityGate() if use_vad else None, latency_tracker=tracker)
+    pipeline.set_recognizers(model_registry.create_recognizer(model_ru, 16000, words=cascade), rec_en)
+    english_cascade = None
+    if cascade:
+        english_cascade = EnglishCascade(model_en)
+        pipeline.set_cascade(english_cascade)
+    pipeline.start()
+
+    files = []
+    audio_seconds = 0.0
+    started = time.time()
+    try:
+        for path in paths:
+            first_action = len(dispatcher.actions)
+            source = WavFileSource([path], pipeline.capture, speed=speed)
+            source.start()
+            source.wait()
+            pipeline.wait_idle()
+            audio_seconds += source.audio_seconds
+
+            actions = dispatcher.since(first_action)
+            end_time = source.file_end_times.get(path)
+            latency = actions[0][0] - end_time if actions and end_time else None
+            files.append({
+                "path": path,
+                "texts": [text for _, text in actions],
+                "latency": latency,
+            })
+    finally:
+        pipeline.stop()
+        model_registry.release(model_ru)
+        if with_en:
+            model_registry.release(model_en)
+        if english_cascade is not None:
+            english_cascade.close()
+
+    elapsed = time.time() - started
+    tracker.flush_stale(max_age=0)
+    return {
+        "files": files,
+        "audio_seconds": audio_seconds,
+        "elapsed": elapsed,
+        "realtime_factor": audio_seconds / elapsed if elapsed else 0.0,
+        "pipeline": pipeline.stats(),
+        "recognition": tracker.summary()["final"],  # Конец речи -> фраза от распознавателя, мс
+        "cascade": {"decoded": english_cascade.decoded, "skipped": english_cascade.skipped}
+        if english_cascade is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Прогон WAV-файлов через распознавание")
+    parser.add_argument("paths", nargs="+", help="WAV-файлы 16 кГц, моно, 16 бит")
+    parser.add_argument("--speed", type=float, default=0.0, help="1 - реальное время, 0 - без пауз")
+    parser.add_argument("--no-vad", action="store_true", help="Отключить детектор речи")
+    parser.add_argument("--en", action="store_true", help="Распознавать и английской моделью")
+    parser.add_argument("--cascade", action="store_true", help="Английская модель только по необходимости")
+    args = parser.parse_args()
+
+    report = replay(args.paths, speed=args.speed, use_vad=not args.no_vad, with_en=args.en and not args.cascade,
+                    cascade=args.cascade)
+    for item in report["files"]:
+        latency = f"{item['latency'] * 1000:.0f} мс" if item["latency"] is not None else "-"
+        print(f"{item['path']}: {item['texts']} (задержка {latency})")
+    print(f"Аудио {report['audio_seconds']:.1f} с за {report['elapsed']:.1f} с "
+          f"(x{report['realtime_factor']:.1f} от реального времени)")
+    print(f"Конвейер: {report['pipeline']}")
+    recognition = report["recognition"]
+    if recognition["count"]:
+        print(f"Распознавание после конца речи: p50 {recognition['p50']:.0f} мс, p90 {recognition['p90']:.0f} мс")
+    if report["cascade"] is not None:
+        print(f"Каскад EN: {report['cascade']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Потоковая передискретизация захвата в 16 кГц моно.
+
+Многие устройства WASAPI не открываются на 16 кГц моно или отдают звук через
+пересчёт частоты ОС неизвестного качества. Поэтому микрофон можно открыть в его
+родном формате, а сведение каналов и полифазную передискретизацию сделать здесь.
+Фильтр хранит хвост предыдущего блока, так что границы блоков не дают щелчков,
+а работа на блок ограничена: TAPS_PER_PHASE умножений на каждый выходной сэмпл.
+
+Всё это выполняется в потоке декодирования (NativeFormatConverter), а не в callback'е
+PortAudio: callback кладёт в кольцевой буфер сырой блок устройства. Рабочие массивы
+выделяются один раз при создании, поэтому на блок не создаётся временных массивов.
+"""
+from math import gcd
+
+import numpy as np
+from scipy.signal import firwin
+
+TAPS_PER_PHASE = 24  # Длина фильтра на одну фазу (качество против стоимости)
+ROLLOFF = 0.9  # Полоса пропускания относительно новой частоты Найквиста
+KAISER_BETA = 6.0
+MAX_INPUT = 8192  # Наибольший блок на входе process() по умолчанию (сэмплов)
+
+
+class StreamingResampler:
+    """
+    Полифазный передискретизатор с рациональным коэффициентом up/down и состоянием между блоками.
+    :param in_rate: частота входа
+    :param out_rate: частота выхода
+    :param max_input: наибольший блок на входе; под него заранее выделяются рабочие массивы
+    """
+
+    def __init__(self, in_rate, out_rate=16000, taps_per_phase=TAPS_PER_PHASE, max_input=MAX_INPUT):
+        divisor = gcd(int(in_rate), int(out_rate))
+        self.up = int(out_rate) // divisor
+        self.down = int(in_rate) // divisor
+        self.passthrough = self.up == self.down
+        self.max_input = max_input
+        self._taps = taps_per_phase
+        if self.passthrough:
+            self._output = np.zeros(max_input, dtype=np.float64)
+            return
+
+        numtaps = taps_per_phase * self.up
+        cutoff = ROLLOFF / max(self.up, self.down)
+        h = firwin(numtaps, cutoff, window=("kaiser", KAISER_BETA)) * self.up
+        # banks[фаза] - отводы h[фаза + k * up] в обратном порядке, чтобы умножать на окно входа как есть
+        self._banks = h.reshape(taps_per_phase, self.up).T[:, ::-1].copy()
+        self._banks_by_tap = self._banks.T.copy()  # [отвод, фаза]
+        # Хвост предыдущего блока (taps - 1 сэмплов), за ним - новый блок
+        self._buffer = np.zeros(taps_per_phase - 1 + max_input, dtype=np.float64)
+        max_output = -(-max_input * self.up // self.down) + 1
+        self._output = np.zeros(max_output, dtype=np.float64)
+        # Рабочие массивы: позиции выходов, их окна входа и отводы фаз
+        self._steps = np.arange(max_output, dtype=np.int64) * self.down
+        self._positions = np.zeros(max_output, dtype=np.int64)
+        self._bases = np.zeros(max_output, dtype=np.int64)
+        self._phases = np.zeros(max_output, dtype=np.int64)
+        self._window = np.zeros(max_output, dtype=np.float64)  # Сэмплы входа под одним отводом
+        self._coefficients = np.zeros(max_output, dtype=np.float64)  # Коэффициенты этого отвода
+        self._position = 0  # Позиция следующего выходного сэмпла (в отсчётах up-частоты) от начала блока
+
+    def process(self, samples):
+        """
+        Передискретизирует очередной блок.
+        :param samples: одномерный массив сэмплов (любой числовой тип), не длиннее max_input
+        :return: массив float64 с выходными сэмплами (длина меняется от блока к блоку).
+                 Это представление внутреннего буфера: оно действительно до следующего вызова
+        """
+        size = len(samples)
+        if size > self.max_input:
+            raise ValueError(f"Блок {size} сэмплов длиннее max_input={self.max_input}")
+        if self.passthrough:
+            output = self._output[:size]
+            np.copyto(output, samples)
+            return output
+
+        history = self._taps - 1
+        np.copyto(self._buffer[history:history + size], samples)
+        count = -(-(size * self.up - self._position) // self.down)  # ceil
+        if count <= 0:
+            self._position -= size * self.up
+            self._shift_history(size)
+            return self._output[:0]
+
+        # Выход k: окно входа, оканчивающееся на сэмпле (position + k * down) // up, и фаза фильтра
+        output = self._output[:count]
+        positions, bases, phases = self._positions[:count], self._bases[:count], self._phases[:count]
+        window, coefficients = self._window[:count], self._coefficients[:count]
+        np.add(self._steps[:count], self._position, out=positions)
+        np.divmod(positions, self.up, out=(bases, phases))
+        # Свёртка по одному отводу за раз на одномерных непрерывных массивах: двумерные ufunc
+        # с broadcasting или по несмежным срезам выделяют буферы на каждый вызов.
+        # mode="clip": с mode="raise" take с out копирует весь исходный массив
+        output.fill(0.0)
+        for tap in range(self._taps):
+            np.take(self._buffer[tap:], bases, out=window, mode="clip")
+            np.take(self._banks_by_tap[tap], phases, out=coefficients, mode="clip")
+            np.multiply(window, coefficients, out=window)
+            np.add(output, window, out=output)
+
+        self._position += count * self.down - size * self.up
+        self._shift_history(size)
+        return output
+
+    def _shift_history(self, size):
+        """Последние taps - 1 сэмплов блока становятся хвостом для следующего"""
+        history = self._taps - 1
+        self._buffer[:history] = self._buffer[size:size + history]
+
+
+def downmix(indata, out=None):
+    """
+    Сведение каналов в моно (среднее), одномерный массив float64.
+    :param out: готовый массив длиной len(indata), чтобы не выделять новый
+    """
+    if out is None:
+        out = np.empty(len(indata), dtype=np.float64)
+    if indata.ndim == 1:
+        np.copyto(out, indata)
+    elif indata.shape[1] == 1:
+        np.copyto(out, indata[:, 0])
+    else:
+        # Сумма по столбцам вместо np.mean: mean с out выделяет буферы на каждый вызов
+        np.copyto(out, indata[:, 0])
+        for channel in range(1, indata.shape[1]):
+            np.add(out, indata[:, channel], out=out)
+        np.multiply(out, 1.0 / indata.shape[1], out=out)
+    return out
+
+
+class NativeFormatConverter:
+    """
+    Приводит сырые блоки устройства (родная частота, несколько каналов, int16 вперемешку)
+    к блокам по blocksize сэмплов 16 кГц моно. Работает в потоке декодирования.
+    :param max_frames: наибольший блок устройства в кадрах (под него выделяется raw)
+    """
+
+    def __init__(self, in_rate, channels, samplerate=16000, blocksize=512, max_frames=None):
+        self.in_rate = in_rate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.max_frames = max_frames or 2 * int(round(blocksize * in_rate / samplerate))
+        self.raw = np.zeros(self.max_frames * channels, dtype=np.int16)  # Сюда кольцевой буфер кладёт блок
+        self._samples = np.zeros(self.max_frames * channels, dtype=np.float64)  # raw в float64
+        self._mono = np.zeros(self.max_frames, dtype=np.float64)
+        self.resampler = StreamingResampler(in_rate, samplerate, max_input=self.max_frames)
+        self._pending = np.zeros(self.resampler._output.size + blocksize, dtype=np.float64)
+        self._pending_count = 0
+
+    def feed(self, samples):
+        """Принимает первые samples сэмплов raw (кадры всех каналов подряд)"""
+        frames = samples // self.channels
+        if not frames:
+            return
+        # Сначала непрерывное приведение к float64: сложение каналов int16 через шаг требует буфера
+        samples = self._samples[:frames * self.channels]
+        np.copyto(samples, self.raw[:frames * self.channels])
+        indata = samples.reshape(frames, self.channels)
+        output = self.resampler.process(downmix(indata, self._mono[:frames]))
+        end = self._pending_count + len(output)
+        self._pending[self._pending_count:end] = output
+        self._pending_count = end
+
+    def next_block(self, out):
+        """
+        Следующий готовый блок в out (int16 длиной blocksize).
+        :return: False, если на целый блок сэмплов ещё не хватает
+        """
+        if self._pending_count < self.blocksize:
+            return False
+        head = self._pending[:self.blocksize]
+        np.clip(head, -32768, 32767, out=head)
+        np.copyto(out, head, casting="unsafe")
+        self._pending_count -= self.blocksize
+        self._pending[:self._pending_count] = self._pending[self.blocksize:self.blocksize + self._pending_count]
+        return True
@@ -0,0 +1,80 @@
+"""
+Выбор между русским и английским результатом распознавания.
+
+Раньше побеждал любой непустой русский результат ("ru or en"), даже если это
+мусор, а правильный английский отбрасывался. Здесь каждая гипотеза получает оценку:
+средняя уверенность слов (Vosk отдаёт её при SetWords(True)) плюс доля слов,
+известных ассистенту (имена, команды, встроенные слова). Побеждает гипотеза
+с большей оценкой, а фраза с оценкой ниже порога не доходит до run_script.
+У N-best альтернатив (SetMaxAlternatives) уверенности слов нет, а их поле confidence -
+ненормированная оценка решётки, поэтому такая уверенность считается неизвестной.
+"""
+import json
+
+from logging_config import debug_logger
+
+MIN_WORD_LENGTH = 3  # Короткие слова ("и", "а") не учитываются в совпадении со словарём
+STEM_LENGTH = 4  # Слово считается известным, если совпадает начало (падежи, формы глаголов)
+UNKNOWN_CONFIDENCE = 0.5  # Уверенность гипотезы без данных о словах: ни доверия, ни недоверия
+
+
+def word_confidence(result_json):
+    """
+    Средняя уверенность слов результата Vosk.
+    :return: число от 0 до 1 или None, если в результате нет слов с уверенностью
+    """
+    if '"conf"' not in result_json:
+        return None
+    words = [item for item in json.loads(result_json).get("result", []) if item.get("word") != "[unk]"]
+    if not words:
+        return None
+    return sum(item.get("conf", 0.0) for item in words) / len(words)
+
+
+class ResultArbiter:
+    """
+    Оценка и выбор гипотез.
+    :param vocabulary: слова ассистента (например, из build_command_grammar)
+    :param threshold: минимальная оценка фразы (0 - ничего не отбрасывать)
+    :param confidence_weight: вес уверенности в оценке, остальное - совпадение со словарём
+    """
+
+    def __init__(self, vocabulary=(), threshold=0.0, confidence_weight=0.7):
+        self.threshold = threshold
+        self.confidence_weight = confidence_weight
+        self._stems = set()
+        self.dropped = 0
+        self.set_vocabulary(vocabulary)
+
+    def set_vocabulary(self, vocabulary):
+        self._stems = {word[:STEM_LENGTH] for word in vocabulary if len(word) >= MIN_WORD_LENGTH}
+
+    def score(self, text, confidence):
+        """Оценка гипотезы от 0 до 1"""
+        if not text:
+            return 0.0
+        words = [word for word in text.split() if len(word) >= MIN_WORD_LENGTH]
+        if confidence is None:
+            confidence = UNKNOWN_CONFIDENCE
+        overlap = sum(1 for word in words if word[:STEM_LENGTH] in self._stems) / len(words) if words else 0.0
+        return self.confidence_weight * confidence + (1 - self.confidence_weight) * overlap
+
+    def choose(self, ru_text, ru_confidence, en_text, en_confidence):
+        """
+        Выбирает лучшую гипотезу. При равных оценках побеждает русская.
+        :return: текст или "", если обе гипотезы пустые или ниже порога
+        """
+        if not ru_text and not en_text:
+            return ""
+
+        ru_score = self.score(ru_text, ru_confidence) if ru_text else -1.0
+        en_score = self.score(en_text, en_confidence) if en_text else -1.0
+        text, best = (ru_text, ru_score) if ru_score >= en_score else (en_text, en_score)
+
+        if best < self.threshold:
+            self.dropped += 1
+            debug_logger.debug(f"Фраза отброшена: '{text}' (оценка {best:.2f} < {self.threshold:.2f})")
+            return ""
+        if ru_text and en_text:
+            debug_logger.debug(f"Выбор языка: ru '{ru_text}' {ru_score:.2f}, en '{en_text}' {en_score:.2f}")
+        return text
@@ -1,18 +1,21 @@
 import json
 import os
-import sounddevice as sd
 import winshell
 from bin.signals import color_signal
 from bin.speak_functions import thread_react
+from bin.device_registry import device_registry
+from bin.stream_health import SETTINGS
+from bin.voice_activity import ENDPOINT_PRESETS, CUSTOM_PRESET, endpoint_values
 from bin.choose_color_window import ColorSettingsWindow
 from path_builder import get_path
 from logging_config import logger, debug_logger
-from PyQt5.QtCore import pyqtSignal, Qt
+from PyQt5.QtCore import pyqtSignal, Qt, QTimer
 from PyQt5.QtWidgets import QFileDialog, QPushButton, QCheckBox, QLineEdit, QLabel, QSlider, QComboBox, \
-    QVBoxLayout, QWidget, QHBoxLayout
+    QVBoxLayout, QWidget, QHBoxLayout, QSpinBox
 
 speakers = dict(Персик="persik", Джарвис="jarvis", Пласид='placide', Бестия='rogue',
                 Джонни='johnny', СанСаныч='sanych', Санбой='sanboy', Woman='tigress', Стейтем='stathem')
+ENDPOINT_SAVE_DELAY_MS = 700  # Свои значения конца фразы сохраняются, когда их перестали менять
 
 
 class InterfaceWidget(QWidget):
@@ -387,7 +390,21 @@ class SettingsWidget(QWidget):
             "start_win": True,
             "is_widget": True,
             "input_device_id": None,
-            "input_device_name": None
+            "input_device_name": None,
+            "vad_enabled": True,
+            "command_mode": False,
+            "wake_word_mode": False,
+            "partial_results": False,
+            "multiprocess_decode": False,
+            "confidence_threshold": 0.0,
+            "cascade_decoding": False,
+            "nbest_results": False,
+            "noise_floors": {},
+            "audio_preprocessing": False,
+            "native_capture": True,
+            "endpoint_preset": "standard",
+            "endpoint_custom": endpoint_values("standard"),
+            "fuzzy_commands": True
         }
 
         if os.path.exists(self.assistant.settings_file_path):
@@ -435,17 +452,20 @@ class SettingsWidget(QWidget):
         self.assistant.speaker = speakers[self.voice_combo.currentText()]
 
         self.assistant.save_settings()
+        self.assistant.rebuild_command_grammar()
         self.hide_method()
         self.assistant.show_notification_message(message="Настройки применены!")
 
 
 class OtherSettingsWidget(QWidget):
     """ Виджет с дополнительными настройками (перенёс сюда чекбоксы) """
+    devices_ready = pyqtSignal()  # Реестр устройств закончил фоновую проверку
 
     def __init__(self, assistant, parent=None):
         super().__init__(parent)
         self.assistant = assistant
         self.init_ui()
+        self.devices_ready.connect(self.get_devices)
         self.get_devices()
 
     def init_ui(self):
@@ -490,6 +510,147 @@ class OtherSettingsWidget(QWidget):
         self.widget_check.stateChanged.connect(self.toggle_widget)
         layout.addWidget(self.widget_check)
 
+        self.vad_check = QCheckBox("Не распознавать тишину (VAD)", self)
+        self.vad_check.setStyleSheet("background: transparent;")
+        self.vad_check.setToolTip("Распознаватели работают только когда звучит речь - меньше нагрузка на CPU")
+        self.vad_check.setChecked(self.assistant.vad_enabled)
+        self.vad_check.stateChanged.connect(self.toggle_vad)
+        layout.addWidget(self.vad_check)
+
+        self.command_mode_check = QCheckBox("Режим команд (распознавать только словарь команд)", self)
+        self.command_mode_check.setStyleSheet("background: transparent;")
+        self.command_mode_check.setToolTip("Быстрее и точнее для команд. Поиск (\"найди ...\") "
+                                           "распознаётся полным словарём")
+        self.command_mode_check.setChecked(self.assistant.command_mode)
+        self.command_mode_check.stateChanged.connect(self.toggle_command_mode)
+        layout.addWidget(self.command_mode_check)
+
+        self.wake_word_check = QCheckBox("Распознавать речь только после имени", self)
+        self.wake_word_check.setStyleSheet("background: transparent;")
+        self.wake_word_check.setToolTip("В ожидании слушается только имя ассистента, полное распознавание "
+                                        "включается на 30 секунд после него")
+        self.wake_word_check.setChecked(self.assistant.wake_word_mode)
+        self.wake_word_check.stateChanged.connect(self.toggle_wake_word_mode)
+        layout.addWidget(self.wake_word_check)
+
+        self.partial_results_check = QCheckBox("Выполнять команду, не дожидаясь конца фразы", self)
+        self.partial_results_check.setStyleSheet("background: transparent;")
+        self.partial_results_check.setToolTip("Команда с именем, действием и одной целью выполняется "
+                                              "по частичному результату распознавания")
+        self.partial_results_check.setChecked(self.assistant.partial_results)
+        self.partial_results_check.stateChanged.connect(self.toggle_partial_results)
+        layout.addWidget(self.partial_results_check)
+
+        self.multiprocess_decode_check = QCheckBox("Распознавать RU и EN в отдельных процессах", self)
+        self.multiprocess_decode_check.setStyleSheet("background: transparent;")
+        self.multiprocess_decode_check.setToolTip("Каждая модель работает в своём процессе на отдельном ядре. "
+                                                  "Поиск и выполнение по частичному результату "
+                                                  "в этом режиме отключены")
+        self.multiprocess_decode_check.setChecked(self.assistant.multiprocess_decode)
+        self.multiprocess_decode_check.stateChanged.connect(self.toggle_multiprocess_decode)
+        layout.addWidget(self.multiprocess_decode_check)
+
+        self.confidence_label = QLabel(self)
+        self.confidence_label.setStyleSheet("background: transparent;")
+        self.confidence_label.setToolTip("Фразы, распознанные с меньшей уверенностью, не выполняются. "
+                                         "0 - выполнять всё")
+        layout.addWidget(self.confidence_label)
+
+        self.confidence_slider = QSlider(Qt.Horizontal, self)
+        self.confidence_slider.setRange(0, 100)
+        self.confidence_slider.setValue(int(self.assistant.confidence_threshold * 100))
+        self.confidence_slider.valueChanged.connect(self.update_confidence_threshold)
+        self.confidence_slider.sliderReleased.connect(lambda: self.assistant.save_settings(notify=False))
+        layout.addWidget(self.confidence_slider)
+        self.update_confidence_threshold(self.confidence_slider.value())
+
+        self.cascade_decoding_check = QCheckBox("Английская модель только по необходимости", self)
+        self.cascade_decoding_check.setStyleSheet("background: transparent;")
+        self.cascade_decoding_check.setToolTip("Непрерывно работает только русская модель. Фраза перепроверяется "
+                                               "английской, если русский результат пустой или неуверенный, либо "
+                                               "ожидается английское название ярлыка. Английская модель выгружается "
+                                               "из памяти после 5 минут простоя (нужен перезапуск ассистента)")
+        self.cascade_decoding_check.setChecked(self.assistant.cascade_decoding)
+        self.cascade_decoding_check.stateChanged.connect(self.toggle_cascade_decoding)
+        layout.addWidget(self.cascade_decoding_check)
+
+        self.nbest_results_check = QCheckBox("Выбирать команду из нескольких вариантов распознавания", self)
+        self.nbest_results_check.setStyleSheet("background: transparent;")
+        self.nbest_results_check.setToolTip("Русская модель отдаёт до 5 вариантов фразы, и выполняется "
+                                            "лучший вариант с командой. Помогает, когда команда распознаётся "
+                                            "не первым вариантом (нужен перезапуск ассистента)")
+        self.nbest_results_check.setChecked(self.assistant.nbest_results)
+        self.nbest_results_check.stateChanged.connect(self.toggle_nbest_results)
+        layout.addWidget(self.nbest_results_check)
+
+        self.audio_preprocessing_check = QCheckBox("Фильтр шума микрофона", self)
+        self.audio_preprocessing_check.setStyleSheet("background: transparent;")
+        self.audio_preprocessing_check.setToolTip("Убирает постоянное смещение и низкочастотный гул "
+                                                  "(вентиляторы, сеть) и приглушает ровный фоновый шум "
+                                                  "перед распознаванием. Полезно для дешёвых USB-микрофонов "
+                                                  "(нужен перезапуск ассистента)")
+        self.audio_preprocessing_check.setChecked(self.assistant.audio_preprocessing)
+        self.audio_preprocessing_check.stateChanged.connect(self.toggle_audio_preprocessing)
+        layout.addWidget(self.audio_preprocessing_check)
+
+        self.native_capture_check = QCheckBox("Захват в родном формате микрофона", self)
+        self.native_capture_check.setStyleSheet("background: transparent;")
+        self.native_capture_check.setToolTip("Микрофон открывается с его собственной частотой и числом каналов, "
+                                             "а приведение к 16 кГц моно делает ассистент. Так открываются "
+                                             "микрофоны, которые не поддерживают 16 кГц")
+        self.native_capture_check.setChecked(self.assistant.native_capture)
+        self.native_capture_check.stateChanged.connect(self.toggle_native_capture)
+        layout.addWidget(self.native_capture_check)
+
+        # Конец фразы: пресеты и свои значения
+        endpoint_label = QLabel("Конец фразы:", self)
+        endpoint_label.setStyleSheet("background: transparent;")
+        endpoint_label.setToolTip("Сколько тишины ждать до выполнения команды, когда закрывать слишком "
+                                  "длинную фразу и когда сбрасывать распознаватели после простоя")
+        self.endpoint_combo = QComboBox(self)
+        for preset, values in ENDPOINT_PRESETS.items():
+            self.endpoint_combo.addItem(values["title"], preset)
+        self.endpoint_combo.addItem("Свои значения", CUSTOM_PRESET)
+        index = self.endpoint_combo.findData(self.assistant.endpoint_preset)
+        self.endpoint_combo.setCurrentIndex(max(0, index))
+        self.endpoint_combo.currentIndexChanged.connect(self.change_endpoint_preset)
+        endpoint_layout = QHBoxLayout()
+        endpoint_layout.addWidget(endpoint_label)
+        endpoint_layout.addWidget(self.endpoint_combo)
+        layout.addLayout(endpoint_layout)
+
+        # Поля для своих значений: тишина (мс), максимум фразы (с), сброс после простоя (с)
+        self.endpoint_spins = {}
+        self.endpoint_save_timer = QTimer(self)
+        self.endpoint_save_timer.setSingleShot(True)
+        self.endpoint_save_timer.setInterval(ENDPOINT_SAVE_DELAY_MS)
+        self.endpoint_save_timer.timeout.connect(lambda: self.assistant.save_settings(notify=False))
+        custom_layout = QHBoxLayout()
+        for key, title, maximum, step in (("silence_ms", "Тишина, мс", 3000, 10),
+                                          ("max_utterance_s", "Макс. фраза, с", 120, 1),
+                                          ("idle_reset_s", "Сброс, с", 3600, 10)):
+            spin = QSpinBox(self)
+            spin.setRange(0, maximum)
+            spin.setSingleStep(step)
+            spin.setPrefix(f"{title}: ")
+            spin.setToolTip("0 - выключено")
+            spin.setValue(int(endpoint_values(CUSTOM_PRESET, self.assistant.endpoint_custom)[key]))
+            spin.valueChanged.connect(self.change_endpoint_custom)
+            spin.editingFinished.connect(self.save_endpoint_custom)
+            custom_layout.addWidget(spin)
+            self.endpoint_spins[key] = spin
+        layout.addLayout(custom_layout)
+        self.update_endpoint_spins()
+
+        self.fuzzy_commands_check = QCheckBox("Нечёткий поиск команд", self)
+        self.fuzzy_commands_check.setStyleSheet("background: transparent;")
+        self.fuzzy_commands_check.setToolTip("Если цель команды распознана с ошибкой (\"открой хрон\"), "
+                                             "выполняется похожая команда из списка, а при сомнении "
+                                             "она предлагается: достаточно ответить \"да\"")
+        self.fuzzy_commands_check.setChecked(self.assistant.fuzzy_commands)
+        self.fuzzy_commands_check.stateChanged.connect(self.toggle_fuzzy_commands)
+        layout.addWidget(self.fuzzy_commands_check)
+
         self.get_widget_btn = QPushButton("Открыть виджет", self)
         self.get_widget_btn.clicked.connect(self.get_widget)
         layout.addWidget(self.get_widget_btn)
@@ -526,6 +687,105 @@ class OtherSettingsWidget(QWidget):
         self.assistant.is_widget = self.widget_check.isChecked()
         self.assistant.save_settings()
 
+    def toggle_vad(self):
+        """Обработка чекбокса 'Не распознавать тишину' (нужен перезапуск ассистента)"""
+        self.assistant.vad_enabled = self.vad_check.isChecked()
+        self.save_and_restart()
+
+    def toggle_command_mode(self):
+        """Обработка чекбокса 'Режим команд' (нужен перезапуск ассистента)"""
+        self.assistant.command_mode = self.command_mode_check.isChecked()
+        self.save_and_restart()
+
+    def toggle_wake_word_mode(self):
+        """Обработка чекбокса 'Распознавать речь только после имени' (нужен перезапуск ассистента)"""
+        self.assistant.wake_word_mode = self.wake_word_check.isChecked()
+        self.save_and_restart()
+
+    def toggle_partial_results(self):
+        """Обработка чекбокса 'Выполнять команду, не дожидаясь конца фразы' (нужен перезапуск)"""
+        self.assistant.partial_results = self.partial_results_check.isChecked()
+        self.save_and_restart()
+
+    def toggle_multiprocess_decode(self):
+        """Обработка чекбокса 'Распознавать RU и EN в отдельных процессах' (нужен перезапуск)"""
+        self.assistant.multiprocess_decode = self.multiprocess_decode_check.isChecked()
+        self.save_and_restart()
+
+    def update_confidence_threshold(self, value):
+        """Порог уверенности применяется сразу, без перезапуска ассистента"""
+        self.assistant.confidence_threshold = value / 100.0
+        self.assistant.result_arbiter.threshold = self.assistant.confidence_threshold
+        self.confidence_label.setText(f"Порог уверенности распознавания: {value}%")
+
+    def toggle_cascade_decoding(self):
+        """Обработка чекбокса 'Английская модель только по необходимости' (нужен перезапуск)"""
+        self.assistant.cascade_decoding = self.cascade_decoding_check.isChecked()
+        self.save_and_restart()
+
+    def toggle_nbest_results(self):
+        """Обработка чекбокса 'Выбирать команду из нескольких вариантов распознавания' (нужен перезапуск)"""
+        self.assistant.nbest_results = self.nbest_results_check.isChecked()
+        self.save_and_restart()
+
+    def toggle_audio_preprocessing(self):
+        """Обработка чекбокса 'Фильтр шума микрофона' (нужен перезапуск)"""
+        self.assistant.audio_preprocessing = self.audio_preprocessing_check.isChecked()
+        self.save_and_restart()
+
+    def change_endpoint_preset(self):
+        """Выбор пресета конца фразы (применяется сразу)"""
+        self.assistant.endpoint_preset = self.endpoint_combo.currentData()
+        self.update_endpoint_spins()
+        self.assistant.apply_endpointing()
+        self.endpoint_save_timer.stop()
+        self.assistant.save_settings(notify=False)
+
+    def change_endpoint_custom(self):
+        """Свои значения конца фразы (применяются сразу, сохраняются после паузы в изменениях)"""
+        if self.assistant.endpoint_preset != CUSTOM_PRESET:
+            return
+        self.assistant.endpoint_custom = {key: spin.value() for key, spin in self.endpoint_spins.items()}
+        self.assistant.apply_endpointing()
+        self.endpoint_save_timer.start()
+
+    def save_endpoint_custom(self):
+        """Ввод в поле закончен - сохранить, не дожидаясь паузы"""
+        if self.endpoint_save_timer.isActive():
+            self.endpoint_save_timer.stop()
+            self.assistant.save_settings(notify=False)
+
+    def update_endpoint_spins(self):
+        """Поля показывают значения выбранного пресета и редактируются только для своих значений"""
+        custom = self.assistant.endpoint_preset == CUSTOM_PRESET
+        values = endpoint_values(self.assistant.endpoint_preset, self.assistant.endpoint_custom)
+        for key, spin in self.endpoint_spins.items():
+            spin.blockSignals(True)
+            spin.setValue(int(values[key]))
+            spin.blockSignals(False)
+            spin.setEnabled(custom)
+
+    def toggle_native_capture(self):
+        """Обработка чекбокса 'Захват в родном формате микрофона' (переоткрывается только поток)"""
+        self.assistant.native_capture = self.native_capture_check.isChecked()
+        self.assistant.save_settings(notify=False)
+        self.reopen_stream()
+
+    def toggle_fuzzy_commands(self):
+        """Обработка чекбокса 'Нечёткий поиск команд'"""
+        self.assistant.fuzzy_commands = self.fuzzy_commands_check.isChecked()
+        self.assistant.save_settings(notify=False)
+
+    def save_and_restart(self):
+        """Сохраняет настройку без уведомления и перезапускает ассистента: конвейер распознавания собирается заново"""
+        self.assistant.save_settings(notify=False)
+        self.assistant.save_settings_signal.emit()
+
+    def reopen_stream(self):
+        """Переоткрывает только поток микрофона - модели и конвейер распознавания остаются"""
+        if self.assistant.audio_pipeline is not None:
+            self.assistant.restart_audio_stream(SETTINGS)
+
     def get_widget(self):
         self.assistant.open_widget()
 
@@ -595,6 +855,11 @@ class OtherSettingsWidget(QWidget):
 
     def get_devices(self):
         self.device_list.clear()
+        if not device_registry.ready:
+            # Проверка микрофонов ещё идёт в фоне - список заполнится по сигналу, окно не ждёт
+            self.device_list.addItem("Поиск микрофонов...")
+            device_registry.probe_async().add_done_callback(lambda future: self.devices_ready.emit())
+            return
 
         try:
             devices = self.get_input_devices()
@@ -612,56 +877,9 @@ class OtherSettingsWidget(QWidget):
             debug_logger.error(f"Ошибка при получении данных аудиоустройств: {str(e)}")
 
     def get_input_devices(self):
-        devices = sd.query_devices()
-        active_mics = []
-        seen_names = set()  # Для борьбы с дублями
+        """Рабочие микрофоны (имя, индекс) из кэша реестра устройств"""
         try:
-            for device in devices:
-                try:
-                    if device.get('max_input_channels', 0) == 0:
-                        continue  # Только вход
-
-                    name = device.get('name', '').strip()
-                    idx = device['index']
-
-                    # --- Фильтр: исключаем системные/виртуальные ---
-                    if any(keyword in name.lower() for keyword in [
-                        'mapper', 'primary', 'wave', 'звуковой маршрутизатор',
-                        'драйвер записи', 'default', 'аналоговый'
-                    ]):
-                        continue
-
-                    # Получаем тип API
-                    host_api_name = sd.query_hostapis(device['hostapi'])['name']
-                    if host_api_name.lower() in ['mm', 'mme', 'directsound']:
-                        # Пропускаем MME и DirectSound, если есть WASAPI аналог
-                        # Но можно временно добавить для теста с пометкой
-                        continue  # ← лучше использовать только WASAPI
-
-                    # Упрощаем имя для сравнения (убираем цифры в скобках и т.п.)
-                    clean_name = name.split('(')[0].strip()
-
-                    # Избегаем дублей по базовому имени
-                    if clean_name in seen_names:
-                        continue
-                    seen_names.add(clean_name)
-
-                    # Проверяем, можно ли открыть поток
-                    try:
-                        with sd.InputStream(
-                                device=idx,
-                                channels=1,
-                                samplerate=44100,
-                                blocksize=1024
-                        ):
-                            active_mics.append((name, idx))
-                    except Exception:
-                        continue  # Не удалось открыть
-
-                except Exception:
-                    continue
-
-            return active_mics
+            return device_registry.settings_list()
         except Exception as e:
             debug_logger.error(f"Ошибка в проверке активных микрофонов: {str(e)}")
 
@@ -669,8 +887,7 @@ class OtherSettingsWidget(QWidget):
         device_id = self.device_list.currentData()  # int или None
         if device_id is not None:
             # Получаем имя устройства по ID
-            device_info = sd.query_devices(device_id)
-            device_name = device_info['name']
+            device_name = device_registry.name_of(device_id)
 
             # Сохраняем и ID, и имя
             self.assistant.input_device_id = device_id
@@ -0,0 +1,184 @@
+"""
+Поиск ярлыков с латинскими названиями по русской речи.
+
+Ярлыки в "links for assist" называются по-английски ("Google Chrome.lnk", "Discord.lnk"),
+а русская модель слышит "хром", "дискорд", "стим". Раньше для каждого ярлыка приходилось
+вручную заводить русскую команду в AppCommandForm. Здесь название каждого ярлыка заранее
+переводится в русское написание (практическая транскрипция: "chrome" -> "кром") и в
+фонетический ключ, в котором совпадают звуки, которые модель и транскрипция путают
+(к/г/х, безударные о/а, е/и, звонкие/глухие). Ключи лежат в FuzzyCommandIndex, и фраза
+ищется по тем же ключам: "хром" и "кром" дают один ключ, а небольшие расхождения
+добирает расстояние Левенштейна. Команды из commands.json по-прежнему важнее.
+"""
+import os
+import re
+
+from bin.fuzzy_commands import FuzzyCommandIndex, ACT_SCORE
+from logging_config import debug_logger
+
+SHORTCUT_EXTENSIONS = (".lnk", ".url")
+
+# Слова названий, которые не отличают одну программу от другой ("Google Chrome" - это "хром", а не "гугл")
+GENERIC_WORDS = {
+    "google", "microsoft", "yandex", "adobe", "mozilla", "jetbrains", "apple", "valve", "epic",
+    "app", "application", "launcher", "desktop", "client", "studio", "edition", "games", "game",
+    "online", "shortcut", "setup", "beta", "portable", "the", "for", "and", "ярлык",
+}
+
+# Сочетания букв проверяются раньше одиночных, длинные - раньше коротких
+LETTER_GROUPS = [
+    ("tion", "шн"), ("sch", "ш"), ("tch", "ч"), ("chr", "кр"), ("ght", "т"),
+    ("ch", "ч"), ("sh", "ш"), ("zh", "ж"), ("th", "т"), ("ph", "ф"), ("ck", "к"), ("qu", "кв"),
+    ("kh", "х"), ("gh", "г"), ("wh", "в"), ("ee", "и"), ("ea", "и"), ("oo", "у"), ("ou", "ау"),
+    ("ow", "оу"), ("ai", "ей"), ("ay", "ей"), ("ey", "ей"), ("oy", "ой"), ("oi", "ой"), ("au", "о"),
+]
+LETTERS = {
+    "a": "а", "b": "б", "c": "к", "d": "д", "e": "е", "f": "ф", "g": "г", "h": "х", "i": "и",
+    "j": "дж", "k": "к", "l": "л", "m": "м", "n": "н", "o": "о", "p": "п", "q": "к", "r": "р",
+    "s": "с", "t": "т", "u": "у", "v": "в", "w": "в", "x": "кс", "y": "и", "z": "з",
+}
+VOWELS = set("aeiouy")
+
+# Фонетический ключ: буквы, которые модель и транскрипция путают, сводятся к одной
+PHONETIC_LETTERS = str.maketrans({
+    "о": "а", "я": "а", "ы": "и", "е": "и", "ё": "и", "э": "и", "й": "и", "ю": "у",
+    "г": "к", "х": "к", "б": "п", "в": "ф", "д": "т", "з": "с", "ц": "с", "ж": "ш", "щ": "ш",
+    "ь": None, "ъ": None,
+})
+
+
+def list_shortcuts(folder):
+    """Имена файлов ярлыков в папке (пустой список, если папки нет)"""
+    try:
+        return sorted(name for name in os.listdir(folder) if name.lower().endswith(SHORTCUT_EXTENSIONS))
+    except OSError:
+        return []
+
+
+def _before_silent_e(word, position):
+    """За гласной одна согласная и немая e (в конце слова или перед согласной): "minecraft", "firefox" """
+    consonant, vowel, after = word[position + 1:position + 2], word[position + 2:position + 3], word[position + 3:]
+    return (bool(consonant) and consonant not in VOWELS and vowel == "e"
+            and (not after or len(after) > 1 and after[0] not in VOWELS))
+
+
+def _transliterate_word(word):
+    """Английское слово русскими буквами, как его произносят: "steam" -> "стим", "code" -> "код" """
+    # Немая конечная e: "chrome", "code", "adobe"
+    if len(word) > 3 and word.endswith("e") and word[-2] not in VOWELS and word[-3] not in "iy":
+        word = word[:-1]
+    result = []
+    position = 0
+    while position < len(word):
+        for group, sound in LETTER_GROUPS:
+            if word.startswith(group, position):
+                result.append(sound)
+                position += len(group)
+                break
+        else:
+            char = word[position]
+            following = word[position + 1:position + 2]
+            if char == "c" and following in ("e", "i", "y"):
+                result.append("с")
+            elif char in "iy" and _before_silent_e(word, position):
+                result.append("ай")  # "mine", "fire", "skype": немая e делает i долгой
+            elif char == "y" and (position == 0 or following in VOWELS):
+                result.append("й")
+            elif char == "e" and position == 0:
+                result.append("э")
+            elif char == "e" and position > 1 and word[position - 2] in "iy" and _before_silent_e(word, position - 2):
+                pass
+            elif following == char:
+                pass  # Двойная согласная читается как одна
+            else:
+                result.append(LETTERS.get(char, char))
+            position += 1
+    return "".join(result)
+
+
+def transliterate(name):
+    """
+    Название ярлыка русскими буквами: "Google Chrome" -> "гугл кром".
+    Кириллица и цифры остаются как есть, остальные символы - разделители слов.
+    """
+    words = re.findall(r"[a-zа-яё0-9]+", name.lower())
+    return " ".join(_transliterate_word(word) if re.search(r"[a-z]", word) else word for word in words)
+
+
+def phonetic_key(text):
+    """Фонетический ключ русского текста: "хром" и "кром" -> "крам" """
+    words = []
+    for word in text.lower().translate(PHONETIC_LETTERS).split():
+        # Повторы звуков схлопываются: "телеграмм" и "телеграм" дают один ключ
+        words.append("".join(char for i, char in enumerate(word) if i == 0 or char != word[i - 1]))
+    return " ".join(words)
+
+
+def spoken_aliases(filename):
+    """
+    Как может звучать ярлык: всё название, оно же слитно ("VS Code" -> "вскод")
+    и каждое отличительное слово ("Google Chrome" -> "кром").
+    :return: список написаний русскими буквами
+    """
+    name = os.path.splitext(filename)[0]
+    latin_words = [word for word in re.findall(r"[a-zа-яё0-9]+", name.lower()) if not word.isdigit()]
+    spoken_words = [transliterate(word) for word in latin_words]
+    aliases = [" ".join(spoken_words)]
+    if len(spoken_words) > 1:
+        aliases.append("".join(spoken_words))
+        aliases.extend(spoken for word, spoken in zip(latin_words, spoken_words) if word not in GENERIC_WORDS)
+    return [alias for alias in dict.fromkeys(aliases) if alias]
+
+
+class ShortcutIndex:
+    """
+    Фонетический индекс ярлыков "links for assist".
+    :param filenames: имена файлов ярлыков
+    """
+
+    def __init__(self, filenames=()):
+        # Индекс и ключи меняются одной ссылкой: поиск идёт и из потока распознавания (каскад EN)
+        self._state = (FuzzyCommandIndex(), {})
+        self.spoken_words = []  # Русские написания названий - для грамматики режима команд
+        self.rebuild(filenames)
+
+    def rebuild(self, filenames):
+        targets = {}  # фонетический ключ -> имя файла ярлыка
+        owners = {}  # ключ слова или слитного названия -> ярлыки, в которых он встречается
+        spoken_words = set()
+        for filename in filenames:
+            aliases = spoken_aliases(filename)
+            if not aliases:
+                continue
+            spoken_words.update(aliases[0].split())
+            targets.setdefault(phonetic_key(aliases[0]), filename)
+            for alias in aliases[1:]:
+                owners.setdefault(phonetic_key(alias), set()).add(filename)
+        for key, files in owners.items():
+            # Полное название важнее слова другого ярлыка, а слово из нескольких ярлыков
+            # ("Steam" и "Steam VR" -> "стим") не выбирает ни один из них
+            if key not in targets and len(files) == 1:
+                targets[key] = next(iter(files))
+        self._state = (FuzzyCommandIndex(targets), targets)
+        self.spoken_words = sorted(spoken_words)
+        debug_logger.info(f"Индекс ярлыков: {len(filenames)} ярлыков, {len(targets)} написаний")
+
+    def resolve(self, text, skip=()):
+        """
+        Ярлык, который назван во фразе.
+        :param skip: слова фразы, которые не могут быть названием (имя ассистента, слово-действие)
+        :return: (имя файла ярлыка, оценка от 0 до 1) или (None, 0.0), если уверенного совпадения нет
+        """
+        index, targets = self._state
+        words = [word for word in text.lower().split() if not any(word.startswith(stem) for stem in skip)]
+        keyed = phonetic_key(" ".join(words)).split()
+        # Точное совпадение ключа (в том числе коротких, которые нечёткий индекс не хранит: "зум")
+        for count in (3, 2, 1):
+            for start in range(len(keyed) - count + 1):
+                filename = targets.get(" ".join(keyed[start:start + count]))
+                if filename is not None:
+                    return filename, 1.0
+        key, score = index.resolve(" ".join(keyed))
+        if key is None or score < ACT_SCORE:
+            return None, 0.0
+        return targets[key], score
@@ -3,6 +3,7 @@ import os
 import random
 import threading
 
+from bin.latency_metrics import latency_tracker
 from logging_config import logger, debug_logger
 from path_builder import get_path
 
@@ -25,11 +26,13 @@ def load_volume_assist():
         debug_logger.error(f"Файл настроек {settings_file_path} не найден.")
     return 0.2
 
-def react(folder_path):
+def react(folder_path, reply_token=None):
     """
     Воспроизводит случайный аудиофайл из указанной папки.
     :param folder_path: Путь к папке с аудиофайлами.
+    :param reply_token: номер фразы, на команду которой это ответ (latency_tracker.answering)
     """
+    reply_token = reply_token or latency_tracker.reply_token()
     volume_reduction_factor = load_volume_assist()  # Загружаем из файла настроек значение громкости
     try:
         # Получение списка файлов в папке
@@ -51,6 +54,8 @@ def react(folder_path):
         pygame.mixer.music.load(random_audio_file)
         pygame.mixer.music.set_volume(volume_reduction_factor)  # Установка громкости
         pygame.mixer.music.play()
+        if reply_token is not None:
+            latency_tracker.mark_reply(reply_token)  # Первый сэмпл ответа ушёл в микшер
 
         # Ожидание завершения воспроизведения
         while pygame.mixer.music.get_busy():
@@ -61,11 +66,13 @@ def react(folder_path):
         debug_logger.error(f"Ошибка при воспроизведении аудио: {e}")
 
 
-def react_detail(file_path):
+def react_detail(file_path, reply_token=None):
     """
     Воспроизводит указанный аудиофайл.
     :param file_path: Путь к аудиофайлу.
+    :param reply_token: номер фразы, на команду которой это ответ (latency_tracker.answering)
     """
+    reply_token = reply_token or latency_tracker.reply_token()
     volume_reduction_factor = load_volume_assist()  # Загружаем из файла настроек значение громкости
     try:
         file_name = os.path.basename(file_path)[:-4]
@@ -80,6 +87,8 @@ def react_detail(file_path):
         pygame.mixer.music.load(file_path)
         pygame.mixer.music.set_volume(volume_reduction_factor)  # Установка громкости
         pygame.mixer.music.play()
+        if reply_token is not None:
+            latency_tracker.mark_reply(reply_token)  # Первый сэмпл ответа ушёл в микшер
 
         # Ожидание завершения воспроизведения
         while pygame.mixer.music.get_busy():
@@ -94,7 +103,8 @@ def thread_react(folder_path):
     Запускает функцию react в отдельном потоке.
     :param folder_path: Путь к папке с аудиофайлами.
     """
-    thread = threading.Thread(target=react, args=(folder_path,), daemon=True)
+    # Номер фразы берётся в потоке, который вызвал реакцию: в новом потоке его нет
+    thread = threading.Thread(target=react, args=(folder_path, latency_tracker.reply_token()), daemon=True)
     thread.start()
 
 def thread_react_detail(file_path):
@@ -102,5 +112,5 @@ def thread_react_detail(file_path):
     Запускает функцию react в отдельном потоке.
     :param file_path: Путь к папке с аудиофайлами.
     """
-    thread = threading.Thread(target=react_detail, args=(file_path,), daemon=True)
+    thread = threading.Thread(target=react_detail, args=(file_path, latency_tracker.reply_token()), daemon=True)
     thread.start()
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+Контроль исправности аудиопотока.
+
+Раньше поток считался сломанным после 10 секунд тишины и перезапускался на устройстве
+по умолчанию: в тихой комнате это происходило постоянно, а выбранный микрофон терялся.
+Здесь исправность определяется не по громкости, а по самому потоку: приходят ли
+callback'и (пульс), не сыплются ли переполнения PortAudio. Если поток сломан, открывается
+предпочтительный микрофон, а если он не открывается - устройство по умолчанию. Пока
+работает запасное устройство, предпочтительный микрофон периодически пробно открывается
+в фоне (DeviceRegistry.check_async), а запасной поток при этом работает дальше: он
+перезапускается, только когда микрофон действительно вернулся.
+Микрофона, которого не было при запуске, нет и в списке PortAudio. Когда система сообщает
+об изменении устройств (devices_changed), а предпочтительного микрофона в списке нет,
+запасной поток закрывается один раз, и список устройств перечитывается перед открытием.
+"""
+import time
+
+from logging_config import debug_logger
+
+HEARTBEAT_TIMEOUT = 2.0  # Без callback'ов столько секунд - поток завис (обычно блок приходит раз в 32 мс)
+OVERFLOW_LIMIT = 50  # Столько новых переполнений PortAudio между проверками - поток нездоров
+RESCAN_SECONDS = 15.0  # Как часто проверять предпочтительный микрофон, пока работает запасное устройство
+RETRY_SECONDS = 10.0  # Пауза после неудачного перезапуска
+
+# Причины перезапуска
+STALLED = "stalled"
+INACTIVE = "inactive"
+OVERFLOWING = "overflowing"
+RESCAN = "rescan"
+REENUMERATE = "reenumerate"  # Список устройств изменился, а предпочтительного микрофона в нём нет
+SETTINGS = "settings"  # Изменён формат захвата в настройках
+
+
+class StreamHealthMonitor:
+    """
+    Следит за потоком захвата и переоткрывает его на нужном устройстве.
+    :param registry: DeviceRegistry, через который ищутся устройства
+    """
+
+    def __init__(self, registry, heartbeat_timeout=HEARTBEAT_TIMEOUT, overflow_limit=OVERFLOW_LIMIT,
+                 rescan_seconds=RESCAN_SECONDS, retry_seconds=RETRY_SECONDS):
+        self.registry = registry
+        self.heartbeat_timeout = heartbeat_timeout
+        self.overflow_limit = overflow_limit
+        self.rescan_seconds = rescan_seconds
+        self.retry_seconds = retry_seconds
+        self.preferred_name = None  # Микрофон, выбранный пользователем (None - лучший доступный)
+        self.device_name = None  # Устройство, которое открыто сейчас
+        self.fallback = False  # Открыто не предпочтительное устройство
+        self.restarts = 0
+        self._opened_at = None
+        self._overflows = 0
+        self._retry_at = 0.0
+        self._rescan_at = 0.0  # Когда снова проверить предпочтительный микрофон
+        self._rescan_future = None  # Фоновая проверка предпочтительного микрофона
+        self._devices_changed = False  # Система сообщила об изменении списка устройств
+
+    def stream_opened(self, preferred_name, device_name, pipeline=None, now=None):
+        """Запоминает, какое устройство открыто, и начинает отсчёт пульса заново"""
+        now = time.monotonic() if now is None else now
+        changed = (preferred_name, device_name) != (self.preferred_name, self.device_name)
+        self.preferred_name = preferred_name
+        self.device_name = device_name
+        self.fallback = bool(preferred_name) and preferred_name.lower() not in (device_name or "").lower()
+        self._opened_at = now
+        self._overflows = pipeline.input_overflows if pipeline is not None else 0
+        self._retry_at = 0.0
+        self._rescan_at = now + self.rescan_seconds
+        self._rescan_future = None
+        if self.fallback and changed:
+            debug_logger.warning(f"Микрофон '{preferred_name}' недоступен, работает запасное устройство "
+                                 f"'{device_name}'")
+
+    def check(self, pipeline, stream, now=None):
+        """
+        Проверка потока (вызывается по таймеру).
+        :return: причина перезапуска или None, если поток исправен
+        """
+        now = time.monotonic() if now is None else now
+        if now < self._retry_at:
+            return None
+        if stream is None or not stream.active:
+            return INACTIVE
+
+        heartbeat = self._opened_at or now
+        if pipeline is not None and pipeline.last_callback_time is not None:
+            heartbeat = max(heartbeat, pipeline.last_callback_time)
+        if now - heartbeat > self.heartbeat_timeout:
+            return STALLED
+
+        if pipeline is not None:
+            overflows = pipeline.input_overflows - self._overflows
+            self._overflows = pipeline.input_overflows
+            if overflows >= self.overflow_limit:
+                return OVERFLOWING
+
+        if self.fallback:
+            return self._check_preferred(now)
+        return None
+
+    def devices_changed(self):
+        """Система сообщила, что устройства подключили или отключили (WM_DEVICECHANGE)"""
+        self._devices_changed = True
+        self._rescan_at = 0.0  # Известный, но отключённый микрофон проверяется сразу
+
+    def _check_preferred(self, now):
+        """Запускает фоновую проверку предпочтительного микрофона и забирает её результат"""
+        if self._devices_changed and self._rescan_future is None:
+            self._devices_changed = False
+            if not self.registry.knows(self.preferred_name):
+                return REENUMERATE
+        future = self._rescan_future
+        if future is None:
+            if now >= self._rescan_at:
+                self._rescan_future = self.registry.check_async(self.preferred_name)
+            return None
+        if not future.done():
+            return None
+        self._rescan_future = None
+        self._rescan_at = now + self.rescan_seconds
+        try:
+            returned = future.result()
+        except Exception as e:
+            debug_logger.error(f"Не удалось проверить микрофон '{self.preferred_name}': {e}")
+            return None
+        return RESCAN if returned else None
+
+    def reopen(self, open_stream, preferred_name, pipeline=None, reason=None):
+        """
+        Открывает предпочтительный микрофон или устройство по умолчанию.
+        Старый поток должен быть уже закрыт.
+        :param open_stream: функция (ID устройства или None) -> поток, ещё не запущенный
+        :param reason: причина из check; при REENUMERATE список устройств перечитывается
+        :return: (поток, ID устройства, имя устройства)
+        """
+        self.restarts += 1
+        self._retry_at = time.monotonic() + self.retry_seconds  # Сбрасывается, если поток откроется
+        if reason == REENUMERATE:
+            self.registry.probe(reinitialize=True)
+        candidates = []
+        target_id = self.registry.find(preferred_name)
+        if target_id is not None:
+            candidates.append(target_id)
+        default_id = self.registry.default_input()
+        if default_id not in candidates:
+            candidates.append(default_id)
+
+        error = None
+        for device_id in candidates:
+            try:
+                stream = open_stream(device_id)
+                stream.start()
+            except Exception as e:
+                debug_logger.error(f"Не удалось открыть устройство (ID={device_id}): {e}")
+                error = e
+                continue
+            device_name = self.registry.name_of(device_id) if device_id is not None else None
+            self.stream_opened(preferred_name, device_name, pipeline)
+            return stream, device_id, device_name
+
+        raise error or RuntimeError("Нет доступных входных устройств")
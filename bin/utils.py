@@ -18,6 +18,7 @@ from urllib.parse import urlparse
 import psutil
 import pygetwindow as gw
 from win32com.client import Dispatch
+from bin.latency_metrics import latency_tracker
 from bin.lists import get_audio_paths
 from logging_config import logger, debug_logger
 from bin.speak_functions import thread_react, thread_react_detail
@@ -323,6 +324,7 @@ def handler_links(filename, action):
     Обработчик ярлыков в зависимости от их расширения
     """
     global game_id, target_path, process_name, game_id_or_url, args_list, workdir
+    latency_tracker.mark("handler_start")
     root_folder = get_path('user_settings', "links for assist")
     # Получаем путь к ярлыку
     shortcut_path = os.path.join(root_folder, filename)
@@ -594,6 +596,7 @@ def open_link(filename, target_path, arguments, workdir):
     settings_file = get_path('user_settings', "settings.json")
     speaker = get_current_speaker(settings_file)
     audio_paths = get_audio_paths(speaker)
+    latency_tracker.mark("handler_start")
 
     try:
         # Проверки файла
@@ -625,6 +628,7 @@ def open_link(filename, target_path, arguments, workdir):
             env=os.environ,
             shell=False
         )
+        latency_tracker.mark("handler_end")
 
         # Логирование в фоне
         threading.Thread(
@@ -0,0 +1,120 @@
+"""
+Детектор речи (VAD) по энергии блока.
+
+Пока вокруг тишина, блоки не попадают в распознаватели Kaldi - поток декодирования
+только считает громкость. Несколько последних тихих блоков хранятся в pre-roll,
+чтобы при начале речи не обрезать первый слог имени ассистента.
+"""
+import numpy as np
+
+# События детектора
+VAD_SILENCE = 0  # Тишина, блок не нужно распознавать
+VAD_START = 1  # Началась речь: сначала скормить pre-roll, потом сам блок
+VAD_SPEECH = 2  # Речь (или "хвост" после неё) продолжается
+VAD_END = 3  # Речь закончилась: блок скормить и сбросить распознаватели через FinalResult
+
+# Пресеты конца фразы (endpointing):
+# silence_ms - сколько тишины ждать до FinalResult, max_utterance_s - принудительный FinalResult
+# для слишком длинной фразы, idle_reset_s - Reset распознавателей после долгого простоя (0 - выключено)
+ENDPOINT_PRESETS = {
+    "standard": {"title": "Стандарт", "silence_ms": 480, "max_utterance_s": 0, "idle_reset_s": 0},
+    "command": {"title": "Короткие команды", "silence_ms": 250, "max_utterance_s": 6, "idle_reset_s": 60},
+    "dictation": {"title": "Диктовка", "silence_ms": 900, "max_utterance_s": 30, "idle_reset_s": 300},
+}
+CUSTOM_PRESET = "custom"
+ENDPOINT_KEYS = ("silence_ms", "max_utterance_s", "idle_reset_s")
+
+
+def endpoint_values(preset, custom=None):
+    """
+    Параметры конца фразы для пресета.
+    :param custom: свои значения (для CUSTOM_PRESET), недостающие берутся из "standard"
+    :return: словарь silence_ms, max_utterance_s, idle_reset_s
+    """
+    standard = ENDPOINT_PRESETS["standard"]
+    if preset == CUSTOM_PRESET:
+        source = dict(standard, **(custom or {}))
+    else:
+        source = ENDPOINT_PRESETS.get(preset, standard)
+    return {key: source[key] for key in ENDPOINT_KEYS}
+
+
+class VoiceActivityGate:
+    """
+    Энергетический VAD с гистерезисом, "хвостом" (hangover) и pre-roll буфером.
+    :param start_rms: порог RMS, выше которого блок считается речью
+    :param stop_rms: порог RMS, ниже которого блок считается тишиной (во время речи)
+    :param start_blocks: сколько громких блоков подряд нужно для начала речи
+    :param hangover_blocks: сколько тихих блоков подряд ждать перед концом речи
+    :param preroll_blocks: сколько блоков до начала речи отдавать распознавателю
+    """
+
+    def __init__(self, block_size=512, start_rms=200.0, stop_rms=120.0,
+                 start_blocks=2, hangover_blocks=15, preroll_blocks=10):
+        self.start_rms = start_rms
+        self.stop_rms = stop_rms
+        self.start_blocks = start_blocks
+        self.hangover_blocks = hangover_blocks
+        self.is_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+
+        self._preroll = np.zeros((preroll_blocks, block_size), dtype=np.int16)
+        self._preroll_frames = np.zeros(preroll_blocks, dtype=np.int32)
+        self._preroll_next = 0
+        self._preroll_count = 0
+
+    def process(self, block, rms):
+        """
+        Классифицирует очередной блок.
+        :return: одно из VAD_SILENCE, VAD_START, VAD_SPEECH, VAD_END
+        """
+        if not self.is_speech:
+            if rms >= self.start_rms:
+                self._voiced_run += 1
+            else:
+                self._voiced_run = 0
+
+            if self._voiced_run >= self.start_blocks:
+                self.is_speech = True
+                self._voiced_run = 0
+                self._silent_run = 0
+                return VAD_START
+
+            self._remember(block)
+            return VAD_SILENCE
+
+        if rms < self.stop_rms:
+            self._silent_run += 1
+        else:
+            self._silent_run = 0
+
+        if self._silent_run >= self.hangover_blocks:
+            self.is_speech = False
+            self._silent_run = 0
+            return VAD_END
+        return VAD_SPEECH
+
+    def _remember(self, block):
+        """Кладёт тихий блок в pre-roll (старые блоки перезаписываются)"""
+        slot = self._preroll_next
+        frames = len(block)
+        self._preroll[slot, :frames] = block
+        self._preroll_frames[slot] = frames
+        self._preroll_next = (slot + 1) % len(self._preroll)
+        self._preroll_count = min(self._preroll_count + 1, len(self._preroll))
+
+    def preroll(self):
+        """Блоки pre-roll от старого к новому; после обхода буфер очищается"""
+        size = len(self._preroll)
+        first = (self._preroll_next - self._preroll_count) % size
+        for i in range(self._preroll_count):
+            slot = (first + i) % size
+            yield self._preroll[slot, :self._preroll_frames[slot]]
+        self._preroll_count = 0
+
+    def reset(self):
+        self.is_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._preroll_count = 0
@@ -0,0 +1,105 @@
+"""
+Нормализация русских слов для поиска команд.
+
+Команды искались по вручную обрезанным основам ('откр', 'закр', 'калькул') и подстрокам:
+каждую новую форму слова приходилось угадывать заранее, а 'дат' находился и в "кандидат".
+Здесь слова фразы приводятся к основе стеммером Портера для русского языка (алгоритм
+Snowball), и сравнение идёт точным совпадением основ: "открой", "открою" -> "откр",
+"папку", "папки" -> "папк". Основа слова считается один раз и хранится в ограниченном
+LRU-кэше: словарь ассистента невелик, поэтому почти каждое слово фразы берётся из кэша.
+"""
+import re
+from functools import lru_cache
+
+WORD_CACHE_SIZE = 4096  # Сколько основ слов хранится в кэше
+TEXT_CACHE_SIZE = 64  # Сколько последних фраз (гипотезы N-best, подкоманды одной фразы)
+
+VOWELS = "аеиоуыэюя"
+
+PERFECTIVE_GERUND = (("в", "вши", "вшись"), ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись"))
+ADJECTIVE = ("ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом", "его", "ого",
+             "ему", "ому", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею")
+PARTICIPLE = (("ем", "нн", "вш", "ющ", "щ"), ("ивш", "ывш", "ующ"))
+REFLEXIVE = ("ся", "сь")
+VERB = (("ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют", "ны", "ть", "ешь", "нно"),
+        ("ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил", "ыл", "им", "ым", "ен", "ило",
+         "ыло", "ено", "ят", "ует", "уют", "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю"))
+NOUN = ("а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и", "ией", "ей", "ой", "ий", "й",
+        "иям", "ям", "ием", "ем", "ам", "ом", "о", "у", "ах", "иях", "ях", "ы", "ь", "ию", "ью", "ю", "ия", "ья", "я")
+SUPERLATIVE = ("ейше", "ейш")
+DERIVATIONAL = ("ость", "ост")
+
+
+def _regions(word):
+    """Начала областей RV и R2 (по правилам Snowball)"""
+    rv = next((i + 1 for i, char in enumerate(word) if char in VOWELS), len(word))
+    r1 = next((i + 1 for i in range(1, len(word)) if word[i] not in VOWELS and word[i - 1] in VOWELS), len(word))
+    r2 = next((i + 1 for i in range(r1 + 1, len(word)) if word[i] not in VOWELS and word[i - 1] in VOWELS),
+              len(word))
+    return rv, r2
+
+
+def _strip(word, start, endings, after_a=()):
+    """
+    Отрезает самое длинное окончание из endings (и after_a), начинающееся не раньше start.
+    Окончания after_a отрезаются, только если перед ними стоит 'а' или 'я'.
+    :return: слово без окончания или None, если окончания нет
+    """
+    ending = max((ending for ending in (*endings, *after_a)
+                  if word.endswith(ending) and len(word) - len(ending) >= start), key=len, default=None)
+    if ending is None:
+        return None
+    cut = len(word) - len(ending)
+    if ending in after_a and ending not in endings:
+        if cut - 1 < start or word[cut - 1] not in "ая":
+            return None
+    return word[:cut]
+
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def stem(word):
+    """Основа русского слова: "открой" -> "откр", "корзину" -> "корзин". Слова без кириллицы не меняются"""
+    word = word.lower().replace("ё", "е")
+    if not re.search(r"[а-я]", word):
+        return word
+    rv, r2 = _regions(word)
+
+    # Шаг 1: деепричастие, иначе возвратная частица и окончание прилагательного, глагола или существительного
+    result = _strip(word, rv, PERFECTIVE_GERUND[1], PERFECTIVE_GERUND[0])
+    if result is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        result = _strip(word, rv, ADJECTIVE)
+        if result is not None:
+            result = _strip(result, rv, PARTICIPLE[1], PARTICIPLE[0]) or result
+        else:
+            result = _strip(word, rv, VERB[1], VERB[0])
+            if result is None:
+                result = _strip(word, rv, NOUN)
+    word = word if result is None else result
+
+    # Шаг 2-4: конечная 'и', словообразовательный суффикс, превосходная степень и 'нн', мягкий знак
+    if word.endswith("и") and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = _strip(word, r2, DERIVATIONAL) or word
+    word = _strip(word, rv, SUPERLATIVE) or word
+    if word.endswith("нн") and len(word) - 1 >= rv:
+        word = word[:-1]
+    elif word.endswith("ь") and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def split_words(text):
+    """Слова фразы в нижнем регистре - в том же порядке, что и их основы в normalize_words"""
+    return re.findall(r"[\w+]+", text.lower())
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def normalize_words(text):
+    """Основы слов фразы (кортеж). Фраза разбирается один раз, повторные вызовы берутся из кэша"""
+    return tuple(stem(word) for word in split_words(text))
+
+
+def normalize(text):
+    """Фраза из основ: "открой папку загрузки" -> "откр папк загрузк" """
+    return " ".join(normalize_words(text))
@@ -46,3 +46,17 @@ debug_handler = RotatingFileHandler(
 debug_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
 debug_handler.setFormatter(debug_formatter)
 debug_logger.addHandler(debug_handler)
+
+# Замеры задержек по фразам (bin/latency_metrics.py)
+metrics_file_path = os.path.join(internal_dir, "log", "metrics.log")
+metrics_logger = logging.getLogger("metrics_assist")
+metrics_logger.setLevel(logging.INFO)
+metrics_logger.propagate = False
+metrics_handler = RotatingFileHandler(
+    metrics_file_path,
+    maxBytes=1 * 1024 * 1024,  # Максимальный размер файла (1 МБ)
+    backupCount=3,  # Количество резервных файлов
+    encoding='utf-8'
+)
+metrics_handler.setFormatter(debug_formatter)
+metrics_logger.addHandler(metrics_handler)
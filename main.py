@@ -7,6 +7,7 @@
 """
 import csv
 import ctypes
+from ctypes import wintypes
 import re
 import shutil
 import numpy as np
@@ -38,20 +39,42 @@ from packaging import version
 import psutil
 from bin.commands_widgets import CreateCommandsWidget, CommandsWidget, ProcessLinksWidget
 from bin.other_options_widgets import CensorCounterWidget, CheckUpdateWidget, DebugLoggerWidget, \
-    RelaxWidget
+    RelaxWidget, LatencyMetricsWidget
 from bin.utils import handler_links, handler_folder, get_config_value, set_config_value, update_version, \
     is_url_string
 from bin.function_list_main import *
 from path_builder import get_path
+import multiprocessing
 import threading
-import sounddevice as sd
+from functools import partial
 import subprocess
 from bin.audio_control import controller
+from bin.audio_pipeline import AudioPipeline
+from bin.audio_sources import open_input_stream, WavFileSource
+from bin.replay_harness import ActionRecorder, load_expected
+from bin.device_registry import device_registry
+from bin.intent_matcher import IntentMatcher, CENSOR, NAME, ACTION, OPEN, CLOSE, COMMAND, PLAYER_TOGGLE, \
+    PLAYER_NEXT, PLAYER_PREV, OPEN_STEMS, CLOSE_STEMS
+from bin.intent_registry import Intent, IntentRegistry, ignore_text, STAGE_SYSTEM, STAGE_ACTION, STAGE_DIRECT, \
+    STAGE_ALWAYS
+from bin.stream_health import StreamHealthMonitor, REENUMERATE
+from bin.decode_processes import MultiprocessDecodeWorker
+from bin.latency_metrics import latency_tracker
+from bin.result_arbitration import ResultArbiter
+from bin.english_cascade import EnglishCascade
+from bin.hypothesis_ranking import CommandIndex, MAX_ALTERNATIVES
+from bin.noise_floor import NoiseFloorEstimator
+from bin.preprocessing import AudioPreprocessor
+from bin.voice_activity import VoiceActivityGate, endpoint_values
+from bin.command_grammar import build_command_grammar, build_wake_grammar, grammar_to_json, \
+    ACTION_STEMS, SPECIAL_STEMS, SEARCH_WORDS, COMMAND_SEPARATORS, CONFIRM_WORDS, expects_english_target
+from bin.fuzzy_commands import FuzzyCommandIndex, ASK_SCORE, is_confident
+from bin.shortcut_index import ShortcutIndex, list_shortcuts
 from bin.settings_widgets import SettingsWidget, InterfaceWidget, OtherSettingsWidget
 from bin.speak_functions import thread_react_detail, thread_react, react
 from logging_config import logger, debug_logger
 from bin.lists import get_audio_paths
-from vosk import Model, KaldiRecognizer
+from bin.model_registry import model_registry
 from PyQt5.QtGui import QIcon, QCursor, QFont, QColor, QDesktopServices
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, \
                              QPushButton, QCheckBox, QSystemTrayIcon, QAction, qApp, QMenu, QMessageBox, \
@@ -98,6 +121,9 @@ class Assistant(QMainWindow):
     close_child_windows = pyqtSignal()
     save_settings_signal = pyqtSignal()
     update_checked = pyqtSignal(bool, str)
+    model_ready = pyqtSignal(str, float, str)  # язык модели, время загрузки, текст ошибки
+    microphone_checked = pyqtSignal()  # Реестр устройств закончил проверку микрофонов
+    noise_floor_stored = pyqtSignal()  # Оценка фона изменилась (сохраняется в потоке интерфейса)
 
     def check_memory_usage(self, limit_mb):
         """
@@ -139,7 +165,11 @@ class Assistant(QMainWindow):
         gui_signals.close_widget_signal.connect(self.close_widget)
         color_signal.color_changed.connect(self.update_colors)
         commands_signal.commands_updated.connect(self.save_commands)
+        commands_signal.commands_updated.connect(self.rebuild_command_grammar)
         self.update_checked.connect(self.handle_update_status)
+        self.model_ready.connect(self.on_model_ready)
+        self.microphone_checked.connect(self._on_microphone_checked)
+        self.noise_floor_stored.connect(lambda: self.save_settings(notify=False))
         self.close_child_windows.connect(self.hide_widget)
         self.last_position = 0
         self.MEMORY_LIMIT_MB = 1024
@@ -169,17 +199,57 @@ class Assistant(QMainWindow):
         self.is_widget = None
         self.input_device_id = None
         self.input_device_name = None
+        self.vad_enabled = None
+        self.command_mode = None
+        self.wake_word_mode = None
+        self.partial_results = None
+        self.multiprocess_decode = None
+        self.confidence_threshold = None
+        self.cascade_decoding = None
+        self.nbest_results = None
+        self.noise_floors = None
+        self.audio_preprocessing = None
+        self.native_capture = None
+        self.endpoint_preset = None
+        self.endpoint_custom = None
+        self.fuzzy_commands = None
         self.install_settings()
         self.audio_stream = None
+        self.audio_source_factory = open_input_stream  # Откуда берётся звук: микрофон или WAV (--replay)
+        self.audio_pipeline = None  # Захват -> кольцевой буфер -> поток декодирования
+        self.model_path_ru = get_path("bin", "model_ru")
+        self.model_path_en = get_path("bin", "model_en")
+        self.models_acquired = []  # Модели, взятые из model_registry этим запуском ассистента
+        self.result_arbiter = ResultArbiter(threshold=self.confidence_threshold)  # Выбор RU/EN по уверенности
+        self.english_cascade = None  # EN-модель по требованию (cascade_decoding)
+        # Команды в нормальной форме: выбор из N-best гипотез и поиск команды в другой форме слова
+        self.command_index = CommandIndex()
+        self.noise_floor = None  # Оценка фона текущего микрофона (пороги VAD и watchdog'а)
+        self.noise_floor_saved_time = 0.0
         self.last_audio_time = None  # Время последнего НЕтихого пакета
-        self.silence_timer = QTimer()  # Таймер для проверки тишины
-        self.silence_timer.timeout.connect(self.check_silence_timeout)
-        self.silence_timer.start(5000)
+        # Поток проверяется по пульсу callback'ов и переполнениям, а не по тишине
+        self.stream_monitor = StreamHealthMonitor(device_registry)
+        self.health_timer = QTimer()  # Таймер проверки аудиопотока
+        self.health_timer.timeout.connect(self.check_stream_health)
+        self.health_timer.start(2000)
         self.save_settings_signal.connect(self.restart_bot)
         self.type_version = "stable"
         self.commands = self.load_commands()
+        self.intent_registry = self._builtin_intents()
+        # Все словари run_script (цензура, действия, встроенные команды, commands.json) - один автомат
+        self.intent_matcher = IntentMatcher([self.assistant_name, self.assist_name2, self.assist_name3],
+                                            self.commands, self.intent_registry)
+        self.command_index.rebuild([self.assistant_name, self.assist_name2, self.assist_name3], self.commands)
+        self.fuzzy_index = FuzzyCommandIndex(self.commands)  # Похожие команды для неточно распознанных целей
+        # Ярлыки с английскими названиями находятся по русскому произношению без ручных команд
+        self.shortcut_index = ShortcutIndex(list_shortcuts(get_path('user_settings', "links for assist")))
         self.audio_paths = get_audio_paths(self.speaker)
+        # Микрофоны проверяются в фоне один раз, дальше выбор устройства и настройки берут кэш
+        device_registry.set_native(self.native_capture)
+        device_registry.probe_async()
         self.initui()
+        # Модели грузятся параллельно в фоне, пока идут проверки экрана инициализации
+        self.preload_models()
         self.splash = InitScreen()
         self.splash.init_complete.connect(self.handle_init_result)
         self.splash.show()
@@ -187,6 +257,7 @@ class Assistant(QMainWindow):
 
     def check_up(self):
         self.check_or_create_folder()
+        self.init_links_watcher()
         self.apply_styles()
         # Проверка автозапуска при старте программы
         self.check_autostart()
@@ -253,6 +324,20 @@ class Assistant(QMainWindow):
         self.is_widget = self.settings.get("is_widget", True)
         self.input_device_id = self.settings.get("input_device_id", None)
         self.input_device_name = self.settings.get("input_device_name", None)
+        self.vad_enabled = self.settings.get("vad_enabled", True)
+        self.command_mode = self.settings.get("command_mode", False)
+        self.wake_word_mode = self.settings.get("wake_word_mode", False)
+        self.partial_results = self.settings.get("partial_results", False)
+        self.multiprocess_decode = self.settings.get("multiprocess_decode", False)
+        self.confidence_threshold = self.settings.get("confidence_threshold", 0.0)
+        self.cascade_decoding = self.settings.get("cascade_decoding", False)
+        self.nbest_results = self.settings.get("nbest_results", False)
+        self.noise_floors = self.settings.get("noise_floors", {})
+        self.audio_preprocessing = self.settings.get("audio_preprocessing", False)
+        self.native_capture = self.settings.get("native_capture", True)
+        self.endpoint_preset = self.settings.get("endpoint_preset", "standard")
+        self.endpoint_custom = self.settings.get("endpoint_custom", endpoint_values("standard"))
+        self.fuzzy_commands = self.settings.get("fuzzy_commands", True)
 
     def install_icons(self):
         self.icon_start_win = get_path("bin", "icons", "start-win.svg")
@@ -273,6 +358,7 @@ class Assistant(QMainWindow):
         self.icon_logs_path = get_path("bin", "icons", "logs.svg")
         self.icon_censor_path = get_path("bin", "icons", "censor.svg")
         self.icon_relax_path = get_path("bin", "icons", "relax.svg")
+        self.icon_latency_path = get_path("bin", "icons", "latency.svg")
         self.icon_create_command_path = get_path("bin", "icons", "commands.svg")
         self.icon_added_commands_path = get_path("bin", "icons", "commands_list.svg")
         self.icon_process_link_path = get_path("bin", "icons", "process_link.svg")
@@ -1034,6 +1120,12 @@ class Assistant(QMainWindow):
                 logger.error(f'Ошибка при создании папки для хранения ярлыков: {e}')
                 debug_logger.error(f'Ошибка при создании папки для хранения ярлыков: {e}')
 
+    def init_links_watcher(self):
+        """Новые и удалённые ярлыки сразу попадают в индекс ярлыков и грамматику"""
+        folder_path = get_path('user_settings', "links for assist")
+        self.links_watcher = QFileSystemWatcher([folder_path])
+        self.links_watcher.directoryChanged.connect(lambda path: self.rebuild_command_grammar())
+
     def close_app(self):
         """Закрытие приложения."""
         if self.is_assistant_running:
@@ -1084,8 +1176,11 @@ class Assistant(QMainWindow):
         except (FileNotFoundError, json.JSONDecodeError):
             return {}  # Если файл не найден или повреждён, возвращаем пустой словарь
 
-    def save_settings(self):
-        """Сохраняет настройки в файл settings.json."""
+    def save_settings(self, notify=True):
+        """
+        Сохраняет настройки в файл settings.json.
+        :param notify: показать уведомление "Настройки сохранены!" (не нужно для служебных значений)
+        """
         settings_data = {
             "voice": self.speaker,
             "assistant_name": self.assistant_name,
@@ -1099,7 +1194,21 @@ class Assistant(QMainWindow):
             "start_win": self.toggle_start,
             "is_widget": self.is_widget,
             "input_device_id": self.input_device_id,
-            "input_device_name": self.input_device_name
+            "input_device_name": self.input_device_name,
+            "vad_enabled": self.vad_enabled,
+            "command_mode": self.command_mode,
+            "wake_word_mode": self.wake_word_mode,
+            "partial_results": self.partial_results,
+            "multiprocess_decode": self.multiprocess_decode,
+            "confidence_threshold": self.confidence_threshold,
+            "cascade_decoding": self.cascade_decoding,
+            "nbest_results": self.nbest_results,
+            "noise_floors": self.noise_floors,
+            "audio_preprocessing": self.audio_preprocessing,
+            "native_capture": self.native_capture,
+            "endpoint_preset": self.endpoint_preset,
+            "endpoint_custom": self.endpoint_custom,
+            "fuzzy_commands": self.fuzzy_commands
         }
         try:
             # Проверяем, существует ли папка user_settings
@@ -1115,7 +1224,8 @@ class Assistant(QMainWindow):
                 value = "dev"
             set_config_value("app", "build", f"{value}")
 
-            self.show_notification_message("Настройки сохранены!")
+            if notify:
+                self.show_notification_message("Настройки сохранены!")
             debug_logger.debug("Настройки сохранены.")
         except Exception as e:
             logger.error(f"Ошибка при сохранении настроек: {e}")
@@ -1141,7 +1251,21 @@ class Assistant(QMainWindow):
                 "start_win": True,
                 "is_widget": True,
                 "input_device_id": None,
-                "input_device_name": None
+                "input_device_name": None,
+                "vad_enabled": True,
+                "command_mode": False,
+                "wake_word_mode": False,
+                "partial_results": False,
+                "multiprocess_decode": False,
+                "confidence_threshold": 0.0,
+                "cascade_decoding": False,
+                "nbest_results": False,
+                "noise_floors": {},
+                "audio_preprocessing": False,
+                "native_capture": True,
+                "endpoint_preset": "standard",
+                "endpoint_custom": endpoint_values("standard"),
+                "fuzzy_commands": True
             }
 
         # Загружаем текущие настройки
@@ -1375,26 +1499,17 @@ class Assistant(QMainWindow):
                     logger.error("Превышен лимит памяти")
                     debug_logger.error("Превышен лимит памяти")
                     self.stop_assist()
+                    model_registry.trim()  # Ассистент остановлен - модели больше никто не держит
                     self.show_notification_message("Превышен лимит памяти, бот остановлен.")
                     break
 
-                if any(keyword in text for keyword in ['сук', 'суч', 'пизд', 'ебан', 'ебат', 'ёбан',
-                                                       'нах', 'хуй', 'блять', 'блядь', 'ебу', 'епта',
-                                                       'ёпта', 'гандон', 'пидор', 'пидар', "хуё", "хуя",
-                                                       "хую", "хуе", "залуп", "залупа", "пиздюк",
-                                                       "ебанут", "ебарь", "ебанат", "еблан", "ебло",
-                                                       "еблив", "ебуч", "ёбыр", "заеб", "наеб", "объеб",
-                                                       "подъеб", "разъеб", "съеб"]):
+                # Один проход по фразе находит все словари: цензуру, имена, действия, команды, плеер
+                hits = self.intent_matcher.scan(text)
+
+                if CENSOR in hits:
                     self.censor_counter()
 
-                if self.is_censored and any(
-                        keyword in text for keyword in ['сук', 'суч', 'пизд', 'ебан', 'ебат', 'ёбан',
-                                                        'нах', 'хуй', 'блять', 'блядь', 'ебу', 'епта',
-                                                        'ёпта', 'гандон', 'пидор', 'пидар', "хуё", "хуя",
-                                                        "хую", "хуе", "залуп", "залупа", "пиздюк",
-                                                        "ебанут", "ебарь", "ебанат", "еблан", "ебло",
-                                                        "еблив", "ебуч", "ёбыр", "заеб", "наеб", "объеб",
-                                                        "подъеб", "разъеб", "съеб"]):
+                if self.is_censored and CENSOR in hits:
                     censored_folder = self.audio_paths.get('censored_folder')
                     thread_react(censored_folder)
                     continue
@@ -1412,10 +1527,7 @@ class Assistant(QMainWindow):
                     continue
 
                 # Проверка на наличие имени ассистента в тексте или флаг упоминания
-                has_assistant_name = (self.assistant_name in text or
-                                      self.assist_name2 in text or
-                                      self.assist_name3 in text or
-                                      name_mentioned)
+                has_assistant_name = NAME in hits or name_mentioned
                 # Режим уточнения команды (если предыдущая попытка не удалась)
                 if last_unrecognized_command:
                     if text:
@@ -1423,33 +1535,31 @@ class Assistant(QMainWindow):
                         last_activity_time = current_time
                         # Проверяем, содержит ли текст только кириллические символы (исключаем английскую речь)
                         # if any(cyr_char in text.lower() for cyr_char in 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'):
-                        # Сначала проверяем специальные команды (калькулятор, диспетчер и т.д.)
-                        special_commands = {
-                            'микшер': (open_volume_mixer, close_volume_mixer),
-                            'калькул': (open_calc, close_calc),
-                            'пэйнт': (open_paint, close_paint),
-                            'пейнт': (open_paint, close_paint),
-                            'переменные': (open_path, None),
-                            'диспетчер': (open_taskmgr, close_taskmgr),
-                            'корзин': (open_recycle_bin, close_recycle_bin),
-                            'дат': (open_appdata, close_appdata),
-                            'панел': (self._open_widget_signal, self._close_widget_signal),
-                        }
-
-                        # Ищем совпадение со специальными командами
-                        matched_special = next((kw for kw in special_commands if kw in text.lower()), None)
+                        # Сначала проверяем встроенные команды (калькулятор, диспетчер и т.д.)
+                        matched_special = self.intent_registry.resolve(hits, STAGE_ACTION)
 
                         if matched_special:
-                            if last_unrecognized_command['action_type'] == 'open':
-                                special_commands[matched_special][0]()
-                            elif last_unrecognized_command['action_type'] == 'close':
-                                if special_commands[matched_special][1]:
-                                    special_commands[matched_special][1]()
+                            matched_special.run(last_unrecognized_command['action_type'], text, hits)
                             last_unrecognized_command = None
                             continue
 
                         # Ищем прямое совпадение с командами из файла
-                        matched_keyword = next((kw for kw in self.commands if kw in text.lower()), None)
+                        matched_keyword = self.command_index.find_command(text) or hits.first(COMMAND)
+                        if not matched_keyword:
+                            suggestion = last_unrecognized_command.get('suggestion')
+                            if suggestion and any(word in CONFIRM_WORDS for word in text.split()):
+                                matched_keyword = suggestion  # Согласие с предложенной командой
+                            else:
+                                fuzzy_key, fuzzy_score, fuzzy_confident = self.fuzzy_command(text)
+                                if fuzzy_confident:
+                                    matched_keyword = fuzzy_key
+                                elif self.shortcut_command(text) is not None:
+                                    matched_keyword = text  # Название ярлыка найдёт handle_app_command
+                                elif fuzzy_score >= ASK_SCORE:
+                                    # Несколько похожих команд: переспрашиваем про лучшую
+                                    last_unrecognized_command['suggestion'] = fuzzy_key
+                                    logger.info(f"Возможно, имелась в виду команда '{fuzzy_key}'? Скажите «да»")
+                                    continue
 
                         if matched_keyword:
                             # Восстанавливаем полную команду
@@ -1480,20 +1590,17 @@ class Assistant(QMainWindow):
                 if has_assistant_name:
                     reaction_triggered = False
                     # Системные команды (без изменений)
-                    if 'выключи комп' in text:
-                        shutdown_windows()
-                        logger.info("shutdown")
+                    system_intent = self.intent_registry.resolve(hits, STAGE_SYSTEM)
+                    if system_intent:
+                        system_intent.run(None, text, hits)
+                        logger.info(system_intent.name)
                         continue
-                    elif 'перезагрузить комп' in text:
-                        restart_windows()
-                        logger.info("restart")
-                        continue
-                    action_keywords = ['откр', 'закр', 'вкл', 'выкл', 'откл', 'запус',
-                                       'отруб', 'выруб']
-                    action = next((kw for kw in action_keywords if kw in text), None)
+                    # Слово-действие ищется по нормальной форме ("открою", "отключить"), а основа
+                    # из автомата ('откр', 'закр') остаётся для форм, которых нет в словаре ("открывай")
+                    action = self.command_index.find_action(text)[0] or hits.first(ACTION)
 
                     # Проверяем, есть ли в тексте слова-действия
-                    has_action_words = any(kw in text.lower() for kw in action_keywords)
+                    has_action_words = action is not None
 
                     commands = []
                     if " и " in text:
@@ -1509,75 +1616,54 @@ class Assistant(QMainWindow):
 
                     for command in commands:
                         command = command.strip()
+                        # Единственная команда - та же фраза, второй проход не нужен
+                        command_hits = hits if command == text else self.intent_matcher.scan(command)
 
-                        if action and not any(kw in command for kw in action_keywords):
+                        command_action, action_type = self.command_index.find_action(command)
+                        if action and command_action is None and ACTION not in command_hits:
                             command = f"{action} {command}"
+                            command_hits = self.intent_matcher.scan(command)
+                            action_type = self.command_index.find_action(command)[1]
 
                         # Определяем тип действия
-                        action_type = None
-                        if any(kw in command for kw in ['запус', 'откр', 'вкл', 'вруб']):
-                            action_type = 'open'
-                        elif any(kw in command for kw in ['закр', 'выкл', 'выруб', 'отруб', 'откл']):
-                            action_type = 'close'
+                        if action_type is None:
+                            if OPEN in command_hits:
+                                action_type = 'open'
+                            elif CLOSE in command_hits:
+                                action_type = 'close'
 
                         if action_type:
-                            if "микшер" in command:
-                                if action_type == 'open':
-                                    open_volume_mixer()
-                                else:
-                                    close_volume_mixer()
-                            elif 'калькул' in command:
-                                if action_type == 'open':
-                                    open_calc()
-                                else:
-                                    close_calc()
-                            elif 'pain' in command or 'пэйнт' in command or 'prin' in command:
-                                if action_type == 'open':
-                                    open_paint()
-                                else:
-                                    close_paint()
-                            elif 'переменные' in command:
-                                if action_type == 'open':
-                                    open_path()
-                            elif 'диспетчер' in command:
-                                if action_type == 'open':
-                                    open_taskmgr()
-                                else:
-                                    close_taskmgr()
-                            elif 'корзин' in command:
-                                if action_type == 'open':
-                                    open_recycle_bin()
+                            # Реакции внутри блока - ответ на эту фразу (отметка "reply" в метриках задержки)
+                            with latency_tracker.answering(latency_tracker.mark("match")):
+                                intent = self.intent_registry.resolve(command_hits, STAGE_ACTION)
+                                if intent:
+                                    intent.run(action_type, command, command_hits)
                                 else:
-                                    close_recycle_bin()
-                            elif 'дат' in command:
-                                if action_type == 'open':
-                                    open_appdata()
-                                else:
-                                    close_appdata()
-                            elif 'панел' in command:
-                                if action_type == 'open':
-                                    self._open_widget_signal()
-                                elif action_type == 'close':
-                                    self._close_widget_signal()
-                            else:
-                                # Пытаемся обработать команду
-                                app_processed = self.handle_app_command(command, action_type)
-                                folder_processed = self.handle_folder_command(command, action_type)
-
-                                if not app_processed and not folder_processed:
-                                    # Сохраняем контекст для уточнения
-                                    last_unrecognized_command = {
-                                        'action': action,
-                                        'action_type': action_type,
-                                        'original_text': text
-                                    }
-                                    reaction_triggered = True
+                                    # Пытаемся обработать команду
+                                    app_processed = self.handle_app_command(command, action_type, command_hits)
+                                    folder_processed = self.handle_folder_command(command, action_type, command_hits)
+
+                                    if not app_processed and not folder_processed:
+                                        # Цель могла быть распознана с ошибкой: ищем похожую команду
+                                        fuzzy_key, fuzzy_score, fuzzy_confident = self.fuzzy_command(command)
+                                        if fuzzy_confident:
+                                            debug_logger.info(f"Команда '{command}' выполнена как '{fuzzy_key}'")
+                                            if (self.handle_app_command(fuzzy_key, action_type) or
+                                                    self.handle_folder_command(fuzzy_key, action_type)):
+                                                continue
+                                        # Сохраняем контекст для уточнения
+                                        last_unrecognized_command = {
+                                            'action': action,
+                                            'action_type': action_type,
+                                            'original_text': text,
+                                            'suggestion': fuzzy_key if fuzzy_score >= ASK_SCORE else None
+                                        }
+                                        if last_unrecognized_command['suggestion']:
+                                            logger.info(f"Возможно, имелась в виду команда '{fuzzy_key}'? Скажите «да»")
+                                        reaction_triggered = True
                         else:
                             # Если есть имя ассистента, но нет команды или непонятная команда
-                            if (self.assistant_name in command or
-                                    self.assist_name2 in command or
-                                    self.assist_name3 in command or
-                                    name_mentioned):
+                            if NAME in command_hits or name_mentioned:
 
                                 # Реагируем только если есть слова-действия, но команда не распознана
                                 if has_action_words:
@@ -1586,16 +1672,11 @@ class Assistant(QMainWindow):
                                         thread_react(what_folder)
                                     reaction_triggered = True
                                 else:
-                                    if any(word in command for word in ["найди", "поищи", "посмотри", "гугли"]):
-                                        search_yandex(command, self.assistant_name,
-                                                      self.assist_name2,
-                                                      self.assist_name3)
-                                        approve_folder = self.audio_paths.get('approve_folder')
-                                        thread_react(approve_folder)
-                                    elif any(word in command for word in ["фулл скрин", "весь экран", "сфотк"]):
-                                        self.capture_fullscreen()
-                                    elif any(word in command for word in ["скрин", "област"]):
-                                        self.capture_area()
+                                    # Поиск и скриншоты - команды без слова-действия
+                                    intent = self.intent_registry.resolve(command_hits, STAGE_DIRECT)
+                                    if intent:
+                                        with latency_tracker.answering(latency_tracker.mark("match")):
+                                            intent.run(None, command, command_hits)
                                     # elif 'игровой режим' in command:
                                     #     if action_type == 'open':
                                     #         self.start_game_mode()
@@ -1614,20 +1695,10 @@ class Assistant(QMainWindow):
                             thread_react_detail(prorok_sanboy)
 
                 # Обработка плеера (без изменений)
-                if 'плеер' in text:
-                    if any(keyword in text for keyword in
-                           ['пауз', 'пуск', 'пуст', 'вкл', 'вруб', 'отруб', 'выкл', 'стоп']):
-                        controller.play_pause()
-                        player_folder = self.audio_paths.get('player_folder')
-                        thread_react(player_folder)
-                    elif any(keyword in text for keyword in ['след', 'впер', 'дальш', 'перекл']):
-                        controller.next_track()
-                        player_folder = self.audio_paths.get('player_folder')
-                        thread_react(player_folder)
-                    elif any(keyword in text for keyword in ['пред', 'назад']):
-                        controller.previous_track()
-                        player_folder = self.audio_paths.get('player_folder')
-                        thread_react(player_folder)
+                player_intent = self.intent_registry.resolve(hits, STAGE_ALWAYS)
+                if player_intent:
+                    with latency_tracker.answering(latency_tracker.mark("match")):
+                        player_intent.run(None, text, hits)
 
                     # elif self.game_mode_bool:
                     #     found_cmd = self.game_mode.find_command(text)
@@ -1686,6 +1757,59 @@ class Assistant(QMainWindow):
     #         self.game_mode_bool = False
     #         logger.info("Игровой режим деактивирован")
 
+    def _builtin_intents(self):
+        """
+        Таблица встроенных команд: основы, обработчики открытия/закрытия, этап и приоритет.
+        Приоритеты повторяют прежний порядок проверок в run_script
+        """
+        registry = IntentRegistry()
+        for intent in (
+                Intent("shutdown", ['выключи комп'], ignore_text(shutdown_windows), stage=STAGE_SYSTEM, priority=2),
+                Intent("restart", ['перезагрузить комп'], ignore_text(restart_windows), stage=STAGE_SYSTEM,
+                       priority=1),
+                Intent("микшер", ['микшер'], ignore_text(open_volume_mixer), ignore_text(close_volume_mixer),
+                       priority=90),
+                Intent("калькулятор", ['калькул'], ignore_text(open_calc), ignore_text(close_calc), priority=80),
+                Intent("пейнт", ['pain', 'prin', 'пэйнт', 'пейнт'], ignore_text(open_paint), ignore_text(close_paint),
+                       priority=70),
+                Intent("переменные", ['переменные'], ignore_text(open_path), priority=60),
+                Intent("диспетчер", ['диспетчер'], ignore_text(open_taskmgr), ignore_text(close_taskmgr),
+                       priority=50),
+                Intent("корзина", ['корзин'], ignore_text(open_recycle_bin), ignore_text(close_recycle_bin),
+                       priority=40),
+                # Только формы слова "дата" ("апп дата"): основа 'дат' ловила "дать", "датчик" и т.д.
+                Intent("appdata", ['дата', 'дату', 'апп дат', 'appdata'], ignore_text(open_appdata),
+                       ignore_text(close_appdata), priority=30),
+                Intent("панель", ['панел'], ignore_text(self._open_widget_signal),
+                       ignore_text(self._close_widget_signal), priority=20),
+                Intent("поиск", SEARCH_WORDS, self._run_search, stage=STAGE_DIRECT, priority=3),
+                Intent("скриншот экрана", ["фулл скрин", "весь экран", "сфотк"],
+                       ignore_text(self.capture_fullscreen), stage=STAGE_DIRECT, priority=2),
+                Intent("скриншот области", ["скрин", "област"], ignore_text(self.capture_area),
+                       stage=STAGE_DIRECT, priority=1),
+                Intent("плеер", ['плеер'], self._run_player, stage=STAGE_ALWAYS),
+        ):
+            registry.register(intent)
+        return registry
+
+    def _run_search(self, command, hits):
+        search_yandex(command, self.assistant_name, self.assist_name2, self.assist_name3)
+        approve_folder = self.audio_paths.get('approve_folder')
+        thread_react(approve_folder)
+
+    def _run_player(self, command, hits):
+        """Плеер: пауза/пуск, следующий или предыдущий трек по словам фразы"""
+        if PLAYER_TOGGLE in hits:
+            controller.play_pause()
+        elif PLAYER_NEXT in hits:
+            controller.next_track()
+        elif PLAYER_PREV in hits:
+            controller.previous_track()
+        else:
+            return
+        player_folder = self.audio_paths.get('player_folder')
+        thread_react(player_folder)
+
     def restart_bot(self):
         self.stop_assist(reaction=False)
         QTimer.singleShot(3000, lambda: self.run_assist())
@@ -1696,14 +1820,16 @@ class Assistant(QMainWindow):
         logger.info("Загрузка моделей для распознавания...")
         debug_logger.debug("Загрузка моделей для распознавания...")
 
-        model_path_ru = get_path("bin", "model_ru")
-        model_path_en = get_path("bin", "model_en")
-        debug_logger.debug(f"Загружена модель RU - {model_path_ru}")
-        debug_logger.debug(f"Загружена модель EN - {model_path_en}")
+        debug_logger.debug(f"Загружена модель RU - {self.model_path_ru}")
+        debug_logger.debug(f"Загружена модель EN - {self.model_path_en}")
 
         try:
-            self.model_ru = Model(model_path_ru)
-            self.model_en = Model(model_path_en)
+            # Модели остаются в памяти между перезапусками - повторно с диска не читаются.
+            # Для старта захвата достаточно русской модели, английская подключится позже.
+            # При распознавании в процессах модели грузят сами процессы, здесь RU нужна только детектору имени
+            if not self.multiprocess_decode or self.wake_word_mode:
+                model_registry.acquire(self.model_path_ru)
+                self.models_acquired.append(self.model_path_ru)
             logger.info("Модели успешно загружены.")
             debug_logger.info("Модели успешно загружены.")
         except Exception as e:
@@ -1712,151 +1838,317 @@ class Assistant(QMainWindow):
             return False
 
         try:
-            # Инициализация распознавателей
-            self.rec_ru = KaldiRecognizer(self.model_ru, 16000)
-            self.rec_en = KaldiRecognizer(self.model_en, 16000)
+            self.rec_ru = None
+            self.rec_en = None
+
+            # Декодирование идёт в отдельном потоке, callback только копирует блоки
+            # VAD не пускает тишину в распознаватели
+            vad = VoiceActivityGate() if self.vad_enabled else None
+            # Пороги тишины и речи подстраиваются под фон микрофона, начиная с сохранённой оценки
+            self.noise_floor = NoiseFloorEstimator(initial=self.noise_floors.get(self.input_device_name))
+            worker_factory = None
+            if self.multiprocess_decode:
+                # RU и EN распознают каждая в своём процессе, результаты сводятся по фразам
+                worker_factory = partial(MultiprocessDecodeWorker,
+                                         model_paths={"ru": self.model_path_ru, "en": self.model_path_en},
+                                         ru_grammar=self._command_grammar_json())
+            self.audio_pipeline = AudioPipeline(on_result=self.on_final_result,
+                                                on_voice=self._on_voice_activity,
+                                                vad=vad, worker_factory=worker_factory,
+                                                latency_tracker=latency_tracker)
+            if not self.multiprocess_decode:
+                self.rec_ru = self._create_ru_recognizer()
+                self.audio_pipeline.set_recognizers(self.rec_ru, self.rec_en)
+                if self.nbest_results:
+                    # Из нескольких гипотез выполняется лучшая гипотеза с командой
+                    self.audio_pipeline.set_command_index(self.command_index)
+                if self.command_mode:
+                    # Открытый словарь остаётся только для поиска ("найди ...")
+                    self.audio_pipeline.set_search_recognizer(
+                        model_registry.create_recognizer(self.model_path_ru, 16000))
+                if self.partial_results:
+                    # Короткие команды выполняются, не дожидаясь конца фразы
+                    self.audio_pipeline.set_early_dispatch(self.is_early_dispatch_candidate)
+            self.audio_pipeline.set_noise_floor(self.noise_floor)
+            self.apply_endpointing()
+            if self.audio_preprocessing:
+                # DC, гул и ровный фон убираются до распознавателей
+                self.audio_pipeline.set_preprocessor(AudioPreprocessor())
+            if self.wake_word_mode:
+                # Полное распознавание включается только после имени ассистента
+                self.audio_pipeline.set_wake_recognizer(*self._create_wake_recognizer())
+            # RU и EN сравниваются по уверенности слов и совпадению со словарём команд
+            self.result_arbiter.threshold = self.confidence_threshold
+            self.result_arbiter.set_vocabulary(self._assistant_vocabulary())
+            self.audio_pipeline.set_arbiter(self.result_arbiter)
+            if self.cascade_decoding and not self.multiprocess_decode:
+                # Непрерывно работает только RU, фраза перепроверяется EN лишь при необходимости
+                self.english_cascade = EnglishCascade(
+                    self.model_path_en,
+                    expects_english=lambda text: (expects_english_target(text, self.commands) and
+                                                  self.shortcut_command(text) is None))
+                self.audio_pipeline.set_cascade(self.english_cascade)
+            self.audio_pipeline.start()
+            if not self.multiprocess_decode and self.english_cascade is None:
+                self._attach_en_recognizer(self.audio_pipeline)
+
+            if self.audio_source_factory is not open_input_stream:
+                # Звук из файлов (--replay): микрофон не нужен
+                self.audio_stream = self.audio_pipeline.attach_stream(self.audio_source_factory(self.audio_callback))
+                self.audio_stream.start()
+                debug_logger.info("Аудиопоток запущен из WAV-файлов")
+                self.microphone_available = True
+                return True
 
             target_id = self.get_microphone_id(self.input_device_name)
             if target_id is None:
                 logger.warning("Не удалось определить микрофон. Используем устройство по умолчанию.")
-                target_id = sd.default.device[0] if sd.default.device[0] < len(sd.query_devices()) else None
+                target_id = device_registry.default_input()
 
             if target_id is None:
                 raise RuntimeError("Нет доступных входных устройств")
 
+            preferred_name = self.input_device_name
             try:
-                self.audio_stream = sd.InputStream(
-                    samplerate=16000,
-                    channels=1,
-                    dtype='int16',
-                    blocksize=512,
-                    device=target_id,
-                    callback=self.audio_callback
-                )
+                self.audio_stream = self.audio_pipeline.attach_stream(
+                    self.audio_source_factory(self.audio_callback, device=target_id, native=self.native_capture))
                 self.audio_stream.start()
                 self.input_device_id = target_id  # обновляем ID
-                device_name = sd.query_devices(target_id)['name']
-                self.input_device_name = device_name  # фиксируем имя
+                device_name = device_registry.name_of(target_id)
+                if not preferred_name:
+                    self.input_device_name = preferred_name = device_name  # фиксируем имя
                 debug_logger.info(f"Аудиопоток запущен: '{device_name}' (ID={target_id})")
             except Exception as e:
                 debug_logger.error(f"Не удалось открыть выбранное устройство (ID={target_id}): {e}")
-                # Fallback: попробовать без указания устройства (по умолчанию)
+                # Fallback: попробовать без указания устройства (по умолчанию).
+                # Имя выбранного микрофона остаётся - монитор потока вернётся к нему, когда он появится
                 try:
-                    self.audio_stream = sd.InputStream(
-                        samplerate=16000,
-                        channels=1,
-                        dtype='int16',
-                        blocksize=512,
-                        callback=self.audio_callback
-                    )
+                    self.audio_stream = self.audio_pipeline.attach_stream(
+                        self.audio_source_factory(self.audio_callback, native=self.native_capture))
                     self.audio_stream.start()
-                    fallback_id = sd.default.device[0]
-                    fallback_name = sd.query_devices(fallback_id)['name']
-                    self.input_device_id = fallback_id
-                    self.input_device_name = fallback_name
-                    debug_logger.warning(f"Используется устройство по умолчанию: '{fallback_name}'")
+                    self.input_device_id = device_registry.default_input()
+                    device_name = device_registry.name_of(self.input_device_id)
+                    debug_logger.warning(f"Используется устройство по умолчанию: '{device_name}'")
                 except Exception as e2:
                     debug_logger.error("Не удалось запустить ни одно устройство.", exc_info=True)
                     raise e2
 
             # ✅ Успешно запущено
+            self.stream_monitor.stream_opened(preferred_name, device_name, self.audio_pipeline)
+            self._seed_noise_floor()
             self.microphone_available = True
-            self.last_audio_time = time.time()  # начальное значение для watchdog
             return True
 
         except Exception as e:
             debug_logger.error(f"Критическая ошибка при инициализации аудио: {e}", exc_info=True)
             return False
 
-    def get_microphone_id(self, preferred_name=None):
-        """Возвращает ID микрофона по имени"""
-        try:
-            devices = sd.query_devices()
-            default_in = sd.default.device[0]
-            candidates = []
-            seen = set()
-
-            for dev in devices:
-                idx, name, ch = dev['index'], dev.get('name', ''), dev.get('max_input_channels', 0)
-                if ch <= 0 or not name:
-                    continue
+    def preload_models(self):
+        """Параллельная фоновая загрузка моделей RU и EN"""
+        if self.multiprocess_decode:
+            return  # Модели загрузят процессы распознавания
+        models = [("RU", self.model_path_ru)]
+        if not self.cascade_decoding:
+            models.append(("EN", self.model_path_en))  # В каскаде EN загрузится при первой нужде
+        for lang, path in models:
+            future = model_registry.load_async(path)
+            future.add_done_callback(
+                lambda f, lang=lang, path=path: self.model_ready.emit(
+                    lang, model_registry.load_times.get(path, 0.0),
+                    str(f.exception()) if f.exception() else ""))
+
+    def on_model_ready(self, lang, seconds, error):
+        """Сообщает о готовности модели в логах и в окне программы"""
+        if error:
+            logger.error(f"Ошибка при загрузке модели {lang}: {error}")
+            debug_logger.error(f"Ошибка при загрузке модели {lang}: {error}")
+            self.log_area.append(f"Модель {lang} не загружена")
+            return
+        debug_logger.info(f"Модель {lang} готова ({seconds:.1f} с)")
+        self.log_area.append(f"Модель {lang} готова ({seconds:.1f} с)")
 
-                # Фильтр: системные, дубли, нежелательные
-                clean = name.split('(')[0].strip()
-                lower_name = name.lower()
-                if (clean in seen or
-                        any(kw in lower_name for kw in ['mapper', 'primary', 'wave', 'default', 'communications'])):
-                    continue
-                seen.add(clean)
+    def _attach_en_recognizer(self, pipeline):
+        """Подключает английский распознаватель к работающему конвейеру, когда загрузится модель EN"""
+        def on_loaded(future):
+            if future.exception() is not None or pipeline is not self.audio_pipeline:
+                return
+            try:
+                model_registry.acquire(self.model_path_en)
+                self.models_acquired.append(self.model_path_en)
+                self.rec_en = model_registry.create_recognizer(self.model_path_en, 16000, words=True)
+                pipeline.set_en_recognizer(self.rec_en)
+                debug_logger.info("Английский распознаватель подключен")
+            except Exception as e:
+                debug_logger.error(f"Не удалось подключить английский распознаватель: {e}")
 
-                # Приоритет API: WASAPI > ASIO > остальные
-                api_name = sd.query_hostapis(dev['hostapi'])['name'].lower()
-                priority = {'wasapi': 3, 'asio': 2}.get(api_name, 1)
+        model_registry.load_async(self.model_path_en).add_done_callback(on_loaded)
 
-                try:
-                    with sd.InputStream(device=idx, channels=1, samplerate=16000, blocksize=512):
-                        candidates.append((idx, priority, preferred_name and preferred_name.lower() in lower_name))
-                except Exception:
-                    continue
+    def is_early_dispatch_candidate(self, text):
+        """
+        Можно ли выполнить частичный результат сразу: есть имя ассистента, слово-действие
+        и ровно одна цель из встроенных команд или commands.json
+        """
+        if not any(name and name in text for name in (self.assistant_name, self.assist_name2, self.assist_name3)):
+            return False
+        if not any(kw in text for kw in ACTION_STEMS):
+            return False
+        if any(separator in f" {text} " for separator in COMMAND_SEPARATORS):
+            return False  # Несколько команд подряд - ждём конца фразы
 
-            # Сортировка: совпадение по имени → приоритет API → индекс
-            if candidates:
-                best = max(candidates, key=lambda x: (x[2], x[1], -x[0]))
-                return best[0]
+        # 'дат' встречается внутри многих слов, поэтому по нему заранее не выполняем
+        targets = [kw for kw in SPECIAL_STEMS if kw != 'дат' and kw in text]
+        targets += [kw for kw in self.commands if kw in text]
+        return len(targets) == 1
 
-            return default_in  # fallback
+    def _command_grammar_json(self):
+        """JSON-грамматика русского распознавателя в режиме команд, None - открытый словарь"""
+        if not self.command_mode:
+            return None
 
-        except Exception as e:
-            debug_logger.warning(f"Ошибка выбора микрофона: {e}")
-            return sd.default.device[0]  # двойной fallback
+        grammar = build_command_grammar(
+            [self.assistant_name, self.assist_name2, self.assist_name3], self.commands,
+            self.shortcut_index.spoken_words)
+        debug_logger.info(f"Режим команд: грамматика из {len(grammar)} слов")
+        return grammar_to_json(grammar)
 
-    def audio_callback(self, indata, frames, time_info, status):
+    def _create_ru_recognizer(self):
         """
-        :param time_info: Временные метки от PortAudio
+        Русский распознаватель: с грамматикой из команд в режиме команд, иначе открытый словарь.
+        С nbest_results отдаёт несколько гипотез
         """
-        if status:
-            debug_logger.warning(f"⚠️ Статус аудио: {status}")
-            if any(keyword in str(status).lower() for keyword in ['overrun', 'underrun']):
-                pass  # Будет обработано по тишине
-            else:
-                return
+        return model_registry.create_recognizer(self.model_path_ru, 16000, self._command_grammar_json(), words=True,
+                                                alternatives=MAX_ALTERNATIVES if self.nbest_results else 0)
+
+    def _assistant_vocabulary(self):
+        """Слова, известные ассистенту: имена, команды и встроенные слова (для арбитра RU/EN)"""
+        return build_command_grammar([self.assistant_name, self.assist_name2, self.assist_name3], self.commands,
+                                     self.shortcut_index.spoken_words)
 
-        if len(indata) == 0:
+    def _create_wake_recognizer(self):
+        """
+        Детектор имени ассистента (грамматика только из имён).
+        :return: (распознаватель, имена)
+        """
+        names = [self.assistant_name, self.assist_name2, self.assist_name3]
+        rec_wake = model_registry.create_recognizer(self.model_path_ru, 16000,
+                                                    grammar_to_json(build_wake_grammar(names)))
+        return rec_wake, names
+
+    def rebuild_command_grammar(self):
+        """Пересобирает грамматики (режим команд, детектор имени) после изменения команд или имён"""
+        self.intent_matcher.rebuild([self.assistant_name, self.assist_name2, self.assist_name3], self.commands)
+        self.command_index.rebuild([self.assistant_name, self.assist_name2, self.assist_name3], self.commands)
+        self.fuzzy_index.rebuild(self.commands)
+        self.shortcut_index.rebuild(list_shortcuts(get_path('user_settings', "links for assist")))
+        if self.audio_pipeline is None:
             return
+        try:
+            if self.command_mode and self.multiprocess_decode:
+                self.audio_pipeline.worker.set_ru_grammar(self._command_grammar_json())
+            elif self.command_mode:
+                # Поток декодирования подключит новый распознаватель сам, когда закончится фраза
+                self.rec_ru = self._create_ru_recognizer()
+                self.audio_pipeline.replace_recognizers(rec_ru=self.rec_ru)
+            if self.wake_word_mode:
+                rec_wake, names = self._create_wake_recognizer()
+                self.audio_pipeline.replace_recognizers(rec_wake=rec_wake, wake_names=names)
+            self.result_arbiter.set_vocabulary(self._assistant_vocabulary())
+        except Exception as e:
+            debug_logger.error(f"Не удалось пересобрать грамматику команд: {e}")
 
-        # === АНАЛИЗ ГРОМКОСТИ ===
+    def get_microphone_id(self, preferred_name=None):
+        """Возвращает ID микрофона по имени (пробное открытие устройств кэширует device_registry)"""
         try:
-            audio_data = np.frombuffer(indata, dtype=np.int16)
-            rms = np.sqrt(np.mean(audio_data.astype(np.float32) ** 2))
-            is_silent = rms < 20
+            # Устройства проверяются в том формате, в котором их потом откроет ассистент
+            device_registry.set_native(self.native_capture)
+            best = device_registry.find(preferred_name)
+            if best is not None:
+                return best
 
-            if not is_silent:
-                self.last_audio_time = time.time()
+            return device_registry.default_input()  # fallback
 
         except Exception as e:
-            debug_logger.error(f"Ошибка при анализе громкости: {e}")
+            debug_logger.warning(f"Ошибка выбора микрофона: {e}")
+            return device_registry.default_input()  # двойной fallback
 
-        data = indata.tobytes()
-        ru_text = ""
-        en_text = ""
+    def audio_callback(self, indata, frames, time_info, status):
+        """
+        Callback sd.InputStream: только передаёт блок в кольцевой буфер конвейера.
+        Распознавание выполняется в потоке декодирования (см. AudioPipeline).
+        :param time_info: Временные метки от PortAudio
+        """
+        if self.audio_pipeline is not None:
+            self.audio_pipeline.capture(indata, frames, time_info, status)
 
-        try:
-            if self.rec_ru.AcceptWaveform(data):
-                result = json.loads(self.rec_ru.Result())
-                ru_text = result.get("text", "").strip().lower()
+    def _on_voice_activity(self, timestamp):
+        """Вызывается потоком декодирования на каждом нетихом блоке"""
+        self.last_audio_time = timestamp
 
-            if self.rec_en.AcceptWaveform(data):
-                result = json.loads(self.rec_en.Result())
-                temp_en = result.get("text", "").strip().lower()
-                if temp_en and temp_en != "huh":
-                    en_text = temp_en
+    def apply_endpointing(self):
+        """Передаёт настройки конца фразы работающему конвейеру (можно менять на лету)"""
+        if self.audio_pipeline is None:
+            return
+        values = endpoint_values(self.endpoint_preset, self.endpoint_custom)
+        self.audio_pipeline.set_endpointing(**values)
+        debug_logger.info(f"Конец фразы: пресет '{self.endpoint_preset}', {values}")
 
-            final_text = ru_text or en_text
-            if final_text:
-                self.on_final_result(final_text)
+    def _seed_noise_floor(self):
+        """Берёт сохранённую оценку фона для устройства, которое реально открылось"""
+        if self.noise_floor is not None and self.audio_pipeline is not None:
+            self.noise_floor.seed(self.noise_floors.get(self.stream_monitor.device_name))
+            self.audio_pipeline.set_noise_floor(self.noise_floor)
 
-        except Exception as e:
-            debug_logger.error(f"Ошибка в обработке распознавания: {e}")
+    def store_noise_floor(self, force=False):
+        """
+        Запоминает оценку фона для текущего микрофона в настройках.
+        Без force сохраняет не чаще раза в минуту и только при заметном изменении
+        """
+        device_name = self.stream_monitor.device_name  # Открытое сейчас устройство
+        if self.noise_floor is None or self.noise_floor.floor is None or not device_name:
+            return
+        if self.audio_source_factory is not open_input_stream:
+            return  # Звук из файлов (--replay) не говорит ничего о фоне микрофона
+        floor = round(self.noise_floor.floor, 1)
+        stored = self.noise_floors.get(device_name)
+        if stored is not None and abs(floor - stored) <= max(1.0, stored * 0.1):
+            return
+        if not force and time.time() - self.noise_floor_saved_time < 60:
+            return
+        self.noise_floors[device_name] = floor
+        self.noise_floor_saved_time = time.time()
+        # Вызов бывает и из рабочего потока (остановка ассистента): файл пишется в потоке интерфейса, без уведомления
+        self.noise_floor_stored.emit()
+        debug_logger.info(f"Фон микрофона '{device_name}': RMS {floor}")
+
+    def expect_replay_actions(self, expected):
+        """Когда WAV-файлы (--replay) проиграны и фразы разобраны, сверяет выполненные действия с ожидаемыми"""
+        self.replay_expected = expected
+        self.replay_idle_checks = 0
+        self.replay_timer = QTimer()
+        self.replay_timer.timeout.connect(self.check_replay_finished)
+        self.replay_timer.start(500)
+
+    def check_replay_finished(self):
+        stream = self.audio_stream
+        text_queue = self.text_queue if hasattr(self, 'text_queue') else None
+        idle = (stream is not None and stream.wait(0) and self.audio_pipeline is not None
+                and self.audio_pipeline.wait_idle(0.1) and text_queue is not None and text_queue.empty())
+        # Ещё один тик после опустевшей очереди: run_script дорабатывает последнюю фразу
+        self.replay_idle_checks = self.replay_idle_checks + 1 if idle else 0
+        if self.replay_idle_checks < 2:
+            return
+        self.replay_timer.stop()
+        problems = self.action_recorder.check(self.replay_expected)
+        for problem in problems:
+            logger.error(f"[Прогон] {problem}")
+        logger.info(f"[Прогон] {'действия совпали' if not problems else f'расхождений: {len(problems)}'}")
+        QApplication.exit(1 if problems else 0)
+
+    def get_audio_stats(self):
+        """Счётчики захвата/декодирования: переполнения и отставание очереди"""
+        if self.audio_pipeline is None:
+            return {}
+        return self.audio_pipeline.stats()
 
     def on_final_result(self, text):
         """Вызывается при распознавании фразы. Логирует и отправляет дальше."""
@@ -1887,6 +2179,7 @@ class Assistant(QMainWindow):
             while self.is_assistant_running:
                 try:
                     text = q.get(timeout=1)
+                    latency_tracker.mark("dequeue")
                     yield text
                 except:
                     continue
@@ -1898,33 +2191,10 @@ class Assistant(QMainWindow):
 
     # === ПРОВЕРКА МИКРОФОНА ===
     def check_microphone(self):
-        """Проверка доступности микрофона через sounddevice"""
-        debug_logger.info("Проверка микрофона через sounddevice...")
+        """Проверка доступности микрофона по реестру устройств"""
+        debug_logger.info("Проверка микрофона через реестр устройств...")
         try:
-            devices = sd.query_devices()
-            active_mics = []
-
-            for device in devices:
-                if device['max_input_channels'] <= 0:
-                    continue
-
-                device_id = device['index']
-                name = device['name']
-
-                # Фильтруем системные
-                if any(kw in name.lower() for kw in ['mapper', 'primary', 'wave', 'default']):
-                    continue
-
-                try:
-                    with sd.InputStream(
-                            device=device_id,
-                            channels=1,
-                            samplerate=44100,
-                            blocksize=1024
-                    ):
-                        active_mics.append(device)
-                except Exception:
-                    continue
+            active_mics = device_registry.microphones()
 
             if active_mics:
                 debug_logger.info(f"Найдено рабочих микрофонов: {len(active_mics)}")
@@ -1941,6 +2211,20 @@ class Assistant(QMainWindow):
             return False
 
     def _check_microphone_wrapper(self):
+        """Перепроверка микрофонов идёт в фоне, результат показывается по сигналу microphone_checked"""
+        # Без открытого потока можно перечитать список PortAudio: найдётся и микрофон, подключённый после запуска
+        device_registry.probe_async(reinitialize=self.audio_stream is None).add_done_callback(
+            lambda future: self.microphone_checked.emit())
+
+    def nativeEvent(self, event_type, message):
+        """Windows сообщает о подключении и отключении устройств (WM_DEVICECHANGE) - монитор потока проверит микрофон"""
+        if event_type == b"windows_generic_MSG":
+            msg = wintypes.MSG.from_address(int(message))
+            if msg.message == win32con.WM_DEVICECHANGE:
+                self.stream_monitor.devices_changed()
+        return super().nativeEvent(event_type, message)
+
+    def _on_microphone_checked(self):
         try:
             self.check_microphone()
             if self.microphone_available:
@@ -1967,74 +2251,133 @@ class Assistant(QMainWindow):
                 finally:
                     self.audio_stream = None
                     debug_logger.info("Аудиопоток остановлен и очищен.")
+
+            if self.audio_pipeline is not None:
+                self.store_noise_floor(force=True)
+                debug_logger.info(f"Статистика аудиоконвейера: {self.audio_pipeline.stats()}")
+                self.audio_pipeline.stop()
+                self.audio_pipeline = None
+
+            # Модели не выгружаются, только отпускаются - следующий запуск возьмёт их из памяти
+            for path in self.models_acquired:
+                model_registry.release(path)
+            self.models_acquired = []
+            if self.english_cascade is not None:
+                self.english_cascade.close()
+                self.english_cascade = None
         except Exception as e:
             debug_logger.error(f"Критическая ошибка аудиопотока: {e}", exc_info=True)
 
-    def check_silence_timeout(self):
-        """Проверяет, сколько времени прошло с последнего звука"""
+    def check_stream_health(self):
+        """Периодическая проверка аудиопотока: пульс callback'ов, переполнения, возврат выбранного микрофона"""
         if not self.is_assistant_running or not self.microphone_available:
             return
 
-        if self.last_audio_time is None:
-            return  # Ещё не было данных
+        if self.audio_pipeline is not None:
+            self.audio_pipeline.log_stats_if_changed()
+        latency_tracker.flush_stale()
+        self.store_noise_floor()
+        if self.english_cascade is not None:
+            self.english_cascade.unload_if_idle()
 
-        silent_duration = time.time() - self.last_audio_time
+        if self.audio_source_factory is not open_input_stream:
+            return  # Звук из файлов (--replay) заканчивается сам, перезапускать нечего
 
-        if silent_duration > 10.0:  # 10 секунд тишины
-            debug_logger.warning(f"🔊 Нет звука более 10 сек ({silent_duration:.1f}s) — перезапуск аудиопотока")
-            self.restart_audio_stream()
+        reason = self.stream_monitor.check(self.audio_pipeline, self.audio_stream)
+        if reason is not None:
+            self.restart_audio_stream(reason)
 
-    def restart_audio_stream(self):
-        """Перезапускает только InputStream, не трогая модели и ассистента"""
-        debug_logger.info("🔄 Перезапуск аудиопотока...")
+    def restart_audio_stream(self, reason=None):
+        """
+        Перезапускает только InputStream, не трогая модели и ассистента.
+        Открывается выбранный микрофон, если он подключён, иначе устройство по умолчанию
+        """
+        debug_logger.info(f"🔄 Перезапуск аудиопотока (причина: {reason})...")
 
         try:
             # Останавливаем старый поток
             if hasattr(self, 'audio_stream') and self.audio_stream is not None:
                 if self.audio_stream.active:
                     self.audio_stream.abort()
+                self.audio_stream.close()
                 self.audio_stream = None
                 debug_logger.info("Старый аудиопоток остановлен")
 
-            # Создаём новый — без указания устройства → по умолчанию
-            self.audio_stream = sd.InputStream(
-                samplerate=16000,
-                channels=1,
-                dtype='int16',
-                blocksize=512,
-                callback=self.audio_callback
-            )
-            self.audio_stream.start()
-
-            # Обновляем время активности
-            self.last_audio_time = time.time()
-
-            debug_logger.info("✅ Аудиопоток успешно перезапущен (по умолчанию)")
+            device_registry.set_native(self.native_capture)
+            self.audio_stream, self.input_device_id, device_name = self.stream_monitor.reopen(
+                lambda device: self.audio_pipeline.attach_stream(
+                    self.audio_source_factory(self.audio_callback, device=device, native=self.native_capture)),
+                self.input_device_name, self.audio_pipeline, reason)
+            self._seed_noise_floor()
+            debug_logger.info(f"✅ Аудиопоток успешно перезапущен: '{device_name}' (ID={self.input_device_id})")
 
         except Exception as e:
+            # Монитор повторит попытку при следующей проверке после паузы
             debug_logger.error(f"❌ Не удалось перезапустить поток: {e}")
-            # Можно попробовать повторно через 10 сек
-            QTimer.singleShot(10000, self.restart_audio_stream)
 
-    def handle_app_command(self, text, action):
+    def fuzzy_command(self, text):
+        """
+        Ключ commands.json, похожий на цель фразы (для целей, распознанных с ошибкой).
+        :return: (ключ, оценка от 0 до 1, можно ли выполнить без вопроса) или (None, 0.0, False),
+                 если нечёткий поиск выключен. При почти равных кандидатах выполнять без вопроса нельзя
+        """
+        if not self.fuzzy_commands:
+            return None, 0.0, False
+        names = [name for name in (self.assistant_name, self.assist_name2, self.assist_name3) if name]
+        key, score, runner_up = self.fuzzy_index.rank(text, skip=names + ACTION_STEMS + OPEN_STEMS + CLOSE_STEMS)
+        if key is not None:
+            debug_logger.info(f"Нечёткий поиск: '{text}' -> '{key}' ({score:.2f}, следующий {runner_up:.2f})")
+        return key, score, is_confident(score, runner_up)
+
+    def shortcut_command(self, text):
+        """
+        Ярлык из "links for assist", английское название которого произнесено по-русски ("хром").
+        :return: имя файла ярлыка или None
+        """
+        names = [name for name in (self.assistant_name, self.assist_name2, self.assist_name3) if name]
+        filename, score = self.shortcut_index.resolve(text, skip=names + ACTION_STEMS + OPEN_STEMS + CLOSE_STEMS)
+        if filename is not None:
+            debug_logger.info(f"Ярлык по произношению: '{text}' -> '{filename}' ({score:.2f})")
+        return filename
+
+    def _find_command(self, text, hits=None):
+        """
+        Первая команда из commands.json, найденная в тексте (или сам текст, если это ключ команды).
+        :param hits: готовый результат intent_matcher.scan(text), чтобы не сканировать повторно
+        :return: путь команды или None
+        """
+        if text in self.commands:
+            return self.commands[text]
+        # Ключ в любой форме слов ("папку загрузки"); подстрока из автомата - только если слова не совпали
+        keyword = self.command_index.find_command(text)
+        if keyword is None:
+            keyword = (self.intent_matcher.scan(text) if hits is None else hits).first(COMMAND)
+        return self.commands.get(keyword) if keyword is not None else None
+
+    def handle_app_command(self, text, action, hits=None):
         """Обработка команд для приложений"""
-        for keyword, filename in self.commands.items():
-            if keyword in text:
-                if not filename.endswith('.lnk') and not filename.endswith('.url') and not is_url_string(filename):
-                    return False  # Прекращаем обработку, если это папка
-                handler_links(filename, action)  # Вызываем обработчик ярлыков
-                return True  # Возвращаем True, если команда была успешно обработана
-        return False  # Возвращаем False, если команда не была найдена
-
-    def handle_folder_command(self, text, action):
+        filename = self._find_command(text, hits)
+        if filename is None:
+            filename = self.shortcut_command(text)  # Команды нет, но есть ярлык с таким названием
+        if filename is None:
+            return False  # Возвращаем False, если команда не была найдена
+        if not filename.endswith('.lnk') and not filename.endswith('.url') and not is_url_string(filename):
+            return False  # Прекращаем обработку, если это папка
+        handler_links(filename, action)  # Вызываем обработчик ярлыков
+        latency_tracker.mark("handler_end")
+        return True  # Возвращаем True, если команда была успешно обработана
+
+    def handle_folder_command(self, text, action, hits=None):
         """Обработка команд для папок"""
-        for keyword, folder_path in self.commands.items():
-            if keyword in text:
-                if folder_path.endswith('.lnk') or folder_path.endswith('.url') or is_url_string(folder_path):
-                    return False  # Прекращаем обработку, если это файл приложения
-                handler_folder(folder_path, action)  # Вызываем обработчик папок
-                return True  # Возвращаем True, если команда была успешно обработана
-        return False  # Возвращаем False, если команда не была найдена
+        folder_path = self._find_command(text, hits)
+        if folder_path is None:
+            return False  # Возвращаем False, если команда не была найдена
+        if folder_path.endswith('.lnk') or folder_path.endswith('.url') or is_url_string(folder_path):
+            return False  # Прекращаем обработку, если это файл приложения
+        latency_tracker.mark("handler_start")
+        handler_folder(folder_path, action)  # Вызываем обработчик папок
+        latency_tracker.mark("handler_end")
+        return True  # Возвращаем True, если команда была успешно обработана
 
     def _open_widget_signal(self):
         try:
@@ -2448,6 +2791,7 @@ class Assistant(QMainWindow):
         # Добавляем вкладку для открытия папки
         folder_tab = QWidget()
         self.tabs.addTab(folder_tab, "")
+        self.tabs.addTab(LatencyMetricsWidget(self), "")
 
         tab_bar = self.tabs.tabBar()
 
@@ -2470,12 +2814,14 @@ class Assistant(QMainWindow):
         tab_bar.setTabButton(2, QTabBar.LeftSide, create_centered_svg_tab(self.icon_logs_path))
         tab_bar.setTabButton(3, QTabBar.LeftSide, create_centered_svg_tab(self.icon_relax_path))
         tab_bar.setTabButton(4, QTabBar.LeftSide, create_centered_svg_tab(self.icon_screenshot_path))
+        tab_bar.setTabButton(5, QTabBar.LeftSide, create_centered_svg_tab(self.icon_latency_path))
 
         self.tabs.setTabToolTip(0, "Счетчик цензуры")
         self.tabs.setTabToolTip(1, "Обновления")
         self.tabs.setTabToolTip(2, "Подробные логи")
         self.tabs.setTabToolTip(3, "Релакс?")
         self.tabs.setTabToolTip(4, "Папка скриншотов")
+        self.tabs.setTabToolTip(5, "Задержки")
 
         # Обработчик переключения вкладок
         def on_tab_changed(index):
@@ -3330,6 +3676,8 @@ def should_launch_updater():
 
 
 if __name__ == '__main__':
+    # Процессы распознавания (bin/decode_processes.py) запускаются из собранного exe
+    multiprocessing.freeze_support()
     try:
         # Запускаем updater если нужно
         if should_launch_updater():
@@ -3348,7 +3696,18 @@ if __name__ == '__main__':
         app = QApplication([])
         app.setWindowIcon(QIcon(get_path('icon_assist.ico')))
         window = Assistant()
-        app.exec_()
+        if "--replay" in sys.argv:
+            # Прогон записанных WAV-файлов вместо микрофона: main.py --replay a.wav b.wav
+            # Фразы проходят настоящий run_script, а ярлыки, папки, встроенные команды и реакции только записываются;
+            # с --expect actions.json записанные действия сравниваются с ожидаемыми и программа завершается
+            replay_args = sys.argv[sys.argv.index("--replay") + 1:]
+            replay_files = [arg for arg in replay_args if arg.endswith(".wav")]
+            window.audio_source_factory = WavFileSource.factory(replay_files)
+            window.action_recorder = ActionRecorder()
+            window.action_recorder.stub_dispatch(sys.modules[__name__], window)
+            if "--expect" in replay_args:
+                window.expect_replay_actions(load_expected(replay_args[replay_args.index("--expect") + 1]))
+        sys.exit(app.exec_())
 
     except Exception as e:
         logger.error(f"Произошла ошибка при запуске программы: {e}")